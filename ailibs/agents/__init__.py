@@ -1,8 +1,9 @@
 from .ai_module_class import AIModule
 from .ai_modules import DeepSeekModule, KimiModule, DoubaoModule
 from .mixed_ai_manager import MixedAIManager
+from .job_queue import JobQueue, run_worker
 
 __all__ = [
-    'ai_module_class', 'ai_modules', 'mixed_ai_manager', # modules
-    'AIModule', 'DeepSeekModule', 'KimiModule', 'DoubaoModule', 'MixedAIManager'  # classes & functions
+    'ai_module_class', 'ai_modules', 'mixed_ai_manager', 'job_queue', # modules
+    'AIModule', 'DeepSeekModule', 'KimiModule', 'DoubaoModule', 'MixedAIManager', 'JobQueue', 'run_worker'  # classes & functions
 ]
\ No newline at end of file
@@ -6,6 +6,17 @@ import ast
 from openai import OpenAI
 from ..tools import TextFileContent, TODOListManager, FileManager
 from ..tools import AIFunction
+from ..tools import tracer
+
+def _usage_attrs(usage)->dict:
+    # 把接口返回的token用量转换为span属性，接口未返回用量时为空
+    if usage is None:
+        return {}
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'total_tokens': getattr(usage, 'total_tokens', None)
+    }
 
 class AIModule:
     def __init__(self, api_key: str, model: str, url: Optional[str] = None, system_prompt: str = '你是一个AI助手。', tools:Optional[AIFunction]=None, max_attempts_per_step: int = 10) -> None:
@@ -63,37 +74,46 @@ class AIModule:
         stop = False
         called_tools = []
         while not stop:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=self.tool_functions,
-                tool_choice='auto',
-                stream=True
-            )
+            with tracer.span('llm_request', cat='llm', model=self.model, stream=True, messages=len(messages)) as span:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    tools=self.tool_functions,
+                    tool_choice='auto',
+                    stream=True,
+                    stream_options={'include_usage': True}  # 最后一个chunk返回token用量（choices为空）
+                )
 
-            tool_calls = {}
-            msg = ''
-            for chunk in response:
-                if chunk.choices[0].finish_reason == 'stop':
-                    stop = True
-                delta = chunk.choices[0].delta
+                tool_calls = {}
+                msg = ''
+                usage = None
+                for chunk in response:
+                    if getattr(chunk, 'usage', None) is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason == 'stop':
+                        stop = True
+                    delta = chunk.choices[0].delta
 
-                if delta.content:
-                    print(delta.content, end='', flush=True)
-                    msg += delta.content
-                
-                if delta.tool_calls:
-                    for tcd in delta.tool_calls:
-                        idx = tcd.index
-                        if idx not in tool_calls:
-                            tool_calls[idx] = tcd
-                        else:
-                            if tcd.id:
-                                tool_calls[idx].id = tcd.id
-                            if tcd.function.name:
-                                tool_calls[idx].function.name = tcd.function.name
-                            if tcd.function.arguments:
-                                tool_calls[idx].function.arguments += tcd.function.arguments
+                    if delta.content:
+                        print(delta.content, end='', flush=True)
+                        msg += delta.content
+                    
+                    if delta.tool_calls:
+                        for tcd in delta.tool_calls:
+                            idx = tcd.index
+                            if idx not in tool_calls:
+                                tool_calls[idx] = tcd
+                            else:
+                                if tcd.id:
+                                    tool_calls[idx].id = tcd.id
+                                if tcd.function.name:
+                                    tool_calls[idx].function.name = tcd.function.name
+                                if tcd.function.arguments:
+                                    tool_calls[idx].function.arguments += tcd.function.arguments
+                if tracer.enabled:
+                    span.set(chars=len(msg), tool_calls=len(tool_calls), **_usage_attrs(usage))
             messages.append({'role':'assistant', 'content':msg})
             if tool_calls:
                 for tc in tool_calls.values():
@@ -136,12 +156,15 @@ class AIModule:
         stop = False
         called_tools = []
         while not stop:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=self.tool_functions,
-                tool_choice='auto'
-            )
+            with tracer.span('llm_request', cat='llm', model=self.model, stream=False, messages=len(messages)) as span:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    tools=self.tool_functions,
+                    tool_choice='auto'
+                )
+                if tracer.enabled:
+                    span.set(**_usage_attrs(getattr(response, 'usage', None)))
 
             if response.choices[0].finish_reason == 'stop':
                 stop = True
@@ -178,22 +201,23 @@ class AIModule:
     def save_state(self, path: Optional[str] = None) -> str:
         """Save agent state (system prompt, initial prompt, history, todos) to JSON."""
         p = path or self._state_file
-        data = {
-            'system_prompt': self.system_prompt,
-            'initial_prompt': self.initial_prompt,
-            'model': self.model,
-            'history': self.history,
-            'todos': {
-                'todo': self.todos.todo,
-                'nsteps': self.todos.nsteps,
-                'progress': self.todos.progress,
-                'cur_step': self.todos.cur_step,
-                'pause': self.todos.pause
+        with tracer.span('checkpoint', path=p):
+            data = {
+                'system_prompt': self.system_prompt,
+                'initial_prompt': self.initial_prompt,
+                'model': self.model,
+                'history': self.history,
+                'todos': {
+                    'todo': self.todos.todo,
+                    'nsteps': self.todos.nsteps,
+                    'progress': self.todos.progress,
+                    'cur_step': self.todos.cur_step,
+                    'pause': self.todos.pause
+                }
             }
-        }
-        with open(p, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return p
+            with open(p, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            return p
 
     def load(self, path: Optional[str] = None) -> bool:
         """Load agent state from JSON and restore history and TODO list."""
@@ -229,6 +253,13 @@ class AIModule:
         return True
         
     def answer(self, prompt: str, files: Optional[List[TextFileContent]] = None) -> str:
+        try:
+            with tracer.span('run', model=self.model):
+                return self.__run(prompt, files)
+        finally:
+            tracer.flush()
+
+    def __run(self, prompt: str, files: Optional[List[TextFileContent]] = None) -> str:
         # record initial prompt for saving/loading
         self.initial_prompt = prompt
         if files is not None:
@@ -239,10 +270,11 @@ class AIModule:
             prompt = file_prompt + prompt
 
         # Generate TODO list
-        self.__answer(
-            prompt=prompt + '\n现在，请你将任务拆解成多个步骤，调用工具制定一个TODO列表，每个步骤标上序号，从1开始。注意：只要你调用工具制定TODO列表，不需要执行任务！',
-            show=True
-        )
+        with tracer.span('plan'):
+            self.__answer(
+                prompt=prompt + '\n现在，请你将任务拆解成多个步骤，调用工具制定一个TODO列表，每个步骤标上序号，从1开始。请使用工具 `add_todos` 一次性添加所有步骤（如需重新规划，使用 `set_todos` 整体替换）。注意：只要你调用工具制定TODO列表，不需要执行任务！',
+                show=True
+            )
 
         results = [str(self.todos)]
         # save initial state after generating TODOs
@@ -263,111 +295,115 @@ class AIModule:
             retry_messages = None  
             original_prompt = prompt
             # 对当前 step 重试直到复盘合格或达到最大尝试次数
-            while not self.todos.pause and not self.todos.all_completed:
-                attempts += 1
-                print()
-                if retry_messages is None:
-                    step_save_fname = os.path.join('.agent_files', f'step_{idx}_summary.txt')
-                    write_instr = (
-                        "\n\n注意：如果本步骤产生可持久化的关键结果，" 
-                        "请调用工具 `write_file` 将精炼后的关键要点写入文件 '" + step_save_fname + "'。"
-                        " 文件内容应只包含要点与必要数据，不要重复大量上下文；最多 8 行或 300 字；使用项目符号或短句呈现。"
-                        " 写入后在回答中仅给一行极简说明（最多一句），不要把完整结果粘贴进回答。"
-                        "如果这是最后一步，你应当把结果汇总写入final.md，Markdown格式，内容同样精炼突出要点，方便用户查看最终成果。"
-                    )
-                    cur_ans, called_tools = self.__answer(
-                        f'{original_prompt}\n你必须严格按照TODO清单完成任务。（可调用工具查看）\n现在请你只完成第{idx}步：\n{cur_step}\n不要完成后面的步骤，不要调用complete_step标记步骤（因为系统会自动处理），但可以修改TODO列表。'
-                        + write_instr,
-                        show=True
-                    )
-                else:
-                    step_save_fname = os.path.join('.agent_files', f'step_{idx}_summary.txt')
-                    write_instr = (
-                        "\n\n注意：如果本步骤产生可持久化的关键结果，" 
-                        "请调用工具 `write_file` 将精炼后的关键要点写入文件 '" + step_save_fname + "'。"
-                        " 文件内容应只包含要点与必要数据，不要重复大量上下文；最多 8 行或 300 字；使用项目符号或短句呈现。"
-                        " 写入后在回答中仅给一行极简说明（最多一句），不要把完整结果粘贴进回答。"
-                        "如果这是最后一步，你应当把结果汇总写入final.md，Markdown格式，内容同样精炼突出要点，方便用户查看最终成果。"
-                    )
-                    redo_instruction = (
-                        f'请基于下面的历史回答和复盘反馈，重新完成第{idx}步：\n{cur_step}\n请不要完成后面的步骤。系统会自动标记TODO列表状态，因此请不要调用complete_step。'
-                        + write_instr
-                    )
-                    cur_ans, called_tools = self.__answer_show(redo_instruction, messages=retry_messages)
+            with tracer.span('step', step=idx):
+                while not self.todos.pause and not self.todos.all_completed:
+                    attempts += 1
+                    with tracer.span('attempt', step=idx, attempt=attempts):
+                        print()
+                        if retry_messages is None:
+                            step_save_fname = os.path.join('.agent_files', f'step_{idx}_summary.txt')
+                            write_instr = (
+                                "\n\n注意：如果本步骤产生可持久化的关键结果，" 
+                                "请调用工具 `write_file` 将精炼后的关键要点写入文件 '" + step_save_fname + "'。"
+                                " 文件内容应只包含要点与必要数据，不要重复大量上下文；最多 8 行或 300 字；使用项目符号或短句呈现。"
+                                " 写入后在回答中仅给一行极简说明（最多一句），不要把完整结果粘贴进回答。"
+                                "如果这是最后一步，你应当把结果汇总写入final.md，Markdown格式，内容同样精炼突出要点，方便用户查看最终成果。"
+                            )
+                            cur_ans, called_tools = self.__answer(
+                                f'{original_prompt}\n你必须严格按照TODO清单完成任务。（可调用工具查看）\n现在请你只完成第{idx}步：\n{cur_step}\n不要完成后面的步骤，不要调用complete_step标记步骤（因为系统会自动处理），但可以修改TODO列表。'
+                                + write_instr,
+                                show=True
+                            )
+                        else:
+                            step_save_fname = os.path.join('.agent_files', f'step_{idx}_summary.txt')
+                            write_instr = (
+                                "\n\n注意：如果本步骤产生可持久化的关键结果，" 
+                                "请调用工具 `write_file` 将精炼后的关键要点写入文件 '" + step_save_fname + "'。"
+                                " 文件内容应只包含要点与必要数据，不要重复大量上下文；最多 8 行或 300 字；使用项目符号或短句呈现。"
+                                " 写入后在回答中仅给一行极简说明（最多一句），不要把完整结果粘贴进回答。"
+                                "如果这是最后一步，你应当把结果汇总写入final.md，Markdown格式，内容同样精炼突出要点，方便用户查看最终成果。"
+                            )
+                            redo_instruction = (
+                                f'请基于下面的历史回答和复盘反馈，重新完成第{idx}步：\n{cur_step}\n请不要完成后面的步骤。系统会自动标记TODO列表状态，因此请不要调用complete_step。'
+                                + write_instr
+                            )
+                            cur_ans, called_tools = self.__answer_show(redo_instruction, messages=retry_messages)
 
-                # 如果模型在生成回答过程中调用了工具，检测特定工具并调整流程
-                if called_tools:
-                    # 把当前回答记录并追加到 results/history
-                    results.append(cur_ans)
-                    self.history.append({'role': 'assistant', 'content': cur_ans})
-                    # persist state after tool-invoked changes
-                    try:
-                        self.save_state()
-                    except Exception:
-                        pass
-                    # 如果调用了 complete_all 或者整个 TODO 已完成，则结束所有循环
-                    if 'complete_all' in called_tools or self.todos.all_completed:
-                        break
-                    # 如果调用了 complete_step 或者当前步骤已变更，则跳过复盘，进入下一步
-                    if 'complete_step' in called_tools:
-                        self.todos.redo()
+                        # 如果模型在生成回答过程中调用了工具，检测特定工具并调整流程
+                        if called_tools:
+                            # 把当前回答记录并追加到 results/history
+                            results.append(cur_ans)
+                            self.history.append({'role': 'assistant', 'content': cur_ans})
+                            # persist state after tool-invoked changes
+                            try:
+                                self.save_state()
+                            except Exception:
+                                pass
+                            # 如果调用了 complete_all 或者整个 TODO 已完成，则结束所有循环
+                            if 'complete_all' in called_tools or self.todos.all_completed:
+                                break
+                            # 如果调用了 complete_step 或者当前步骤已变更，则跳过复盘，进入下一步
+                            if 'complete_step' in called_tools:
+                                self.todos.redo()
                     
-                    if self.todos.cur_step != idx:
-                        break
+                            if self.todos.cur_step != idx:
+                                break
 
-                print()
-                # 调用 AI 进行复盘（显示模式）
-                review_prompt = (
-                    f'请先检查TODO清单和文件内容（如果有），再复盘回答内容并判断是否合格。\n步骤内容：\n{cur_step}\n\n'
-                    f'你的完成内容：\n{cur_ans}\n\n'
-                    '如果合格，只回复“合格”。'
-                    '如果不合格，回复“不合格”，并简要列出不足与需要重做的改进要点。'
-                )
-                review, review_tools = self.__answer(review_prompt, show=True)
-                print()
+                        print()
+                        # 调用 AI 进行复盘（显示模式）
+                        review_prompt = (
+                            f'请先检查TODO清单和文件内容（如果有），再复盘回答内容并判断是否合格。\n步骤内容：\n{cur_step}\n\n'
+                            f'你的完成内容：\n{cur_ans}\n\n'
+                            '如果合格，只回复“合格”。'
+                            '如果不合格，回复“不合格”，并简要列出不足与需要重做的改进要点。'
+                        )
+                        with tracer.span('review', cat='review', step=idx) as span:
+                            review, review_tools = self.__answer(review_prompt, show=True)
+                            span.set(passed=isinstance(review, str) and '合格' in review and '不合格' not in review)
+                        print()
 
-                # 简单判定是否合格（只要包含“合格”字样即通过）
-                if isinstance(review, str) and '合格' in review and '不合格' not in review:
-                    self.todos.complete_step()
-                    results.append(cur_ans)
-                    # 仅把当前步的回答追加到 history（assistant），避免把整个累计结果覆盖到 history
-                    self.history.append({'role': 'assistant', 'content': cur_ans})
-                    # 优先由模型主动调用 write_file 保存关键信息；若模型未调用，则在 history 中加入提示，提醒后续步骤可读取文件
-                    if 'write_file' not in called_tools:
-                        note = (f'注意：第{idx}步的关键结果尚未保存为文件。如需持久化，请调用工具 `write_file` 将精要写入 .agent_files/step_{idx}_summary.txt，'
-                                ' 文件内容最多 8 行或 300 字，只包含要点。')
-                        self.history.append({'role': 'system', 'content': note})
-                    # persist state after completing a step
-                    try:
-                        self.save_state()
-                    except Exception:
-                        pass
-                    break
+                        # 简单判定是否合格（只要包含“合格”字样即通过）
+                        if isinstance(review, str) and '合格' in review and '不合格' not in review:
+                            self.todos.complete_step()
+                            results.append(cur_ans)
+                            # 仅把当前步的回答追加到 history（assistant），避免把整个累计结果覆盖到 history
+                            self.history.append({'role': 'assistant', 'content': cur_ans})
+                            # 优先由模型主动调用 write_file 保存关键信息；若模型未调用，则在 history 中加入提示，提醒后续步骤可读取文件
+                            if 'write_file' not in called_tools:
+                                note = (f'注意：第{idx}步的关键结果尚未保存为文件。如需持久化，请调用工具 `write_file` 将精要写入 .agent_files/step_{idx}_summary.txt，'
+                                        ' 文件内容最多 8 行或 300 字，只包含要点。')
+                                self.history.append({'role': 'system', 'content': note})
+                            # persist state after completing a step
+                            try:
+                                self.save_state()
+                            except Exception:
+                                pass
+                            break
 
-                # 未合格处理：若超过最大重试次数则强制完成以避免死循环
-                if attempts >= self.max_attempts_per_step:
-                    self.todos.complete_step()
-                    # 达到最大重试次数时做最小回退保存（截断），以免丢失重要工作成果
-                    if 'write_file' not in called_tools:
-                        try:
-                            lines = cur_ans.splitlines()
-                            short = '\n'.join(lines[:8])
-                            short = short[:1000]
-                            self._save_step_file(idx, short)
-                            self.history.append({'role':'system', 'content': f'已为第{idx}步写入回退摘要文件 step_{idx}_summary.txt（内容已截断）。'})
-                        except Exception:
-                            pass
-                    try:
-                        self.save_state()
-                    except Exception:
-                        pass
-                    break
+                        # 未合格处理：若超过最大重试次数则强制完成以避免死循环
+                        if attempts >= self.max_attempts_per_step:
+                            self.todos.complete_step()
+                            # 达到最大重试次数时做最小回退保存（截断），以免丢失重要工作成果
+                            if 'write_file' not in called_tools:
+                                try:
+                                    lines = cur_ans.splitlines()
+                                    short = '\n'.join(lines[:8])
+                                    short = short[:1000]
+                                    self._save_step_file(idx, short)
+                                    self.history.append({'role':'system', 'content': f'已为第{idx}步写入回退摘要文件 step_{idx}_summary.txt（内容已截断）。'})
+                                except Exception:
+                                    pass
+                            try:
+                                self.save_state()
+                            except Exception:
+                                pass
+                            break
 
-                # 要求重做：以字典消息形式传回（assistant 的之前回答，user 的复盘反馈），供模型参考
-                retry_messages = list(self.history)
-                retry_messages.append({'role': 'assistant', 'content': cur_ans})
-                retry_messages.append({'role': 'user', 'content': review})
-                # 重试循环会使用更新后的 original_prompt
+                        # 要求重做：以字典消息形式传回（assistant 的之前回答，user 的复盘反馈），供模型参考
+                        retry_messages = list(self.history)
+                        retry_messages.append({'role': 'assistant', 'content': cur_ans})
+                        retry_messages.append({'role': 'user', 'content': review})
+                        # 重试循环会使用更新后的 original_prompt
             # 内层循环结束，继续外层循环直到所有步骤完成
             continue
 
@@ -0,0 +1,242 @@
+from typing import Callable, Optional
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import traceback
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, lease_until, id);
+'''
+
+class JobQueue:
+    def __init__(self, path:str, visibility:float=600.0)->None:
+        self.path = path
+        self.visibility = visibility
+        # 每个进程（线程）使用自己的连接；isolation_level=None 以便手动控制事务
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+        return
+
+    def close(self)->None:
+        with self._lock:
+            self._conn.close()
+        return
+
+    def _write(self, sql:str, args:tuple=())->sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def enqueue(self, prompt:str, max_attempts:int=3)->int:
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError('prompt must be a non-empty string.')
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1.')
+        now = time.time()
+        cur = self._write(
+            'INSERT INTO jobs (prompt, max_attempts, created, updated) VALUES (?, ?, ?, ?)',
+            (prompt, max_attempts, now, now)
+        )
+        return cur.lastrowid
+
+    def lease(self, worker:str, visibility:Optional[float]=None)->Optional[dict]:
+        # 领取一个可执行的任务：排队中的任务，或者租约已过期（执行它的进程崩溃或卡死）的任务
+        # BEGIN IMMEDIATE 会立刻获取写锁，保证多个进程不会领取到同一个任务
+        now = time.time()
+        until = now + (visibility or self.visibility)
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 租约过期且已用完重试次数的任务直接标记为失败
+                conn.execute(
+                    "UPDATE jobs SET status='failed', worker=NULL, lease_until=NULL, updated=?, "
+                    "error=COALESCE(error, 'lease expired') "
+                    "WHERE status='running' AND lease_until<? AND attempts>=max_attempts",
+                    (now, now)
+                )
+                row = conn.execute(
+                    "SELECT id, prompt, attempts, max_attempts FROM jobs "
+                    "WHERE status='queued' OR (status='running' AND lease_until<?) "
+                    "ORDER BY id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status='running', attempts=attempts+1, worker=?, lease_until=?, updated=? WHERE id=?",
+                    (worker, until, now, row[0])
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return {'id': row[0], 'prompt': row[1], 'attempt': row[2] + 1, 'max_attempts': row[3]}
+
+    def heartbeat(self, job_id:int, worker:str, visibility:Optional[float]=None)->bool:
+        now = time.time()
+        cur = self._write(
+            "UPDATE jobs SET lease_until=?, updated=? WHERE id=? AND worker=? AND status='running'",
+            (now + (visibility or self.visibility), now, job_id, worker)
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id:int, worker:str, result:str='')->bool:
+        cur = self._write(
+            "UPDATE jobs SET status='done', result=?, error=NULL, worker=NULL, lease_until=NULL, updated=? "
+            "WHERE id=? AND worker=? AND status='running'",
+            (result, time.time(), job_id, worker)
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id:int, worker:str, error:str='')->bool:
+        # 还有剩余重试次数时重新排队，否则标记为失败
+        cur = self._write(
+            "UPDATE jobs SET status=CASE WHEN attempts<max_attempts THEN 'queued' ELSE 'failed' END, "
+            "error=?, worker=NULL, lease_until=NULL, updated=? WHERE id=? AND worker=? AND status='running'",
+            (error, time.time(), job_id, worker)
+        )
+        return cur.rowcount == 1
+
+    def retry(self, job_id:int)->bool:
+        cur = self._write(
+            "UPDATE jobs SET status='queued', attempts=0, error=NULL, worker=NULL, lease_until=NULL, updated=? "
+            "WHERE id=? AND status IN ('failed', 'done')",
+            (time.time(), job_id)
+        )
+        return cur.rowcount == 1
+
+    def get(self, job_id:int)->Optional[dict]:
+        with self._lock:
+            cur = self._conn.execute('SELECT * FROM jobs WHERE id=?', (job_id,))
+            row = cur.fetchone()
+            names = [d[0] for d in cur.description]
+        return None if row is None else dict(zip(names, row))
+
+    def stats(self)->dict:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def jobs(self, status:Optional[str]=None, limit:int=50)->list:
+        sql = 'SELECT id, status, attempts, max_attempts, worker, substr(prompt, 1, 60), error FROM jobs'
+        args = ()
+        if status is not None:
+            sql += ' WHERE status=?'
+            args = (status,)
+        sql += ' ORDER BY id LIMIT ?'
+        with self._lock:
+            rows = self._conn.execute(sql, args + (limit,)).fetchall()
+        keys = ('id', 'status', 'attempts', 'max_attempts', 'worker', 'prompt', 'error')
+        return [dict(zip(keys, row)) for row in rows]
+
+def default_agent_factory(workspace:str):
+    # 默认使用DeepSeek，API KEY从环境变量DEEPSEEK_API_KEY读取；工作区内的文件通过FileManager暴露给模型
+    from .ai_modules import DeepSeekModule
+    from ..tools.file_manager import FileManager
+    api_key = os.environ.get('DEEPSEEK_API_KEY')
+    if not api_key:
+        raise RuntimeError('DEEPSEEK_API_KEY is not set.')
+    return DeepSeekModule(
+        api_key=api_key,
+        system_prompt='你是AI助手DeepSeek。在解决复杂任务时，你可以调用工具、制定TODO清单辅助。',
+        tools=FileManager(workspace).function,
+        reasoning=False,
+        max_attempts_per_step=5
+    )
+
+def run_worker(db_path:str, workspace_root:str, name:Optional[str]=None, visibility:float=600.0, poll_interval:float=2.0, max_jobs:Optional[int]=None, drain:bool=False, agent_factory:Callable=default_agent_factory)->int:
+    name = name or f'{socket.gethostname()}:{os.getpid()}'
+    workspace_root = os.path.abspath(workspace_root)
+    queue = JobQueue(db_path, visibility)
+    finished = 0
+    try:
+        while max_jobs is None or finished < max_jobs:
+            job = queue.lease(name)
+            if job is None:
+                if drain:
+                    break
+                time.sleep(poll_interval)
+                continue
+            # 每个任务使用独立的工作区：AIModule的状态文件与中间文件都以当前工作目录为根
+            workspace = os.path.join(workspace_root, f'job_{job["id"]}')
+            os.makedirs(workspace, exist_ok=True)
+            # 任务运行期间由后台线程定期续租，进程崩溃后租约过期，任务会被其他进程重新领取
+            stop = threading.Event()
+            def beat(job_id=job['id']):
+                while not stop.wait(visibility / 3):
+                    if not queue.heartbeat(job_id, name):
+                        return
+            beater = threading.Thread(target=beat, daemon=True)
+            beater.start()
+            cwd = os.getcwd()
+            print(f'[{name}] job {job["id"]} attempt {job["attempt"]}/{job["max_attempts"]} -> {workspace}')
+            try:
+                os.chdir(workspace)
+                agent = agent_factory(workspace)
+                result = agent.answer(job['prompt'])
+            except Exception:
+                stop.set()
+                queue.fail(job['id'], name, traceback.format_exc(limit=5))
+                print(f'[{name}] job {job["id"]} failed')
+            else:
+                stop.set()
+                queue.complete(job['id'], name, result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str))
+                print(f'[{name}] job {job["id"]} done')
+            finally:
+                os.chdir(cwd)
+                beater.join()
+            finished += 1
+    finally:
+        queue.close()
+    return finished
+
+JobQueue.__doc__ = '''JobQueue类是一个基于SQLite的持久化任务队列，可以被多个进程同时使用，用于批量执行Agent任务（例如一批视频选题）。
+任务被领取时获得一个租约（lease），执行期间需要定期续租（heartbeat）；如果执行任务的进程崩溃，租约过期（visibility timeout）后任务会被其他进程重新领取。
+每次领取都会增加尝试次数，超过最大尝试次数的任务会被标记为失败。任务的状态有queued、running、done、failed四种。它包含以下方法：
+- __init__(self, path:str, visibility:float=600.0): 打开（或创建）数据库文件，visibility为默认租约时长（秒）。
+- enqueue(self, prompt:str, max_attempts:int=3): 添加一个任务，返回任务编号。
+- lease(self, worker:str, visibility:Optional[float]=None): 领取一个任务，返回包含id、prompt、attempt、max_attempts的字典，没有可执行的任务时返回None。
+- heartbeat(self, job_id:int, worker:str, visibility:Optional[float]=None): 续租，租约已被其他进程接管时返回False。
+- complete(self, job_id:int, worker:str, result:str=''): 标记任务完成并保存结果。
+- fail(self, job_id:int, worker:str, error:str=''): 标记任务本次执行失败，还有剩余尝试次数时重新排队。
+- retry(self, job_id:int): 将已完成或失败的任务重新排队，并清零尝试次数。
+- get(self, job_id:int): 返回任务的全部字段，任务不存在时返回None。
+- stats(self): 返回各个状态的任务数量。
+- jobs(self, status:Optional[str]=None, limit:int=50): 返回任务列表（提示词截断显示），可以按状态筛选。'''
+JobQueue.lease.__doc__ = '''lease方法用于领取一个可执行的任务。它接受以下参数：
+- worker: 领取者的名称，续租、完成、失败时需要使用相同的名称。
+- visibility: 租约时长（秒），默认为队列的visibility。
+可执行的任务包括排队中的任务和租约已过期的运行中任务，按编号从小到大领取。整个领取过程在一个写事务（BEGIN IMMEDIATE）中完成，多个进程不会领取到同一个任务。'''
+run_worker.__doc__ = '''run_worker函数用于在当前进程中循环领取并执行任务。它接受以下参数：
+- db_path: 任务队列数据库文件路径。
+- workspace_root: 工作区根目录，每个任务在其中的job_<编号>子目录中执行（执行期间会切换当前工作目录）。
+- name: 领取者名称，默认为“主机名:进程号”。
+- visibility: 租约时长（秒），执行期间每隔visibility/3秒续租一次。
+- poll_interval: 队列为空时的轮询间隔（秒）。
+- max_jobs: 最多执行的任务数量，为None时不限制。
+- drain: 为True时队列为空立即返回，否则持续轮询等待新任务。
+- agent_factory: 接受工作区路径并返回AIModule实例的函数，默认使用DeepSeekModule，API KEY从环境变量DEEPSEEK_API_KEY读取。
+任务抛出异常时记录错误并按剩余尝试次数重新排队。重试的任务会在同一个工作区中从头执行，上一次生成的文件仍然保留。返回执行的任务数量。'''
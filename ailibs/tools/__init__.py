@@ -1,9 +1,14 @@
 __all__ = [
-    'tool_manager', 'file_manager', 'todo_manager', 'outline_manager', 'search', # modules
-    'AIFunction', 'FileManager', 'TextFileContent', 'TODOListManager', 'OutlineManager', 'SearchTool', 'DownloadTool' # classes & functions
+    'tool_manager', 'file_manager', 'todo_manager', 'outline_manager', 'trace_manager', 'text_index', 'subtitle_io', 'render_manager', 'knowledge_store', 'search', # modules
+    'AIFunction', 'cancel_event', 'FileManager', 'TextFileContent', 'TODOListManager', 'OutlineManager', 'Tracer', 'tracer', 'TextIndex', 'iter_cues', 'write_cues', 'RenderManager', 'KnowledgeStore', 'SearchTool', 'DownloadTool' # classes & functions
 ]
-from .tool_manager import AIFunction
+from .trace_manager import Tracer, tracer
+from .tool_manager import AIFunction, cancel_event
+from .text_index import TextIndex
 from .file_manager import FileManager, TextFileContent
 from .todo_manager import TODOListManager
 from .outline_manager import OutlineManager
+from .subtitle_io import iter_cues, write_cues
+from .render_manager import RenderManager
+from .knowledge_store import KnowledgeStore
 from .search import SearchTool, DownloadTool
\ No newline at end of file
@@ -1,33 +1,465 @@
 from .tool_manager import AIFunction
+from .text_index import TextIndex
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import os
+import re
+import fnmatch
+import tempfile
+import mmap
+import bisect
+import sys
+import struct
+import ctypes
 
 class TextFileContent:
-    def __init__(self, file_name: str, file_content: str) -> None:
-        self.fname, self.fcont = file_name, file_content
-        self.template = f'[file name]: {file_name}\n[file content begin]{file_content}[file content end]\n'
+    def __init__(self, file_name: str, file_content: str, file_info: Optional[str] = None) -> None:
+        self.fname, self.fcont, self.finfo = file_name, file_content, file_info
+        self.template = f'[file name]: {file_name}\n'
+        if file_info is not None:
+            self.template += f'[file info]: {file_info}\n'
+        self.template += f'[file content begin]{file_content}[file content end]\n'
 
     def __str__(self) -> str:
         return self.template
 
+# 当前进程的umask，用于让临时文件替换后的新文件权限与直接open(..., 'w')创建的文件一致
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _write_temp(path:str, data:bytes) -> str:
+    # 在目标文件所在目录中写入临时文件并fsync，返回临时文件路径；之后用os.replace原子地替换目标文件
+    dir_name, base = os.path.split(path)
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp = tempfile.mkstemp(prefix=f'.{base}.', suffix='.tmp', dir=dir_name or os.curdir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return tmp
+
+def _fsync_dir(dir_name:str) -> None:
+    # 持久化目录项（rename的结果）；Windows不支持打开目录，跳过
+    if os.name != 'posix':
+        return
+    fd = os.open(dir_name or os.curdir, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _atomic_write(path:str, data:Union[str, bytes]) -> None:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tmp = _write_temp(path, data)
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _fsync_dir(os.path.dirname(path))
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+def _apply_replacements(text:str, edits:List[dict]) -> Tuple[str, int]:
+    # 依次应用search/replace修改，每个search必须在当前内容中恰好出现一次
+    for idx, edit in enumerate(edits, start=1):
+        if not isinstance(edit, dict) or 'search' not in edit or 'replace' not in edit:
+            raise ValueError(f'Edit {idx} must be an object with search and replace.')
+        search, replace = str(edit['search']), str(edit['replace'])
+        if not search:
+            raise ValueError(f'Edit {idx}: search must not be empty.')
+        pos = text.find(search)
+        if pos < 0:
+            raise ValueError(f'Edit {idx}: search text not found in the file.')
+        if text.find(search, pos + 1) >= 0:
+            raise ValueError(f'Edit {idx}: search text matches more than once; include more surrounding lines to make it unique.')
+        text = text[:pos] + replace + text[pos+len(search):]
+    return text, len(edits)
+
+def _parse_hunks(diff:str) -> List[Tuple[int, List[str], List[str]]]:
+    hunks, cur = [], None
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            cur = (int(header.group(1)), [], [])
+            hunks.append(cur)
+        elif cur is None or line.startswith('\\'):
+            # 忽略hunk之前的---/+++等文件头，以及"\ No newline at end of file"
+            continue
+        elif line.startswith('-'):
+            cur[1].append(line[1:])
+        elif line.startswith('+'):
+            cur[2].append(line[1:])
+        else:
+            # 上下文行；模型有时会省略空行前面的空格
+            cur[1].append(line[1:])
+            cur[2].append(line[1:])
+    if not hunks:
+        raise ValueError('No hunk found in diff; each hunk must start with a header like "@@ -3,4 +3,5 @@".')
+    return hunks
+
+def _apply_unified_diff(text:str, diff:str) -> Tuple[str, int]:
+    newline = '\r\n' if '\r\n' in text else '\n'
+    lines = text.split(newline)
+    shift, last_end = 0, 0
+    for idx, (old_start, old, new) in enumerate(_parse_hunks(diff), start=1):
+        n = len(old)
+        expected = max(old_start - 1, 0) + shift if n else old_start + shift
+        if lines[expected:expected+n] != old or expected < last_end:
+            # 行号不准确时，在剩余内容中查找唯一匹配的上下文
+            matches = [i for i in range(last_end, len(lines) - n + 1) if lines[i:i+n] == old] if n else []
+            if not matches:
+                raise ValueError(f'Hunk {idx} (@@ -{old_start}): context lines do not match the file.')
+            if len(matches) > 1:
+                raise ValueError(f'Hunk {idx} (@@ -{old_start}): context matches {len(matches)} places; include more context lines.')
+            expected = matches[0]
+        lines[expected:expected+n] = new
+        shift = expected + len(new) - ((old_start - 1 if n else old_start) + n)
+        last_end = expected + len(new)
+    return newline.join(lines), idx
+
+def _as_patterns(patterns:Optional[Union[str, List[str]]]) -> List[str]:
+    # glob模式可以是列表，也可以是用逗号分隔的字符串
+    if not patterns:
+        return []
+    if isinstance(patterns, str):
+        patterns = patterns.split(',')
+    return [p.strip() for p in patterns if p and p.strip()]
+
+def _stat_or_none(entry:'_FileEntry') -> Optional[os.stat_result]:
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+_SORT_KEYS = {
+    'name': lambda entry: entry.name.lower(),
+    'mtime': lambda entry: -(getattr(_stat_or_none(entry), 'st_mtime', 0)),    # 最近修改的在前
+    'size': lambda entry: -(getattr(_stat_or_none(entry), 'st_size', 0))       # 最大的在前
+}
+
+_MMAP_THRESHOLD = 1024 * 1024
+_LINE_BLOCK = 1024 * 1024
+
+class _ReadWindow:
+    def __init__(self, buf, counts:List[int]) -> None:
+        self.buf, self.counts = buf, counts
+        self.size = len(buf)
+        # 最后一行没有换行符时也算作一行
+        self.total_lines = counts[-1] + (1 if self.size and buf[self.size-1:self.size] != b'\n' else 0)
+        self.begin, self.end = 0, self.size
+
+    def line_offset(self, line:int) -> int:
+        # 第line行（从1开始）第一个字节的位置，超出范围时返回文件大小
+        if line <= 1:
+            return 0
+        if line > self.total_lines:
+            return self.size
+        if line > self.counts[-1]:
+            # 没有换行符结尾的最后一行从最后一个换行符之后开始
+            return self.buf.rfind(b'\n') + 1
+        target = line - 1
+        block = bisect.bisect_left(self.counts, target) - 1
+        pos, seen = block * _LINE_BLOCK, self.counts[block]
+        while seen < target:
+            pos = self.buf.find(b'\n', pos) + 1
+            seen += 1
+        return pos
+
+    def line_of(self, pos:int) -> int:
+        block = min(pos // _LINE_BLOCK, len(self.counts) - 1)
+        start = block * _LINE_BLOCK
+        return min(self.counts[block] + self.buf[start:pos].count(b'\n') + 1, max(self.total_lines, 1))
+
+    def _char_boundary(self, pos:int) -> int:
+        # 向前移动到UTF-8字符的起始字节，避免截断多字节字符（例如中文）
+        while 0 < pos < self.size and 0x80 <= self.buf[pos] < 0xC0:
+            pos -= 1
+        return pos
+
+    def select(self, start_line:Optional[int], end_line:Optional[int], offset:Optional[int], length:Optional[int], max_bytes:int) -> str:
+        by_line = start_line is not None or end_line is not None
+        if by_line:
+            start_line = 1 if start_line is None else start_line
+            end_line = self.total_lines if end_line is None else end_line
+            if start_line < 1 or end_line < start_line:
+                raise ValueError(f'Invalid line range {start_line}-{end_line}.')
+            begin, end = self.line_offset(start_line), self.line_offset(end_line + 1)
+        else:
+            offset = 0 if offset is None else offset
+            if offset < 0 or (length is not None and length < 0):
+                raise ValueError(f'Invalid byte range offset={offset}, length={length}.')
+            begin = self._char_boundary(min(offset, self.size))
+            end = self.size if length is None else self._char_boundary(min(offset + length, self.size))
+        truncated = end - begin > max_bytes
+        if truncated:
+            end = self._char_boundary(begin + max_bytes)
+            if by_line:
+                # 按行读取时只返回完整的行，除非一行都放不下
+                last = self.buf.rfind(b'\n', begin, end)
+                if last >= 0:
+                    end = last + 1
+        self.begin, self.end = begin, end
+        info = f'文件共{self.size}字节、{self.total_lines}行'
+        if begin == 0 and end == self.size:
+            return info + '，已返回全部内容。'
+        first = self.line_of(begin)
+        last = self.line_of(end - 1) if end > begin else first
+        info += f'；本次返回第{first}-{last}行（字节{begin}-{end}）'
+        if truncated:
+            info += f'，超过{max_bytes}字节的部分已截断'
+        return info + '。可以通过start_line/end_line或offset/length参数分页读取其余内容。'
+
+class _FileEntry:
+    __slots__ = ('name', 'path', 'is_dir', '_dirent', '_stat')
+
+    def __init__(self, name:str, path:str, is_dir:bool, dirent:Optional[os.DirEntry]=None) -> None:
+        self.name, self.path, self.is_dir = name, path, is_dir
+        self._dirent = dirent
+        self._stat = None
+
+    @classmethod
+    def from_dirent(cls, dirent:os.DirEntry) -> '_FileEntry':
+        try:
+            is_dir = dirent.is_dir()
+        except OSError:
+            is_dir = False
+        return cls(dirent.name, dirent.path, is_dir, dirent)
+
+    def stat(self) -> os.stat_result:
+        # DirEntry会缓存stat结果（Windows上scandir时已经得到），只有第一次访问时才可能产生系统调用
+        if self._stat is None:
+            self._stat = self._dirent.stat() if self._dirent is not None else os.stat(self.path)
+        return self._stat
+
+def _dir_signature(path:str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+class _DirNode:
+    __slots__ = ('path', '_entries', '_children', '_sig', '_tracker')
+
+    def __init__(self, path:str, tracker:Optional['_PollingTracker']=None) -> None:
+        self.path = path
+        self._entries = None    # name(str) : _FileEntry，None表示尚未读取磁盘
+        self._children = {}     # name(str) : _DirNode，只包含已经展开过的子目录
+        self._sig = None        # 扫描时目录本身的(inode, mtime, size)，用于轮询检测变化
+        self._tracker = tracker
+
+    @property
+    def loaded(self) -> bool:
+        return self._entries is not None
+
+    @property
+    def entries(self) -> Dict[str, _FileEntry]:
+        if self._entries is None:
+            self.scan()
+        return self._entries
+
+    @property
+    def stale(self) -> bool:
+        try:
+            return _dir_signature(self.path) != self._sig
+        except OSError:
+            return True
+
+    def scan(self) -> None:
+        first = self._entries is None and self._sig is None
+        # 先记录目录签名再读取内容：两者之间发生的修改会在下次检查时再扫描一次，不会遗漏
+        self._sig = _dir_signature(self.path)
+        with os.scandir(self.path) as it:
+            entries = {dirent.name: _FileEntry.from_dirent(dirent) for dirent in it}
+        # 保留仍然存在的子目录节点，使其缓存的内容不必重新读取
+        self._children = {name: node for name, node in self._children.items() if name in entries and entries[name].is_dir}
+        self._entries = entries
+        if first and self._tracker is not None:
+            self._tracker.watch(self)
+
+    def child(self, name:str) -> '_DirNode':
+        node = self._children.get(name)
+        if node is None:
+            entry = self.entries.get(name)
+            if entry is None or not entry.is_dir:
+                raise ValueError(f'Directory {name} not found in {self.path}.')
+            node = self._children[name] = _DirNode(entry.path, self._tracker)
+        return node
+
+    def put(self, name:str, is_dir:bool) -> None:
+        # 同步本进程对磁盘的修改；尚未读取过的目录会在下次访问时读取，无需更新
+        if self._entries is not None:
+            self._entries[name] = _FileEntry(name, os.path.join(self.path, name), is_dir)
+        if not is_dir:
+            self._children.pop(name, None)
+
+    def drop(self, name:str) -> None:
+        if self._entries is not None:
+            self._entries.pop(name, None)
+        self._children.pop(name, None)
+
+    def loaded_nodes(self) -> Iterator['_DirNode']:
+        # 先返回父节点再展开子节点，调用方在迭代中重新扫描父节点时，被删除的子目录不会再被访问
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.loaded:
+                yield node
+            stack.extend(node._children.values())
+
+class _PollingTracker:
+    def watch(self, node:_DirNode) -> None:
+        return
+
+    def changed(self, root:_DirNode) -> Iterator[_DirNode]:
+        # 逐个检查已读取目录的mtime/size，开销与已展开的目录数成正比，与文件数无关
+        for node in root.loaded_nodes():
+            if node.stale:
+                yield node
+
+class _InotifyTracker(_PollingTracker):
+    # 基于ctypes的最小inotify封装（只在Linux上可用），无法添加监视的目录仍然使用轮询
+    _IN_MODIFY, _IN_ATTRIB, _IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+    _IN_MOVED_FROM, _IN_MOVED_TO, _IN_CREATE, _IN_DELETE = 0x40, 0x80, 0x100, 0x200
+    _IN_DELETE_SELF, _IN_MOVE_SELF, _IN_Q_OVERFLOW, _IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+    _IN_ONLYDIR = 0x01000000
+    _MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+             | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self) -> None:
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._nodes = {}        # wd(int) : _DirNode
+        self._unwatched = []    # 添加监视失败（例如超过max_user_watches）的目录，改为轮询
+
+    def watch(self, node:_DirNode) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(node.path), self._MASK)
+        if wd < 0:
+            self._unwatched.append(node)
+        else:
+            self._nodes[wd] = node
+
+    def _read_events(self) -> Tuple[set, bool]:
+        wds, overflow = set(), False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size + length
+                if mask & self._IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & (self._IN_IGNORED | self._IN_DELETE_SELF | self._IN_MOVE_SELF):
+                    # 目录本身被删除或移走，其父目录也会收到事件并重新扫描
+                    if self._nodes.pop(wd, None) is not None and not mask & self._IN_IGNORED:
+                        self._libc.inotify_rm_watch(self._fd, wd)
+                else:
+                    wds.add(wd)
+        return wds, overflow
+
+    def changed(self, root:_DirNode) -> Iterator[_DirNode]:
+        wds, overflow = self._read_events()
+        if overflow:
+            # 事件队列溢出时无法知道哪些目录发生了变化，退回到逐个检查
+            yield from super().changed(root)
+            return
+        for wd in wds:
+            node = self._nodes.get(wd)
+            if node is not None:
+                yield node
+        self._unwatched = [node for node in self._unwatched if os.path.isdir(node.path)]
+        for node in self._unwatched:
+            if node.stale:
+                yield node
+
+    def __del__(self) -> None:
+        try:
+            os.close(self._fd)
+        except Exception:
+            pass
+
+def _make_tracker() -> _PollingTracker:
+    if sys.platform.startswith('linux'):
+        try:
+            return _InotifyTracker()
+        except (OSError, AttributeError):
+            pass
+    return _PollingTracker()
+
 class FileManager:
+    max_read_bytes = 256 * 1024     # read_file未指定max_bytes时单次最多返回的字节数
+    max_index_bytes = 1024 * 1024   # search_files只索引不超过该大小的文本文件
+
     def __init__(self, dir_path:str, level:int=3) -> None:
         self.level = level
         self.dir_path = dir_path
-        self.files = os.listdir(dir_path)
-        if level >= 1:
-            for idx, file in enumerate(self.files):
-                if os.path.isdir(os.path.join(dir_path, file)):
-                    self.files[idx] = FileManager(os.path.join(dir_path, file), level-1)
+        self._line_index = {}   # path(str) : ((mtime, size), 换行符累计数量)
+        # 目录树按需展开：只有在列出或读取某个目录时才会扫描它，工具接口只在根管理器上注册一次
+        # 已读取的目录由变化追踪器（inotify或轮询）监视，只有发生变化的目录才会重新扫描
+        self._tracker = _make_tracker()
+        self._root = _DirNode(dir_path, self._tracker)
+        # 全文索引在第一次调用search_files时建立，之后随文件的写入、删除和磁盘变化增量更新
+        self._index = None
+        self._index_stamps = {}     # 相对路径(str) : 索引时文件的(mtime, size)
+        self._index_dirs = {}       # 相对目录(str) : 目录中已索引的文件名集合
         self.build_function()
         return
-    
+
+    @property
+    def files(self) -> list:
+        self.refresh()
+        return list(self._root.entries)
+
+    def _locate(self, rel_path:str) -> Tuple[Optional[_DirNode], str]:
+        # 返回相对路径所在目录的节点和文件名；路径不在目录树内时节点为None
+        parts = [p for p in os.path.normpath(rel_path).split(os.sep) if p and p != '.']
+        if not parts:
+            return None, ''
+        node = self._root
+        try:
+            for part in parts[:-1]:
+                node = node.child(part)
+        except (ValueError, OSError):
+            return None, parts[-1]
+        return node, parts[-1]
+
+    def _dir_node(self, rel_path:str) -> _DirNode:
+        parent, name = self._locate(rel_path)
+        if not name:
+            return self._root
+        if parent is None:
+            raise ValueError(f'Directory {rel_path} not found in {self.dir_path}.')
+        return parent.child(name)
+
     def build_function(self):
         self.function = AIFunction([], [])
         self.function.add_function(
             name='read_file',
-            description='读取指定文件的内容，并以特定格式返回文件名和内容。',
+            description='读取指定文件的内容，并以特定格式返回文件名、文件信息（总字节数、总行数、本次返回的范围）和内容。大文件可以按行或按字节分页读取，不指定范围时最多返回256KB。',
             parameters={
-                'file_name': {'type': 'string', 'description': '要读取的文件名，必须存在于当前目录中。'}
+                'file_name': {'type': 'string', 'description': '要读取的文件名，必须存在于当前目录中。'},
+                'start_line': {'type': 'integer', 'description': '可选，从第几行开始读取（从1开始）。'},
+                'end_line': {'type': 'integer', 'description': '可选，读取到第几行为止（包含该行）。'},
+                'offset': {'type': 'integer', 'description': '可选，从第几个字节开始读取（从0开始），仅在未指定行范围时生效。'},
+                'length': {'type': 'integer', 'description': '可选，读取的字节数，仅在未指定行范围时生效。'},
+                'max_bytes': {'type': 'integer', 'description': '可选，本次最多返回的字节数，超出部分会被截断。'}
             },
             required=['file_name'],
             function=self.read_file
@@ -42,6 +474,58 @@ class FileManager:
             required=['file_name', 'content'],
             function=self.write_file
         )
+        self.function.add_function(
+            name='write_files',
+            description='在一次调用中写入多个文件，文件不存在则创建新文件。所有文件先写入临时文件，全部成功后才替换目标文件，需要同时保存多个文件时应优先使用此工具。',
+            parameters={
+                'files': {
+                    'type': 'array',
+                    'description': '要写入的文件列表。',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'file_name': {'type': 'string', 'description': '要写入的文件名，可以是新文件或现有文件。'},
+                            'content': {'type': 'string', 'description': '要写入文件的内容。'}
+                        },
+                        'required': ['file_name', 'content']
+                    }
+                }
+            },
+            required=['files'],
+            function=self.write_files
+        )
+        self.function.add_function(
+            name='edit_file',
+            description='修改已有文件的部分内容，不需要重新发送整个文件。edits和diff二选一：edits是search/replace修改列表，search必须与文件中的原文完全一致且只出现一次；diff是统一diff格式（unified diff）的补丁，上下文行必须与文件一致。只修改少量内容时应优先使用此工具而不是write_file。',
+            parameters={
+                'file_name': {'type': 'string', 'description': '要修改的文件名，必须存在于当前目录中。'},
+                'edits': {
+                    'type': 'array',
+                    'description': '可选，按顺序应用的search/replace修改列表。',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'search': {'type': 'string', 'description': '要替换的原文，必须在文件中恰好出现一次，可以包含多行。'},
+                            'replace': {'type': 'string', 'description': '替换后的内容。'}
+                        },
+                        'required': ['search', 'replace']
+                    }
+                },
+                'diff': {'type': 'string', 'description': '可选，统一diff格式的补丁，每个hunk以"@@ -起始行,行数 +起始行,行数 @@"开头。'}
+            },
+            required=['file_name'],
+            function=self.edit_file
+        )
+        self.function.add_function(
+            name='search_files',
+            description='在当前目录下所有文本文件的内容中全文检索（支持中文），返回最相关的文件以及命中的行号和内容片段。需要查找资料或定位内容时应先使用此工具，而不是逐个读取文件。',
+            parameters={
+                'query': {'type': 'string', 'description': '要检索的关键词或短语，中文关键词至少包含两个字。'},
+                'max_results': {'type': 'integer', 'description': '可选，最多返回的文件数量，默认为10。'}
+            },
+            required=['query'],
+            function=self.search_files
+        )
         self.function.add_function(
             name='add_dir',
             description='在当前目录下创建一个新的子目录。',
@@ -71,8 +555,15 @@ class FileManager:
         )
         self.function.add_function(
             name='list_files',
-            description='以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。',
-            parameters={},
+            description='以树状图的形式列出当前目录下的文件和子目录，默认显示3层结构。可以限制层数和条目数、按glob模式筛选、选择排序方式，条目过多的目录会折叠为数量统计。',
+            parameters={
+                'depth': {'type': 'integer', 'description': '可选，展开子目录的层数，默认为3。'},
+                'max_entries': {'type': 'integer', 'description': '可选，最多显示的条目数，默认为200。'},
+                'include': {'type': 'array', 'items': {'type': 'string'}, 'description': '可选，只显示文件名匹配这些glob模式的文件，例如["*.md", "step_*"]，没有匹配文件的子目录不显示。'},
+                'exclude': {'type': 'array', 'items': {'type': 'string'}, 'description': '可选，不显示名称匹配这些glob模式的文件和子目录，例如["*.jpg", "__pycache__"]。'},
+                'sort': {'type': 'string', 'enum': ['name', 'mtime', 'size'], 'description': '可选，排序方式：name按名称，mtime最近修改的在前，size最大的在前，默认为name。子目录总是排在文件前面。'},
+                'max_per_dir': {'type': 'integer', 'description': '可选，每个目录最多显示的条目数，超出部分折叠为数量统计，默认为50。'}
+            },
             required=[],
             function=self.list_files
         )
@@ -85,9 +576,15 @@ class FileManager:
         )
         self.function.add_function(
             name='view_dir',
-            description='查看当前目录下指定子目录的树状结构，返回字符串。',
+            description='查看当前目录下指定子目录的树状结构，返回字符串。支持与list_files相同的筛选和限制参数。',
             parameters={
-                'dir_name': {'type': 'string', 'description': '要查看的子目录名称，必须在当前目录中存在。'}
+                'dir_name': {'type': 'string', 'description': '要查看的子目录名称，必须在当前目录中存在。'},
+                'depth': {'type': 'integer', 'description': '可选，展开子目录的层数，默认为3。'},
+                'max_entries': {'type': 'integer', 'description': '可选，最多显示的条目数，默认为200。'},
+                'include': {'type': 'array', 'items': {'type': 'string'}, 'description': '可选，只显示文件名匹配这些glob模式的文件，例如["*.md", "step_*"]，没有匹配文件的子目录不显示。'},
+                'exclude': {'type': 'array', 'items': {'type': 'string'}, 'description': '可选，不显示名称匹配这些glob模式的文件和子目录，例如["*.jpg", "__pycache__"]。'},
+                'sort': {'type': 'string', 'enum': ['name', 'mtime', 'size'], 'description': '可选，排序方式：name按名称，mtime最近修改的在前，size最大的在前，默认为name。子目录总是排在文件前面。'},
+                'max_per_dir': {'type': 'integer', 'description': '可选，每个目录最多显示的条目数，超出部分折叠为数量统计，默认为50。'}
             },
             required=['dir_name'],
             function=self.view_dir
@@ -95,55 +592,251 @@ class FileManager:
         return
     
     def refresh(self)->None:
-        self.files = os.listdir(self.dir_path)
-        if self.level >= 1:
-            for idx, file in enumerate(self.files):
-                if os.path.isdir(os.path.join(self.dir_path, file)):
-                    self.files[idx] = FileManager(os.path.join(self.dir_path, file), self.level-1)
+        for node in self._tracker.changed(self._root):
+            try:
+                node.scan()
+            except OSError:
+                # 目录已被删除，其父目录重新扫描后会将其从目录树中移除
+                continue
+            if self._index is not None:
+                self._index_node(node, False)
 
-    def read_file(self, file_name:str) -> TextFileContent:
+    def read_file(self, file_name:str, start_line:Optional[int]=None, end_line:Optional[int]=None,
+                  offset:Optional[int]=None, length:Optional[int]=None, max_bytes:Optional[int]=None) -> TextFileContent:
         # 支持直接传入相对路径，例如 'subdir/file.txt' 或多级路径
         norm_name = os.path.normpath(file_name)
         target_path = os.path.join(self.dir_path, norm_name)
-        # 如果目标路径存在且是文件，直接读取（支持子目录）
-        if os.path.exists(target_path) and os.path.isfile(target_path):
-            try:
-                with open(target_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return str(TextFileContent(file_name, content))
-            except:
-                return '无法打开文件。请检查文件是否存在，并且文件名是否正确。不支持查看非文本文件。'
-        # 否则按照原有行为报错（文件不存在于当前管理器目录下）
-        raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
+        # 如果目标路径不存在或不是文件，按照原有行为报错（文件不存在于当前管理器目录下）
+        if not os.path.isfile(target_path):
+            raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
+        if max_bytes is None:
+            max_bytes = self.max_read_bytes
+        if max_bytes <= 0:
+            raise ValueError('max_bytes must be a positive integer.')
+        try:
+            with open(target_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                # 大文件通过mmap按需访问，只有返回的窗口会被复制到内存中
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size >= _MMAP_THRESHOLD else f.read()
+                try:
+                    window = _ReadWindow(buf, self._line_counts(target_path, st, buf))
+                    info = window.select(start_line, end_line, offset, length, max_bytes)
+                    content = buf[window.begin:window.end].decode('utf-8')
+                finally:
+                    if isinstance(buf, mmap.mmap):
+                        buf.close()
+        except (OSError, UnicodeDecodeError):
+            return '无法打开文件。请检查文件是否存在，并且文件名是否正确。不支持查看非文本文件。'
+        return str(TextFileContent(file_name, content, info))
+
+    def _line_counts(self, path:str, st:os.stat_result, buf) -> List[int]:
+        # 每个1MiB块之前的换行符累计数量，用于在不读取整个文件的情况下定位行号；按(mtime, size)缓存
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._line_index.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        counts = [0]
+        for pos in range(0, len(buf), _LINE_BLOCK):
+            counts.append(counts[-1] + buf[pos:pos+_LINE_BLOCK].count(b'\n'))
+        if len(buf) >= _MMAP_THRESHOLD:
+            self._line_index[path] = (key, counts)
+        return counts
     
     def write_file(self, file_name:str, content:str) -> None:
-        with open(os.path.join(self.dir_path, file_name), 'w', encoding='utf-8') as f:
-            f.write(content)
-        if file_name not in self.files:
-            self.files.append(file_name)
+        # 先写入临时文件并fsync，再原子地替换目标文件，崩溃或并发写入时不会留下写了一半的文件
+        _atomic_write(os.path.join(self.dir_path, file_name), str(content))
+        parent, name = self._locate(file_name)
+        if parent is not None:
+            parent.put(name, False)
+            if self._index is not None:
+                self._index_file(os.path.normpath(file_name))
+
+    def write_files(self, files:List[dict]) -> str:
+        targets = {}
+        for idx, item in enumerate(files, start=1):
+            if not isinstance(item, dict) or 'file_name' not in item or 'content' not in item:
+                raise ValueError(f'Item {idx} must be an object with file_name and content.')
+            path = os.path.normpath(os.path.join(self.dir_path, item['file_name']))
+            if path in targets:
+                raise ValueError(f'File {item["file_name"]} appears more than once.')
+            targets[path] = (item['file_name'], str(item['content']).encode('utf-8'))
+        # 第一阶段：写入所有临时文件，任何一个失败都不会修改目标文件
+        temps = []
+        try:
+            for path, (_, data) in targets.items():
+                temps.append((_write_temp(path, data), path))
+        except BaseException:
+            for tmp, _ in temps:
+                os.unlink(tmp)
+            raise
+        # 第二阶段：依次替换目标文件，每个目录只fsync一次
+        dirs = set()
+        for tmp, path in temps:
+            os.replace(tmp, path)
+            dirs.add(os.path.dirname(path))
+        for dir_name in dirs:
+            _fsync_dir(dir_name)
+        for file_name, _ in targets.values():
+            parent, name = self._locate(file_name)
+            if parent is not None:
+                parent.put(name, False)
+                if self._index is not None:
+                    self._index_file(os.path.normpath(file_name))
+        return f'已写入{len(targets)}个文件：' + '、'.join(file_name for file_name, _ in targets.values())
+    
+    def edit_file(self, file_name:str, edits:Optional[List[dict]]=None, diff:Optional[str]=None) -> str:
+        if (edits is None) == (diff is None):
+            raise ValueError('Exactly one of edits and diff must be provided.')
+        target_path = os.path.join(self.dir_path, os.path.normpath(file_name))
+        if not os.path.isfile(target_path):
+            raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
+        with open(target_path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        if edits is not None:
+            text, count = _apply_replacements(text, edits)
+        else:
+            text, count = _apply_unified_diff(text, diff)
+        _atomic_write(target_path, text)
+        if self._index is not None and self._locate(file_name)[0] is not None:
+            self._index_file(os.path.normpath(file_name))
+        nlines = text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+        return f'已修改文件{file_name}：共应用{count}处修改，修改后文件共{nlines}行。'
+    
+    def search_files(self, query:str, max_results:int=10) -> str:
+        if self._index is None:
+            self.refresh()
+            self._index = TextIndex()
+            self._index_node(self._root, True)
+        else:
+            self.refresh()
+        results = self._index.search(query, k=max_results)
+        # 轮询模式下无法察觉文件内容的原地修改，返回前校验命中文件的修改时间和大小
+        stale = [doc for doc, _, _ in results if self._file_stamp(doc) != self._index_stamps.get(doc)]
+        if stale:
+            for doc in stale:
+                self._index_file(doc)
+            results = self._index.search(query, k=max_results)
+        if not results:
+            return f'没有找到与“{query}”相关的文件内容。'
+        res = f'以下是与“{query}”最相关的{len(results)}个文件（按相关度排序），格式为“行号: 内容”：\n'
+        for rank, (doc, _, line_nos) in enumerate(results, start=1):
+            res += f'[{rank}] {doc}\n'
+            wanted, last = set(line_nos), max(line_nos)
+            try:
+                with open(os.path.join(self.dir_path, doc), 'r', encoding='utf-8') as f:
+                    for line_no, line in enumerate(f, start=1):
+                        if line_no in wanted:
+                            line = line.strip()
+                            res += f'  {line_no}: {line[:120]}{"…" if len(line) > 120 else ""}\n'
+                        if line_no >= last:
+                            break
+            except (OSError, UnicodeDecodeError):
+                continue
+        return res
+
+    def _file_stamp(self, rel:str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(os.path.join(self.dir_path, rel))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _index_file(self, rel:str) -> None:
+        # 只索引不超过max_index_bytes的UTF-8文本文件，其他文件（或已删除的文件）从索引中移除
+        path = os.path.join(self.dir_path, rel)
+        try:
+            st = os.stat(path)
+            if st.st_size > self.max_index_bytes:
+                raise ValueError
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError, ValueError):
+            self._unindex(rel)
+            return
+        self._index.add(rel, text)
+        self._index_stamps[rel] = (st.st_mtime_ns, st.st_size)
+        self._index_dirs.setdefault(os.path.dirname(rel), set()).add(os.path.basename(rel))
+
+    def _unindex(self, rel:str) -> None:
+        if self._index_stamps.pop(rel, None) is None:
+            return
+        self._index.remove(rel)
+        names = self._index_dirs.get(os.path.dirname(rel))
+        names.discard(os.path.basename(rel))
+        if not names:
+            del self._index_dirs[os.path.dirname(rel)]
+
+    def _unindex_tree(self, rel_dir:str) -> None:
+        prefix = rel_dir + os.sep
+        for rel in [rel for rel in self._index_stamps if rel.startswith(prefix)]:
+            self._unindex(rel)
+
+    def _index_node(self, node:_DirNode, recursive:bool) -> None:
+        # 使索引与一个（刚扫描过的）目录一致；新出现的子目录会被递归索引，已展开的子目录由它们自己的变化事件处理
+        rel_dir = '' if node is self._root else os.path.relpath(node.path, self.dir_path)
+        entries = node.entries
+        for name in list(self._index_dirs.get(rel_dir, ())):
+            entry = entries.get(name)
+            if entry is None or entry.is_dir:
+                self._unindex(os.path.join(rel_dir, name))
+        prefix = rel_dir + os.sep if rel_dir else ''
+        for indexed_dir in list(self._index_dirs):
+            if indexed_dir.startswith(prefix) and indexed_dir != rel_dir:
+                top = indexed_dir[len(prefix):].split(os.sep, 1)[0]
+                if top not in entries or not entries[top].is_dir:
+                    self._unindex_tree(prefix + top)
+        for name, entry in list(entries.items()):
+            if name.startswith('.') or name == '__pycache__':
+                continue
+            rel = os.path.join(rel_dir, name)
+            if entry.is_dir:
+                if recursive or name not in node._children:
+                    try:
+                        self._index_node(node.child(name), True)
+                    except OSError:
+                        pass
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if self._index_stamps.get(rel) != (st.st_mtime_ns, st.st_size):
+                self._index_file(rel)
     
-    def view_dir(self, dir_name:str) -> str:
+    def view_dir(self, dir_name:str, depth:int=3, max_entries:int=200, include:Optional[Union[str, List[str]]]=None,
+                 exclude:Optional[Union[str, List[str]]]=None, sort:str='name', max_per_dir:int=50) -> str:
         dir_path = os.path.join(self.dir_path, dir_name)
         if not os.path.exists(dir_path):
             raise ValueError(f'Directory {dir_name} not found in {self.dir_path}.')
         if not os.path.isdir(dir_path):
             raise ValueError(f'{dir_name} is not a directory in {self.dir_path}.')
-        sub_manager = FileManager(dir_path, 3)
-        return sub_manager.list_files()
+        self.refresh()
+        try:
+            node = self._dir_node(dir_name)
+        except ValueError:
+            # 不在目录树内的路径（例如包含..）不做缓存，临时读取
+            node = _DirNode(dir_path)
+        return self._render(node, dir_path, depth, max_entries, include, exclude, sort, max_per_dir)
 
     def add_dir(self, dir_name:str) -> None:
         new_dir_path = os.path.join(self.dir_path, dir_name)
         if not os.path.exists(new_dir_path):
             os.makedirs(new_dir_path)
-            self.files.append(FileManager(new_dir_path, self.level-1))
+            parent, name = self._locate(dir_name)
+            if parent is not None:
+                parent.put(name, True)
         else:
             raise ValueError(f'Directory {dir_name} already exists in {self.dir_path}.')
     
     def delete_file(self, file_name:str) -> None:
-        if file_name not in self.files:
+        parent, name = self._locate(file_name)
+        entry = parent.entries.get(name) if parent is not None else None
+        if entry is None or entry.is_dir:
             raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
         os.remove(os.path.join(self.dir_path, file_name))
-        self.files.remove(file_name)
+        parent.drop(name)
+        if self._index is not None:
+            self._unindex(os.path.normpath(file_name))
     
     def delete_dir(self, dir_name:str) -> None:
         dir_path = os.path.join(self.dir_path, dir_name)
@@ -152,17 +845,79 @@ class FileManager:
         if not os.path.isdir(dir_path):
             raise ValueError(f'{dir_name} is not a directory in {self.dir_path}.')
         os.rmdir(dir_path)
-        self.files = [f for f in self.files if not (isinstance(f, FileManager) and f.dir_path == dir_path)]
+        parent, name = self._locate(dir_name)
+        if parent is not None:
+            parent.drop(name)
+            if self._index is not None:
+                self._unindex_tree(os.path.normpath(dir_name))
     
-    def list_files(self) -> str:
-        # 输出当前目录下的所有文件和文件夹的树状图（3层）
-        res = f'{self.dir_path}/\n'
-        for file in self.files:
-            if isinstance(file, FileManager):
-                res += '  ' + file.list_files().replace('\n', '\n  ') + '\n'
-            else:
-                res += f'  {file}\n'
-        return res
+    def list_files(self, depth:Optional[int]=None, max_entries:int=200, include:Optional[Union[str, List[str]]]=None,
+                   exclude:Optional[Union[str, List[str]]]=None, sort:str='name', max_per_dir:int=50) -> str:
+        # 输出当前目录下的所有文件和文件夹的树状图（默认3层）
+        self.refresh()
+        depth = self.level if depth is None else depth
+        return self._render(self._root, self.dir_path, depth, max_entries, include, exclude, sort, max_per_dir)
+
+    def _render(self, node:_DirNode, label:str, depth:int, max_entries:int=200, include=None, exclude=None,
+                sort:str='name', max_per_dir:int=50) -> str:
+        if sort not in _SORT_KEYS:
+            raise ValueError(f'Invalid sort order {sort}, must be one of {", ".join(_SORT_KEYS)}.')
+        includes, excludes = _as_patterns(include), _as_patterns(exclude)
+        sort_key = _SORT_KEYS[sort]
+        lines = [f'{label}/']
+        remaining = max_entries
+
+        def visit(node:_DirNode, indent:str, level:int) -> None:
+            # 逐行追加到lines中，最后一次性拼接，整体耗时与输出的行数成正比
+            nonlocal remaining
+            dirs, files = [], []
+            for name, entry in node.entries.items():
+                if any(fnmatch.fnmatch(name, p) for p in excludes):
+                    continue
+                if entry.is_dir:
+                    dirs.append(entry)
+                elif not includes or any(fnmatch.fnmatch(name, p) for p in includes):
+                    files.append(entry)
+            dirs.sort(key=sort_key)
+            files.sort(key=sort_key)
+            shown_dirs = shown_files = pruned = 0
+            for entry in dirs:
+                if remaining <= 0 or shown_dirs + shown_files >= max_per_dir:
+                    break
+                mark = len(lines)
+                lines.append(f'{indent}{entry.name}/')
+                remaining -= 1
+                if level >= 1:
+                    try:
+                        visit(node.child(entry.name), indent + '  ', level - 1)
+                    except OSError:
+                        pass
+                    if includes and len(lines) == mark + 1:
+                        # 有include筛选时，不显示没有匹配文件的子目录
+                        del lines[mark:]
+                        remaining += 1
+                        pruned += 1
+                        continue
+                shown_dirs += 1
+            for entry in files:
+                if remaining <= 0 or shown_dirs + shown_files >= max_per_dir:
+                    break
+                lines.append(f'{indent}{entry.name}')
+                remaining -= 1
+                shown_files += 1
+            hidden_dirs, hidden_files = len(dirs) - shown_dirs - pruned, len(files) - shown_files
+            if hidden_dirs or hidden_files:
+                parts = []
+                if hidden_dirs:
+                    parts.append(f'{hidden_dirs}个子目录')
+                if hidden_files:
+                    parts.append(f'{hidden_files}个文件')
+                lines.append(f'{indent}…（另有{"、".join(parts)}未显示）')
+
+        visit(node, '  ', depth)
+        if remaining <= 0:
+            lines.append(f'（已达到{max_entries}个条目的上限，可以用depth、include、exclude参数或view_dir缩小范围）')
+        return '\n'.join(lines) + '\n'
     
     def __str__(self) -> str:
         return self.list_files()
@@ -171,42 +926,71 @@ class FileManager:
         return self.function(__func_name, *args, **kwargs)
 
 FileManager.__doc__ = '''FileManager类用于管理文件系统中的文件和目录。它包含以下方法：
-- __init__(self, dir_path:str, level:int=3): 初始化文件管理器，接受一个目录路径和一个层级参数，层级参数用于控制递归读取子目录的深度。
+- __init__(self, dir_path:str, level:int=3): 初始化文件管理器，接受一个目录路径和一个层级参数，层级参数用于控制列出子目录的深度。目录树基于os.scandir按需展开，初始化时不会读取磁盘，只有在列出或读取某个目录时才会扫描该目录，并缓存DirEntry中的类型和stat信息。已读取的目录会被变化追踪器监视：Linux上使用inotify，其他平台或无法添加监视时按目录轮询mtime/size，列出文件前只重新扫描发生变化的目录。
 - build_function(self): 构建文件管理器的函数接口，定义了读取文件内容、写入文件、创建目录、删除文件、删除目录和列出文件等功能。
 - read_file(self, file_name:str) -> TextFileContent: 读取指定文件的内容，并以特定格式返回文件名和内容。
 - write_file(self, file_name:str, content:str) -> None: 将指定内容写入指定文件，如果文件不存在则创建新文件。
+- write_files(self, files:List[dict]) -> str: 在一次调用中原子地写入多个文件。
+- edit_file(self, file_name:str, edits:Optional[List[dict]]=None, diff:Optional[str]=None) -> str: 通过search/replace或统一diff修改文件的部分内容。
+- search_files(self, query:str, max_results:int=10) -> str: 全文检索目录下的文本文件，返回最相关的文件和命中的行。
 - add_dir(self, dir_name:str) -> None: 在当前目录下创建一个新的子目录。
 - delete_file(self, file_name:str) -> None: 删除当前目录下的指定文件。
 - delete_dir(self, dir_name:str) -> None: 删除当前目录下的指定子目录。
-- list_files(self) -> str: 以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。
+- list_files(self, depth=None, max_entries=200, include=None, exclude=None, sort='name', max_per_dir=50) -> str: 以树状图的形式列出当前目录下的文件和子目录，支持限制层数和条目数、按glob模式筛选和排序。
 - __str__(self) -> str: 返回当前目录下的所有文件和子目录的树状图表示。
 - __call__(self, __func_name:str, *args, **kwargs): 根据函数名称调用对应的函数实现，并传递参数。'''
 FileManager.build_function.__doc__ = '''build_function方法用于构建文件管理器的函数接口，定义了以下功能：
 - read_file: 读取指定文件的内容，并以特定格式返回文件名和内容。参数包括file_name，表示要读取的文件名，必须存在于当前目录中。
 - write_file: 将指定内容写入指定文件，如果文件不存在则创建新文件。参数包括file_name，表示要写入的文件名，可以是新文件或现有文件；content，表示要写入文件的内容。
+- write_files: 在一次调用中写入多个文件。参数包括files，表示由file_name和content组成的对象列表。
+- edit_file: 修改已有文件的部分内容。参数包括file_name，表示要修改的文件名；edits，表示search/replace修改列表；diff，表示统一diff格式的补丁，edits和diff二选一。
+- search_files: 全文检索目录下的文本文件。参数包括query，表示检索的关键词；max_results，表示最多返回的文件数量。
 - add_dir: 在当前目录下创建一个新的子目录。参数包括dir_name，表示要创建的子目录名称，必须在当前目录中唯一。
 - delete_file: 删除当前目录下的指定文件。参数包括file_name，表示要删除的文件名，必须存在于当前目录中。
 - delete_dir: 删除当前目录下的指定子目录。参数包括dir_name，表示要删除的子目录名称，必须存在于当前目录中，并且是一个目录。
-- list_files: 以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。该功能不需要参数。
+- list_files: 以树状图的形式列出当前目录下的文件和子目录，默认显示3层结构。参数均为可选，包括depth、max_entries、include、exclude、sort和max_per_dir。
 注意：此函数会在__init__方法中被自动调用，请不要手动调用该函数。'''
 FileManager.read_file.__doc__ = '''read_file方法用于读取指定文件的内容，并以特定格式返回文件名和内容。它接受以下参数：
 - file_name: 要读取的文件名，必须存在于当前目录中。
-该方法会检查指定的文件是否存在于当前目录中，如果存在，则打开文件并读取其内容，然后返回一个TextFileContent对象的字符串表示形式，其中包含文件名和文件内容。'''
+- start_line, end_line: 可选，按行读取的范围（从1开始，包含end_line）。只指定其中一个时，另一个默认为文件开头或结尾。
+- offset, length: 可选，按字节读取的范围，仅在未指定行范围时生效，范围边界会对齐到UTF-8字符的起始位置。
+- max_bytes: 可选，本次最多返回的字节数，默认为类属性max_read_bytes（256KB）。按行读取时截断到最后一个完整的行。
+该方法会检查指定的文件是否存在于当前目录中，如果存在，则读取指定范围的内容，然后返回一个TextFileContent对象的字符串表示形式，其中包含文件名、文件信息（总字节数、总行数以及本次返回的行和字节范围）和文件内容。
+大于1MB的文件通过mmap访问，不会被完整读入内存；用于定位行号的换行符索引会按文件的修改时间和大小缓存，重复分页读取时无需重新扫描。'''
 FileManager.write_file.__doc__ = '''write_file方法用于将指定内容写入指定文件，如果文件不存在则创建新文件。它接受以下参数：
 - file_name: 要写入的文件名，可以是新文件或现有文件。
 - content: 要写入文件的内容。
-该方法会打开指定的文件进行写入，如果文件不存在则创建新文件，然后将内容写入文件中。如果写入成功且文件之前不存在，则会将新文件名添加到当前目录的文件列表中。'''
+该方法会先把内容写入同一目录下的临时文件并fsync，再通过os.replace原子地替换目标文件，最后fsync所在目录，因此崩溃或多个进程同时写入时不会留下写了一半的文件。如果文件所在目录已经被读取过，则会同步更新缓存的文件列表。'''
+FileManager.write_files.__doc__ = '''write_files方法用于在一次调用中写入多个文件，如果文件不存在则创建新文件。它接受以下参数：
+- files: 要写入的文件列表，每一项是一个包含file_name和content的字典，同一个文件不能出现多次。
+该方法分两个阶段执行：先为每个文件写入临时文件并fsync，任何一个失败都会删除已写入的临时文件并抛出异常，目标文件保持不变；全部成功后再依次用os.replace替换目标文件，并对涉及的每个目录只fsync一次。返回写入文件的汇总信息。'''
+FileManager.edit_file.__doc__ = '''edit_file方法用于修改已有文件的部分内容，使输出的token数量和耗时只与修改的大小有关，而与文件大小无关。它接受以下参数：
+- file_name: 要修改的文件名，必须存在于当前目录中。
+- edits: 可选，search/replace修改列表，每一项是包含search和replace的字典。修改按顺序应用，每个search必须在当前内容中恰好出现一次，找不到或出现多次都会抛出ValueError异常。
+- diff: 可选，统一diff格式的补丁。每个hunk的上下文行和删除行必须与文件内容一致；如果hunk头中的行号不准确，会在文件中查找唯一匹配的位置，找不到或匹配多处都会抛出ValueError异常。
+edits和diff必须且只能提供一个。所有修改都在内存中完成并校验，全部成功后才原子地写回文件，任何一处失败都不会修改文件。返回应用的修改数量和修改后的行数。'''
+FileManager.search_files.__doc__ = '''search_files方法用于在当前目录下所有文本文件的内容中全文检索，一次调用即可找到需要的资料。它接受以下参数：
+- query: 要检索的关键词或短语。中文按相邻两个字切分，因此中文关键词至少需要两个字。
+- max_results: 最多返回的文件数量，默认为10。
+第一次调用时会遍历目录树，为不超过max_index_bytes（1MB）的UTF-8文本文件建立倒排索引（TextIndex），以.开头的文件和目录以及__pycache__会被跳过。之后通过write_file、write_files、edit_file、delete_file、delete_dir进行的修改会立即更新索引，磁盘上的其他变化则在检索前通过变化追踪器增量同步，命中的文件在返回前还会校验修改时间和大小。
+返回按BM25相关度排序的文件列表，每个文件附带命中查询词最多的几行（行号和内容片段），可以再用read_file的start_line/end_line参数读取上下文。'''
 FileManager.add_dir.__doc__ = '''add_dir方法用于在当前目录下创建一个新的子目录。它接受以下参数：
 - dir_name: 要创建的子目录名称，必须在当前目录中唯一。
-该方法会检查指定的子目录名称是否在当前目录中已经存在，如果不存在，则创建新的子目录，并将一个新的FileManager对象添加到当前目录的文件列表中，以便管理新创建的子目录。如果指定的子目录名称已经存在，则会抛出一个ValueError异常。'''
+该方法会检查指定的子目录名称是否在当前目录中已经存在，如果不存在，则创建新的子目录，并同步更新缓存的文件列表，新目录会在第一次被访问时读取。如果指定的子目录名称已经存在，则会抛出一个ValueError异常。'''
 FileManager.delete_file.__doc__ = '''delete_file方法用于删除当前目录下的指定文件。它接受以下参数：
 - file_name: 要删除的文件名，必须存在于当前目录中。
-该方法会检查指定的文件是否存在于当前目录中，如果存在，则删除该文件，并将文件名从当前目录的文件列表中移除。如果指定的文件不存在，则会抛出一个ValueError异常。'''
+该方法会检查指定的文件是否存在于当前目录中，如果存在，则删除该文件，并将文件名从缓存的文件列表中移除。file_name支持相对路径，例如'subdir/file.txt'。如果指定的文件不存在，则会抛出一个ValueError异常。'''
 FileManager.delete_dir.__doc__ = '''delete_dir方法用于删除当前目录下的指定子目录。它接受以下参数：
 - dir_name: 要删除的子目录名称，必须存在于当前目录中，并且是一个目录。
-该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则删除该子目录，并将对应的FileManager对象从当前目录的文件列表中移除。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
-FileManager.list_files.__doc__ = '''list_files方法用于以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。该方法不需要参数。
-该方法会遍历当前目录的文件列表，对于每个文件，如果是一个FileManager对象，则递归调用其list_files方法来获取子目录的树状图表示；如果是一个普通文件，则直接添加到树状图中。最终返回一个字符串，表示当前目录下的所有文件和子目录的树状图结构。'''
+该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则删除该子目录，并将其从缓存的目录树中移除。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
+FileManager.list_files.__doc__ = '''list_files方法用于以树状图的形式列出当前目录下的文件和子目录。它接受以下参数，均为可选：
+- depth: 展开子目录的层数，默认为初始化时的层级参数level。
+- max_entries: 最多显示的条目数，默认为200，达到上限后停止输出并给出提示。
+- include: 只显示文件名匹配这些glob模式的文件（列表，或用逗号分隔的字符串），没有匹配文件的子目录不显示。
+- exclude: 不显示名称匹配这些glob模式的文件和子目录。
+- sort: 排序方式，'name'按名称，'mtime'最近修改的在前，'size'最大的在前，默认为'name'。子目录总是排在文件前面。
+- max_per_dir: 每个目录最多显示的条目数，默认为50，超出部分折叠为“另有N个子目录、M个文件未显示”。
+该方法会先同步变化追踪器报告的磁盘变化，再从当前目录开始展开（尚未读取的目录此时才会被扫描）。子目录只显示名称而不是完整路径，各行追加到列表中最后一次性拼接，耗时与输出的行数成正比。最终返回一个字符串，表示当前目录的树状图结构。'''
 FileManager.__str__.__doc__ = '''__str__方法用于返回当前目录下的所有文件和子目录的树状图表示。该方法不需要参数。
 该方法会调用list_files方法来获取当前目录下的所有文件和子目录的树状图表示，并返回该字符串。'''
 FileManager.__call__.__doc__ = '''__call__方法用于根据函数名称调用对应的函数实现，并传递参数。它接受以下参数：
@@ -215,7 +999,8 @@ FileManager.__call__.__doc__ = '''__call__方法用于根据函数名称调用
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
 该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
 FileManager.refresh.__doc__ = '''refresh方法用于刷新当前目录的文件列表（重新读取磁盘）。该方法不需要参数。
-该方法会重新读取当前目录的文件列表，并根据层级参数重新构建子目录的FileManager对象，以确保文件管理器的状态与磁盘上的实际文件系统保持一致。'''
+该方法会向变化追踪器查询自上次刷新以来发生变化的目录（inotify事件，或者目录mtime/size发生变化），只重新扫描这些目录，已删除的子目录会从目录树中移除，尚未读取过的目录不受影响，开销与变化的数量成正比而与目录树的大小无关。list_files和view_dir在列出文件前会自动调用该方法。'''
 FileManager.view_dir.__doc__ = '''view_dir方法用于查看当前目录下指定子目录的树状结构，返回字符串。它接受以下参数：
 - dir_name: 要查看的子目录名称，必须在当前目录中存在。
-该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则创建一个新的FileManager对象来管理该子目录，并调用其list_files方法来获取子目录的树状图表示，最终返回该字符串。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
\ No newline at end of file
+- depth, max_entries, include, exclude, sort, max_per_dir: 可选，含义与list_files相同，depth默认为3。
+该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则在已缓存的目录树中找到该子目录（不会重新构建管理器），按照参数展开并返回树状图字符串。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
\ No newline at end of file
@@ -0,0 +1,194 @@
+from .tool_manager import AIFunction
+from .text_index import TextIndex, tokenize
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+import re
+import array
+import random
+import sqlite3
+import hashlib
+import threading
+
+_MERSENNE = (1 << 61) - 1
+_SENTENCE_END = re.compile(r'(?<=[。！？；.!?;])\s*')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    text TEXT NOT NULL,
+    digest TEXT NOT NULL UNIQUE,
+    signature BLOB NOT NULL
+);
+'''
+
+class _TextExtractor(HTMLParser):
+    _SKIP = {'script', 'style', 'noscript', 'template', 'svg'}
+    _BLOCK = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article', 'blockquote', 'pre', 'table'}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts, self._skip = [], 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag in self._BLOCK:
+            self.parts.append('\n\n')
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+        elif tag in self._BLOCK:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def html_to_text(html:str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = ''.join(parser.parts)
+    return '\n\n'.join(' '.join(p.split()) for p in re.split(r'\n\s*\n', text) if p.strip())
+
+def chunk_text(text:str, max_chars:int=500) -> List[str]:
+    # 按段落拼接成不超过max_chars的块；过长的段落先按句子切分，单个句子仍然过长时直接截断
+    pieces = []
+    for para in re.split(r'\n\s*\n', text):
+        para = ' '.join(para.split())
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for sentence in _SENTENCE_END.split(para):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars) if sentence[i:i + max_chars].strip())
+    chunks, cur = [], ''
+    for piece in pieces:
+        if cur and len(cur) + 1 + len(piece) > max_chars:
+            chunks.append(cur)
+            cur = piece
+        else:
+            cur = f'{cur}\n{piece}' if cur else piece
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+class KnowledgeStore:
+    num_perm, bands = 64, 16        # MinHash签名长度与LSH分段数（每段4个值）
+    threshold = 0.8                 # 估计的Jaccard相似度不低于此值的块视为近似重复
+
+    def __init__(self, path:Optional[str]='.knowledge.sqlite3', chunk_chars:int=500) -> None:
+        self.path = path
+        self.chunk_chars = chunk_chars
+        rng = random.Random(20240601)   # 固定种子，保证保存的签名在重新打开后仍然可比
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(self.num_perm)]
+        self._index = TextIndex()
+        self._buckets = {}      # (段号, 段内签名) : [块编号]
+        self._signatures = {}   # 块编号 : 签名
+        self._texts = {}        # 块编号 : (来源, 文本)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ':memory:', timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        for chunk_id, source, text, signature in self._conn.execute('SELECT id, source, text, signature FROM chunks ORDER BY id'):
+            self._remember(chunk_id, source, text, tuple(array.array('Q', signature)))
+        self.build_function()
+        return
+
+    def build_function(self) -> None:
+        self.function = AIFunction([], [])
+        self.function.add_function(
+            name='recall',
+            description='从本地资料库中检索与问题最相关的资料片段。资料库中保存了之前的搜索结果和下载的文本文件，需要查找事实或数据时应先调用此工具，找不到时再联网搜索。',
+            parameters={
+                'query': {'type': 'string', 'description': '要查找的问题或关键词'},
+                'k': {'type': 'integer', 'description': '返回的资料片段数量，默认为5'}
+            },
+            required=['query'],
+            function=self.recall
+        )
+        return
+
+    def _signature(self, text:str) -> Tuple[int, ...]:
+        hashes = {int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little') for token in tokenize(text)}
+        if not hashes:
+            return (0,) * self.num_perm
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, signature:Tuple[int, ...]) -> List[tuple]:
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _remember(self, chunk_id:int, source:str, text:str, signature:Tuple[int, ...]) -> None:
+        self._index.add(str(chunk_id), text)
+        self._signatures[chunk_id] = signature
+        self._texts[chunk_id] = (source, text)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(chunk_id)
+        return
+
+    def _is_near_duplicate(self, signature:Tuple[int, ...]) -> bool:
+        # LSH：只和至少有一段签名完全相同的块比较
+        seen = set()
+        for key in self._band_keys(signature):
+            for chunk_id in self._buckets.get(key, ()):
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                other = self._signatures[chunk_id]
+                if sum(x == y for x, y in zip(signature, other)) >= self.threshold * self.num_perm:
+                    return True
+        return False
+
+    def add(self, text:str, source:str='') -> Tuple[int, int]:
+        added = skipped = 0
+        for chunk in chunk_text(text, self.chunk_chars):
+            digest = hashlib.sha256(' '.join(chunk.split()).casefold().encode('utf-8')).hexdigest()
+            signature = self._signature(chunk)
+            with self._lock:
+                if self._is_near_duplicate(signature):
+                    skipped += 1
+                    continue
+                cur = self._conn.execute(
+                    'INSERT OR IGNORE INTO chunks (source, text, digest, signature) VALUES (?, ?, ?, ?)',
+                    (source, chunk, digest, array.array('Q', signature).tobytes())
+                )
+                if cur.rowcount == 0:
+                    skipped += 1
+                    continue
+                self._remember(cur.lastrowid, source, chunk, signature)
+                added += 1
+        return added, skipped
+
+    def search(self, query:str, k:int=5) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            hits = self._index.search(query, k=k, max_lines=0)
+            return [self._texts[int(doc)] + (score,) for doc, score, _ in hits]
+
+    def recall(self, query:str, k:int=5) -> str:
+        hits = self.search(query, k)
+        if not hits:
+            return '资料库中没有找到相关内容。'
+        return '\n\n'.join(f'[{idx}] 来源：{source or "未知"}\n{text}' for idx, (source, text, _) in enumerate(hits, start=1))
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        return
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+KnowledgeStore.__doc__ = '''KnowledgeStore类是一个本地资料库，用于保存搜索结果和下载的文本资料，之后的步骤可以通过recall工具用很少的token取回需要的事实，而不必重新联网搜索。
+添加的文本按段落切分为不超过chunk_chars个字符的块；完全相同的块按内容摘要去重，近似重复的块用MinHash签名和LSH分桶检测（估计的Jaccard相似度不低于threshold时跳过）。
+块保存在SQLite文件中，打开时重新建立BM25索引（复用TextIndex），检索时返回得分最高的k个块及其来源。它包含以下方法：
+- __init__(self, path:Optional[str]='.knowledge.sqlite3', chunk_chars:int=500): 打开（或创建）资料库，path为None时只保存在内存中。
+- add(self, text:str, source:str=''): 添加一段文本，返回(新增的块数, 跳过的重复块数)。
+- search(self, query:str, k:int=5): 返回得分最高的k个块，每一项为(来源, 文本, 得分)。
+- recall(self, query:str, k:int=5): 返回格式化的检索结果，供模型调用。'''
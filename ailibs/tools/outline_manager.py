@@ -1,174 +1,299 @@
 from .tool_manager import AIFunction
-from typing import Union, Tuple
-import re
+from .file_manager import _atomic_write
+from typing import Optional, Union, Tuple
+from decimal import Decimal
+import os
+import json
+import heapq
+import itertools
+import atexit
 import bisect
+import weakref
+import warnings
+import threading
 
-class _VideoTime_hms:
-    def __init__(self, h:int, m:int, s:float)->None:
-        if s<0 or m<0 or h<0:
+def _scan_numbers(text:str)->list:
+    # 依次找出字符串中的所有数字（整数或带一位小数点的小数），等价于正则 \d+\.?\d*
+    numbers, i, n = [], 0, len(text)
+    while i < n:
+        if '0' <= text[i] <= '9':
+            j = i + 1
+            while j < n and '0' <= text[j] <= '9':
+                j += 1
+            if j < n and text[j] == '.':
+                j += 1
+                while j < n and '0' <= text[j] <= '9':
+                    j += 1
+            numbers.append(text[i:j])
+            i = j
+        else:
+            i += 1
+    return numbers
+
+def _number_cs(number:str)->int:
+    # 将数字字符串精确换算为百分之一单位（四舍五入到两位小数），不经过浮点数
+    whole, _, frac = number.partition('.')
+    frac = (frac + '000')[:3]
+    return int(whole) * 100 + (int(frac) + 5) // 10
+
+_HALF = Decimal('0.5')
+
+def _seconds_cs(seconds:Union[int, float])->int:
+    # 将秒数换算为百分之一单位，与_number_cs一样按十进制写法四舍五入（round会把0.125舍入为偶数0.12）
+    if type(seconds) is int:
+        return seconds * 100
+    return int(Decimal(repr(float(seconds))) * 100 + _HALF)
+
+_INF = float('inf')
+_REAL = (int, float)
+
+class VideoTime:
+    __slots__ = ('_cs',)
+
+    def __new__(cls, time:Union[str, 'VideoTime', Tuple[int, int, float], int, float] = None, *rest)->'VideoTime':
+        # 支持以下调用方式：VideoTime(h, m, s)，VideoTime((h,m,s))，VideoTime('h:m:s')，VideoTime(秒数)，或传入已有 VideoTime
+        if rest:
+            if len(rest) != 2:
+                raise ValueError('Invalid positional arguments for VideoTime')
+            return cls._from_hms(time, rest[0], rest[1])
+        if isinstance(time, str):
+            return cls._parse(time)
+        if isinstance(time, VideoTime):
+            # VideoTime是不可变的，可以直接复用
+            return time if type(time) is cls else cls._from_cs(time._cs)
+        if isinstance(time, tuple):
+            if len(time) != 3:
+                raise ValueError(f'Invalid tuple {time}.')
+            return cls._from_hms(*time)
+        if time is None:
+            return cls._from_cs(0)
+        if isinstance(time, (int, float)) and not isinstance(time, bool):
+            if not time >= 0:
+                raise ValueError(f'Invalid time, second={time}.')
+            return cls._from_cs(_seconds_cs(time))
+        raise TypeError(f'Unsupported type for VideoTime: {type(time).__name__}')
+
+    @classmethod
+    def _from_cs(cls, cs:int)->'VideoTime':
+        self = object.__new__(cls)
+        _set_cs(self, cs)
+        return self
+
+    @classmethod
+    def _from_hms(cls, h, m, s)->'VideoTime':
+        if type(h) is int and type(m) is int and type(s) in _REAL and h >= 0 and m >= 0 and 0 <= s < _INF:
+            self = object.__new__(cls)
+            _set_cs(self, (h * 3600 + m * 60) * 100 + _seconds_cs(s))
+            return self
+        try:
+            h, m, s = float(h), float(m), float(s)
+        except (TypeError, ValueError):
             raise ValueError(f'Invalid time, hour={h}, minute={m}, second={s}.')
-        self.h, self.m, self.s = h, m, s
-        self.flatten()
-        return
+        if not h.is_integer() or not m.is_integer():
+            raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
+        if not (h >= 0 and m >= 0 and 0 <= s < _INF):
+            raise ValueError(f'Invalid time, hour={h}, minute={m}, second={s}.')
+        return cls._from_cs((int(h) * 3600 + int(m) * 60) * 100 + _seconds_cs(s))
 
-    def flatten(self)->None:
-        h, m, s = self.h, self.m, self.s
-        if h%1!=0:
-            hm = (h%1)*60
-            m += hm
-            h = int(h)
-        if m%1!=0:
-            ms = (m%1)*60
-            s += ms
-            m = int(m)
-
-        if s>=60:
-            sm = s//60
-            s = s%60
-            m += sm
-        if m>=60:
-            mh = m//60
-            m = m%60
-            h += mh
-        self.h, self.m, self.s = h, m, s
-        return
+    @classmethod
+    def _parse(cls, text:str)->'VideoTime':
+        # 快速路径：规范的 h:m:s 格式直接换算，其他写法（如 00:01:30.5、[0:1:30]、0h1m30s）逐字符扫描数字
+        parts = text.split(':')
+        if len(parts) == 3 and text.isascii():
+            h, m, s = parts
+            whole, dot, frac = s.partition('.')
+            if h.isdigit() and m.isdigit() and whole.isdigit() and (frac.isdigit() or not frac):
+                frac = (frac + '000')[:3]
+                return cls._from_cs((int(h) * 3600 + int(m) * 60 + int(whole)) * 100 + (int(frac) + 5) // 10)
+        numbers = _scan_numbers(text)
+        if len(numbers) < 3:
+            raise ValueError(f"Could not find enough numbers in time string: '{text}'")
+        if len(numbers) > 3:
+            warnings.warn(f"Found more than 3 numbers in time string, only first 3 are used: '{text}'")
+        h, m, s = (_number_cs(number) for number in numbers[:3])
+        if h % 100 or m % 100:
+            raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
+        return cls._from_cs(h * 3600 + m * 60 + s)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('VideoTime is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('VideoTime is immutable')
+
+    def __reduce__(self):
+        return (self._from_cs, (self._cs,))
+
+    @property
+    def cs(self)->int:
+        return self._cs
+
+    @property
+    def seconds(self)->float:
+        return self._cs / 100
+
+    @property
+    def h(self)->int:
+        return self._cs // 360000
+
+    @property
+    def m(self)->int:
+        return self._cs // 6000 % 60
+
+    @property
+    def s(self)->float:
+        return self._cs % 6000 / 100
 
     def __str__(self)->str:
-        return f'{self.h}:{self.m}:{self.s}'
+        cs = self._cs
+        return f'{cs // 360000}:{cs // 6000 % 60}:{cs % 6000 / 100}'
+
+    def __repr__(self)->str:
+        return f"VideoTime('{self}')"
+
+    def __hash__(self):
+        return hash(self._cs)
 
     def __eq__(self, other):
-        return self.h==other.h and self.m==other.m and abs(self.s-other.s)<=0.01
+        try:
+            return self._cs == other._cs
+        except AttributeError:
+            return NotImplemented
 
     def __ne__(self, other):
-        return self.h!=other.h or self.m!=other.m or abs(self.s-other.s)>0.01
+        try:
+            return self._cs != other._cs
+        except AttributeError:
+            return NotImplemented
 
     def __lt__(self, other):
-        if self.h>other.h:
-            return False
-        elif self.h<other.h:
-            return True
-        
-        # self.h == other.h
-        elif self.m>other.m:
-            return False
-        elif self.m<other.m:
-            return True
-        
-        # self.m == other.m
-        elif abs(self.s-other.s)>0.01:
-            return self.s<other.s
-        else:
-            return False  # self==other
+        return self._cs < other._cs
 
     def __le__(self, other):
-        if self.h>other.h:
-            return False
-        elif self.h<other.h:
-            return True
-        
-        # self.h == other.h
-        elif self.m>other.m:
-            return False
-        elif self.m<other.m:
-            return True
-        
-        # self.m == other.m
-        elif abs(self.s-other.s)>0.01:
-            return self.s<other.s
-        else:
-            return True  # self==other
-
-    def __hash__(self):
-        total_cs = int(round((self.h * 3600 + self.m * 60 + self.s) * 100))
-        return hash(total_cs)
+        return self._cs <= other._cs
 
     def __gt__(self, other):
-        if self.h>other.h:
-            return True
-        elif self.h<other.h:
-            return False
-        
-        # self.h == other.h
-        elif self.m>other.m:
-            return True
-        elif self.m<other.m:
-            return False
-        
-        # self.m == other.m
-        elif abs(self.s-other.s)>0.01:
-            return self.s>other.s
-        else:
-            return False  # self==other
+        return self._cs > other._cs
 
     def __ge__(self, other):
-        if self.h>other.h:
-            return True
-        elif self.h<other.h:
-            return False
-        
-        # self.h == other.h
-        elif self.m>other.m:
-            return True
-        elif self.m<other.m:
-            return False
-        
-        # self.m == other.m
-        elif abs(self.s-other.s)>0.01:
-            return self.s>other.s
-        else:
-            return True  # self==other
+        return self._cs >= other._cs
 
+_set_cs = VideoTime._cs.__set__
+
+VideoTime.__doc__ = '''VideoTime类表示视频中的一个时间点，是一个不可变的值对象，内部只保存一个以0.01秒为单位的整数，精确到0.01s。
+比较、哈希都直接作用于这个整数，因此相差不到0.005s的时间点被视为同一个时间点。它支持以下构造方式：
+- VideoTime(h, m, s) 或 VideoTime((h, m, s)): 小时和分钟必须是整数，秒可以是小数，超过60的秒数和分钟数会自动进位。
+- VideoTime('h:m:s'): 从字符串中依次取出前三个数字作为时、分、秒，例如'0:1:30.5'、'00:01:30.5'、'0h1m30.5s'。
+- VideoTime(秒数): 从总秒数构造。
+- VideoTime(VideoTime): 直接返回同一个对象。
+属性h、m、s分别为时、分、秒（秒为浮点数），cs为总的百分之一秒数，seconds为总秒数。字符串形式为'h:m:s'，例如'0:1:30.5'。'''
+
+class _CueList:
+    __slots__ = ('_keys', '_items')
+
+    def __init__(self, items=())->None:
+        self._keys = []     # 按时间排序的时间点（以0.01秒为单位的整数），用于二分查找
+        self._items = {}    # cs(int) : (time(VideoTime), content(str))
+        for time, content in items:
+            self[time] = content
+        return
+
+    def __len__(self)->int:
+        return len(self._keys)
+
+    def __contains__(self, time:VideoTime)->bool:
+        return time.cs in self._items
+
+    def __getitem__(self, time:VideoTime)->str:
+        return self._items[time.cs][1]
+
+    def __setitem__(self, time:VideoTime, content:str)->None:
+        cs = time.cs
+        if cs not in self._items:
+            keys = self._keys
+            # 大纲通常按时间顺序填写，追加到末尾时不需要二分插入
+            if not keys or keys[-1] < cs:
+                keys.append(cs)
+            else:
+                bisect.insort(keys, cs)
+        self._items[cs] = (time, content)
+        return
+
+    def __delitem__(self, time:VideoTime)->None:
+        cs = time.cs
+        del self._items[cs]
+        keys = self._keys
+        del keys[bisect.bisect_left(keys, cs)]
+        return
+
+    def __iter__(self):
+        items = self._items
+        return (items[cs][0] for cs in self._keys)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        items = self._items
+        return (items[cs][1] for cs in self._keys)
+
+    def items(self):
+        items = self._items
+        return (items[cs] for cs in self._keys)
+
+    def span(self, begin:VideoTime, end:VideoTime)->Tuple[int, int]:
+        # begin到end之间（包含两端）的时间点在排序列表中的下标范围[lo, hi)
+        keys = self._keys
+        return bisect.bisect_left(keys, begin.cs), bisect.bisect_right(keys, end.cs)
+
+    def item(self, index:int)->Tuple[VideoTime, str]:
+        return self._items[self._keys[index]]
+
+    def islice(self, lo:int, hi:int):
+        # 按下标范围[lo, hi)逐个返回(时间点, 内容)，不复制整个区间
+        keys, items = self._keys, self._items
+        return (items[keys[i]] for i in range(lo, hi))
+
+    def irange(self, begin:VideoTime, end:VideoTime):
+        # 返回begin到end之间（包含两端）的所有(时间点, 内容)
+        keys, items = self._keys, self._items
+        lo, hi = self.span(begin, end)
+        return (items[cs] for cs in keys[lo:hi])
+
+    def nearest(self, time:VideoTime, k:int)->list:
+        # 返回距离time最近的至多k个(距离, 时间点, 内容)，距离以0.01秒为单位
+        keys, items = self._keys, self._items
+        cs = time.cs
+        right = bisect.bisect_left(keys, cs)
+        left = right - 1
+        res = []
+        while len(res) < k and (left >= 0 or right < len(keys)):
+            if right >= len(keys) or (left >= 0 and cs - keys[left] <= keys[right] - cs):
+                res.append((cs - keys[left],) + items[keys[left]])
+                left -= 1
+            else:
+                res.append((keys[right] - cs,) + items[keys[right]])
+                right += 1
+        return res
+
+_RANGE_PREFIX = '@range '
+
+def _next_line(text:str, start:int)->Tuple[str, int]:
+    end = text.find('\n', start)
+    if end < 0:
+        return text[start:], len(text)
+    return text[start:end], end + 1
+
+def _decode_cues(text:str)->_CueList:
+    cues = _CueList()
+    for line in text.splitlines():
+        if '|' in line:
+            time, content = line.strip().split('|', 1)
+            cues[VideoTime(time)] = content
+        elif '*****' in line:
+            break
+    return cues
 
-class VideoTime(_VideoTime_hms):
-    def __init__(self, time:Union[str, _VideoTime_hms, 'VideoTime', Tuple[int, int, float]] = None, *rest)->None:
-        # 支持以下调用方式：VideoTime(h, m, s)，VideoTime((h,m,s))，VideoTime('h:m:s')，或传入已有 VideoTime
-        if rest:
-            if len(rest) != 2:
-                raise ValueError('Invalid positional arguments for VideoTime')
-            h, m, s = time, rest[0], rest[1]
-            # ensure hours and minutes are integers
-            try:
-                if not float(h).is_integer() or not float(m).is_integer():
-                    raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
-            except Exception:
-                raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
-            h, m = int(h), int(m)
-            super().__init__(h, m, float(s))
-            return
-        if isinstance(time, tuple):
-            if len(time) != 3:
-                raise ValueError(f'Invalid tuple {time}.')
-            h, m, s = time
-            try:
-                if not float(h).is_integer() or not float(m).is_integer():
-                    raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
-            except Exception:
-                raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
-            h, m = int(h), int(m)
-            super().__init__(h, m, float(s))
-            return
-        elif isinstance(time, _VideoTime_hms) or isinstance(time, VideoTime):
-            self.h, self.m, self.s = time.h, time.m, time.s
-            self.flatten()
-            return
-        elif isinstance(time, str):
-            numbers = re.findall('\d+\.?\d*', time)
-            if len(numbers) < 3:
-                raise ValueError(f"Could not find enough numbers in time string: '{time}'")
-            try:
-                h = float(numbers[0])
-                m = float(numbers[1])
-                s = float(numbers[2])
-                if not h.is_integer() or not m.is_integer():
-                    raise ValueError('Hours and minutes must be integers; seconds may be decimal.')
-                if len(numbers) > 3:
-                    import warnings
-                    warnings.warn(f"Found more than 3 numbers in time string, only first 3 are used: '{time}'")
-                super().__init__(int(h), int(m), float(s))
-                return
-            except:
-                raise ValueError
-            
 class _OutlineBlock:
     def __init__(self, topic:str, begin:VideoTime, end:VideoTime)->None:
         if not isinstance(begin, VideoTime):
@@ -177,63 +302,108 @@ class _OutlineBlock:
             end = VideoTime(end)
         self.begin, self.end = begin, end
         self.topic = str(topic)
-        self.block = {}
+        self.block = _CueList()
+        return
+
+    @property
+    def block(self)->_CueList:
+        # 懒加载：从文件读取的块在第一次访问时才解析其中的时间点
+        if self._cues is None:
+            self._cues = _decode_cues(self._raw)
+            self._raw = None
+        return self._cues
+
+    @block.setter
+    def block(self, cues:_CueList)->None:
+        self._cues, self._raw = cues, None
         return
 
     def write(self, time:Union[str, VideoTime], content:str)->None:
-        if isinstance(time, str):
-            time=VideoTime(time)
+        time = VideoTime(time)
         if time < self.begin or time > self.end:
             raise ValueError('The corresponding time is not within the range of this block. ')
         content = str(content)
         if '|' in content:
             content = content.replace('|', '｜')
         self.block[time] = content
-        # 排序
-        self.block = dict(sorted(self.block.items(), key=lambda x: x[0]))
         return
     
     def encode(self)->str:
-        res = f'\n{self.topic}\n'
-        for time, content in self.block.items():
-            res += f'{time}|{content}\n'
-        res += '*****'
-        return res
+        lines = [f'\n{self.topic}', f'{_RANGE_PREFIX}{self.begin}~{self.end}']
+        if self._cues is None:
+            # 尚未解析的块直接写回原文
+            raw = self._raw.strip('\r\n')
+            if raw:
+                lines.append(raw)
+        else:
+            lines.extend(f'{time}|{content}' for time, content in self._cues.items())
+        lines.append('*****')
+        return '\n'.join(lines)
     
-    def decode(self, block:str)->None:
-        self.block = {}
-        lines = [ln for ln in block.splitlines() if ln.strip()]
-        if not lines:
-            return
-        self.topic = lines.pop(0)
-        times = []
-        for line in lines:
-            if '|' in line:
-                time, content = line.strip().split('|', 1)
-                time = VideoTime(time)
-                self.block[time] = content
-                times.append(time)
-            elif '*****' in line:
-                break
-        if not times:
-            return
+    def decode(self, block:str, lazy:bool=False)->bool:
+        self.block = _CueList()
+        line, pos = '', 0
+        while not line.strip():
+            if pos >= len(block):
+                return False
+            line, pos = _next_line(block, pos)
+        self.topic = line.rstrip('\r')
+        line, rest = _next_line(block, pos)
+        if line.startswith(_RANGE_PREFIX):
+            # 带有时间范围的块：时间点可以延迟到第一次访问时再解析
+            begin, _, end = line[len(_RANGE_PREFIX):].partition('~')
+            self.begin, self.end = VideoTime(begin), VideoTime(end)
+            if lazy:
+                self._cues, self._raw = None, block[rest:]
+            else:
+                self.block = _decode_cues(block[rest:])
+            return True
+        # 旧格式没有时间范围，以第一个和最后一个时间点作为范围
+        self.block = _decode_cues(block[pos:])
+        if not len(self.block):
+            return False
+        times = list(self.block)
         self.begin = times[0]
         self.end = times[-1]
-        return
+        return True
     
     def __str__(self):
         res = f'\n{self.topic}({self.begin}~{self.end})\n'
         res += '|时间点|内容|\n|---|---|\n'
-        for time, content in self.block.items():
-            res += f'|{time}|{content}|\n'
+        res += ''.join(f'|{time}|{content}|\n' for time, content in self.block.items())
         return res
     
+_live_managers = weakref.WeakSet()
+
+@atexit.register
+def _flush_live_managers()->None:
+    for manager in list(_live_managers):
+        try:
+            manager.flush()
+        except Exception:
+            pass
+
 class OutlineManager:
-    def __init__(self, path:str) -> None:
+    flush_delay = 1.0               # 修改后延迟多少秒写入操作日志，期间的修改合并为一次写入
+    compact_bytes = 1024 * 1024     # 操作日志超过此大小时压缩回大纲文件
+
+    def __init__(self, path:str, autosave:bool=True) -> None:
         self.path = path
+        self.log_path = path + '.log'
+        self.autosave = autosave
         self.outline = {}  # topic(str) : block(_OutlineBlock)
+        # 按开始时间排序的区间索引：_begins为各块的开始时间（以0.01秒为单位的整数），_blocks为对应的块，
+        # _reach[i]为前i+1个块中最晚的结束时间，它单调不减，可以二分找出哪些块可能覆盖某个时间点
+        self._begins = []
+        self._blocks = []
+        self._reach = []
+        self._lock = threading.RLock()
+        self._pending = []      # 尚未写入操作日志的修改
+        self._timer = None
+        self._log_bytes = 0
         self.load()
         self.build_functions()
+        _live_managers.add(self)
         return
     
     def build_functions(self)->None:
@@ -284,32 +454,209 @@ class OutlineManager:
             required=[],
             function=self.view
         )
+        self.functions.add_function(
+            name='apply_outline',
+            description='一次性批量创建或修改多个大纲块，并向大纲中添加多个时间点的内容。先处理所有大纲块，再按大纲块的时间范围放入内容。整批修改是原子的：只要有一项不合法，就不会应用任何修改，并在结果中列出所有不合法的项。制作大纲时应优先使用此工具。',
+            parameters={
+                'blocks': {
+                    'type': 'array',
+                    'description': '要创建或修改的大纲块列表，已存在的主题会更新时间范围',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'topic': {'type': 'string', 'description': '大纲块的主题'},
+                            'begin': {'type': 'string', 'description': '开始时间，格式必须是h:m:s，s支持小数'},
+                            'end': {'type': 'string', 'description': '结束时间，格式必须是h:m:s，s支持小数'}
+                        },
+                        'required': ['topic', 'begin', 'end']
+                    }
+                },
+                'contents': {
+                    'type': 'array',
+                    'description': '要添加的内容列表，已存在的时间点会被覆盖',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'time': {'type': 'string', 'description': '时间点，格式必须是h:m:s，s支持小数'},
+                            'content': {'type': 'string', 'description': '内容'}
+                        },
+                        'required': ['time', 'content']
+                    }
+                }
+            },
+            required=[],
+            function=self.apply_outline
+        )
+        self.functions.add_function(
+            name='query_range',
+            description='按时间顺序列出某个时间范围内（包含两端）的所有时间点及其内容，并注明所属的大纲块。大纲较长时应使用此工具查看局部，而不是view。',
+            parameters={
+                'begin': {'type': 'string', 'description': '开始时间，格式必须是h:m:s，s支持小数'},
+                'end': {'type': 'string', 'description': '结束时间，格式必须是h:m:s，s支持小数'},
+                'limit': {'type': 'integer', 'description': '最多返回的时间点数量，默认为50'}
+            },
+            required=['begin', 'end'],
+            function=self.query_range
+        )
+        self.functions.add_function(
+            name='query_nearest',
+            description='查找距离指定时间最近的若干个时间点及其内容，按距离从近到远排列。',
+            parameters={
+                'time': {'type': 'string', 'description': '时间点，格式必须是h:m:s，s支持小数'},
+                'k': {'type': 'integer', 'description': '返回的时间点数量，默认为1'}
+            },
+            required=['time'],
+            function=self.query_nearest
+        )
+        self.functions.add_function(
+            name='find_gaps',
+            description='查找大纲中没有任何时间点的空白区间（例如缺少旁白或字幕的片段），按时间顺序列出。',
+            parameters={
+                'min_gap': {'type': 'number', 'description': '空白区间的最短时长（秒），默认为5'},
+                'begin': {'type': 'string', 'description': '查找范围的开始时间，格式h:m:s，默认为第一个大纲块的开始时间'},
+                'end': {'type': 'string', 'description': '查找范围的结束时间，格式h:m:s，默认为最后一个大纲块的结束时间'},
+                'limit': {'type': 'integer', 'description': '最多返回的空白区间数量，默认为20'}
+            },
+            required=[],
+            function=self.find_gaps
+        )
+        self.functions.add_function(
+            name='find_overlaps',
+            description='查找时间范围互相重叠的大纲块，列出每一对重叠的块及重叠区间。',
+            parameters={
+                'begin': {'type': 'string', 'description': '只检查与此时间之后有交集的块，格式h:m:s，可选'},
+                'end': {'type': 'string', 'description': '只检查与此时间之前有交集的块，格式h:m:s，可选'},
+                'limit': {'type': 'integer', 'description': '最多返回的重叠对数量，默认为20'}
+            },
+            required=[],
+            function=self.find_overlaps
+        )
+        self.functions.add_function(
+            name='import_subtitles',
+            description='从SRT或WebVTT字幕文件中导入字幕，每条字幕的开始时间作为一个时间点，按时间范围放入对应的大纲块。',
+            parameters={
+                'path': {'type': 'string', 'description': '字幕文件路径，扩展名为.srt或.vtt'},
+                'topic': {'type': 'string', 'description': '可选，指定时所有字幕都放入该大纲块（不存在则创建，时间范围自动扩展）；不指定时不在任何块范围内的字幕放入“字幕”块'}
+            },
+            required=['path'],
+            function=self.import_subtitles
+        )
+        self.functions.add_function(
+            name='export_subtitles',
+            description='将大纲中的时间点导出为SRT或WebVTT字幕文件，每条字幕持续到下一个时间点，最长不超过max_duration秒。',
+            parameters={
+                'path': {'type': 'string', 'description': '导出的字幕文件路径'},
+                'format': {'type': 'string', 'enum': ['srt', 'vtt'], 'description': '字幕格式，默认根据扩展名判断'},
+                'begin': {'type': 'string', 'description': '导出范围的开始时间，格式h:m:s，可选'},
+                'end': {'type': 'string', 'description': '导出范围的结束时间，格式h:m:s，可选'},
+                'max_duration': {'type': 'number', 'description': '每条字幕的最长持续时间（秒），默认为7'}
+            },
+            required=['path'],
+            function=self.export_subtitles
+        )
         return
     
     def load(self)->None:
         try:
             with open(self.path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            blocks = content.split('*****')
-            for block in blocks:
-                if not block.strip():
-                    continue
-                # skip malformed/empty blocks that don't contain time|content lines
-                if '|' not in block:
-                    continue
-                ob = _OutlineBlock('', VideoTime(0,0,0), VideoTime(0,0,0))
-                ob.decode(block)
-                self.outline[ob.topic] = ob
-            return
+        except FileNotFoundError:
+            content = ''
+        for block in content.split('*****'):
+            if not block.strip():
+                continue
+            ob = _OutlineBlock('', VideoTime(0,0,0), VideoTime(0,0,0))
+            # skip malformed/empty blocks that don't contain a range header or time|content lines
+            if not ob.decode(block, lazy=True):
+                continue
+            self._put_block(ob)
+        self._replay()
+        return
+
+    def _replay(self)->None:
+        # 重放上次压缩之后的操作日志；崩溃时最后一行可能不完整，直接忽略
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
         except FileNotFoundError:
             return
-    
+        for line in lines:
+            self._log_bytes += len(line.encode('utf-8'))
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue
+            kind, topic = op.get('op'), op.get('topic')
+            if kind == 'block':
+                self._set_block(topic, VideoTime(op['begin']), VideoTime(op['end']))
+            elif kind == 'drop':
+                if topic in self.outline:
+                    self._unindex(self.outline.pop(topic))
+            elif topic in self.outline:
+                cues = self.outline[topic].block
+                time = VideoTime(op['time'])
+                if kind == 'put':
+                    cues[time] = op['content']
+                elif kind == 'del' and time in cues:
+                    del cues[time]
+        return
+
+    def _put_block(self, block:_OutlineBlock)->None:
+        if block.topic in self.outline:
+            self._unindex(self.outline[block.topic])
+        self.outline[block.topic] = block
+        self._index(block)
+        return
+
+    def _record(self, op:dict)->None:
+        if not self.autosave:
+            return
+        with self._lock:
+            self._pending.append(op)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return
+
+    def flush(self)->None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            data = ''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in self._pending).encode('utf-8')
+            with open(self.log_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = []
+            self._log_bytes += len(data)
+            if self._log_bytes >= self.compact_bytes:
+                self.save()
+        return
+
     def save(self)->None:
-        with open(self.path, 'w', encoding='utf-8') as f:
-            for block in self.outline.values():
-                f.write(block.encode() + '\n')
+        # 将完整大纲原子地写回大纲文件，之后操作日志中的修改都已包含在文件中，可以删除
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            _atomic_write(self.path, ''.join(block.encode() + '\n' for block in self.outline.values()))
+            self._pending = []
+            self._log_bytes = 0
+            try:
+                os.remove(self.log_path)
+            except FileNotFoundError:
+                pass
         return
-    
+
+    def close(self)->None:
+        self.flush()
+        _live_managers.discard(self)
+        return
+
     def view(self)->str:
         res = ''
         for block in self.outline.values():
@@ -318,56 +665,387 @@ class OutlineManager:
             res += '-----\n'
         return res
     
+    def _index(self, block:_OutlineBlock)->None:
+        index = bisect.bisect_right(self._begins, block.begin.cs)
+        self._begins.insert(index, block.begin.cs)
+        self._blocks.insert(index, block)
+        self._update_reach(index)
+        return
+
+    def _locate(self, block:_OutlineBlock)->int:
+        begins, blocks = self._begins, self._blocks
+        cs = block.begin.cs
+        for index in range(bisect.bisect_left(begins, cs), bisect.bisect_right(begins, cs)):
+            if blocks[index] is block:
+                return index
+        return -1
+
+    def _unindex(self, block:_OutlineBlock)->None:
+        index = self._locate(block)
+        if index >= 0:
+            del self._begins[index]
+            del self._blocks[index]
+            self._update_reach(index)
+        return
+
+    def _update_reach(self, index:int)->None:
+        # 从第index个块开始重新计算_reach；按时间顺序加载大纲时块都追加在末尾，只需计算一项
+        reach = self._reach
+        del reach[index:]
+        top = reach[-1] if reach else -1
+        for block in itertools.islice(self._blocks, index, None):
+            top = max(top, block.end.cs)
+            reach.append(top)
+        return
+
+    def _covering_block(self, time:VideoTime)->Optional[_OutlineBlock]:
+        # 时间范围包含time的块中开始得最晚的一个；块可以嵌套，向前查找直到之前的块都已经结束
+        cs, blocks, reach = time.cs, self._blocks, self._reach
+        for index in range(bisect.bisect_right(self._begins, cs) - 1, -1, -1):
+            if reach[index] < cs:
+                break
+            if blocks[index].end.cs >= cs:
+                return blocks[index]
+        return None
+
+    def _block_at(self, time:VideoTime)->_OutlineBlock:
+        # 优先返回覆盖time的块，没有时返回开始时间不晚于time的最后一个块
+        block = self._covering_block(time)
+        if block is not None:
+            return block
+        index = bisect.bisect_right(self._begins, time.cs) - 1
+        if index < 0:
+            raise ValueError('The corresponding time is out of range of the outline. ')
+        return self._blocks[index]
+
     def add_content(self, time:str, content:str)->None:
         time = VideoTime(time)
-        blocks = list(self.outline.values())
-        blocks.sort(key=lambda x: x.begin)
-        begins = [b.begin for b in blocks]
-        index = bisect.bisect_right(begins, time) - 1
-        if index < 0 or index >= len(blocks):
-            raise ValueError('The corresponding time is out of range of the outline. ')
-        block = blocks[index]
-        block.write(time, content)
+        with self._lock:
+            block = self._block_at(time)
+            block.write(time, content)
+            self._record({'op': 'put', 'topic': block.topic, 'time': str(time), 'content': block.block[time]})
         return
     
     def delete_content(self, time:str)->None:
         time = VideoTime(time)
-        blocks = list(self.outline.values())
-        blocks.sort(key=lambda x: x.begin)
-        begins = [b.begin for b in blocks]
-        index = bisect.bisect_right(begins, time) - 1
-        if index < 0 or index >= len(blocks):
-            raise ValueError('The corresponding time is out of range of the outline. ')
-        block = blocks[index]
-        if time in block.block:
-            del block.block[time]
+        with self._lock:
+            block = self._block_at(time)
+            if time in block.block:
+                del block.block[time]
+            else:
+                raise ValueError('The corresponding time point does not exist in the outline. ')
+            self._record({'op': 'del', 'topic': block.topic, 'time': str(time)})
+        return
+
+    def _set_block(self, topic:str, begin:VideoTime, end:VideoTime)->None:
+        if topic in self.outline:
+            block = self.outline[topic]
+            if block.begin != begin:
+                self._unindex(block)
+                block.begin = begin
+                self._index(block)
+            if block.end != end:
+                block.end = end
+                self._update_reach(self._locate(block))
         else:
-            raise ValueError('The corresponding time point does not exist in the outline. ')
+            self._put_block(_OutlineBlock(topic, begin, end))
         return
     
     def edit_outline_block(self, topic:str, begin:str, end:str)->None:
         begin = VideoTime(begin)
         end = VideoTime(end)
-        if topic in self.outline:
-            block = self.outline[topic]
-            block.begin = begin
-            block.end = end
-        else:
-            block = _OutlineBlock(topic, begin, end)
-            self.outline[topic] = block
+        topic = str(topic)
+        with self._lock:
+            self._set_block(topic, begin, end)
+            self._record({'op': 'block', 'topic': topic, 'begin': str(begin), 'end': str(end)})
         return
     
     def delete_outline_block(self, topic:str)->None:
-        if topic in self.outline:
-            del self.outline[topic]
-        else:
-            raise ValueError('The corresponding topic does not exist in the outline. ')
+        with self._lock:
+            if topic in self.outline:
+                self._unindex(self.outline.pop(topic))
+            else:
+                raise ValueError('The corresponding topic does not exist in the outline. ')
+            self._record({'op': 'drop', 'topic': topic})
         return
     
+    def apply_outline(self, blocks:Optional[list]=None, contents:Optional[list]=None)->str:
+        blocks, contents = blocks or [], contents or []
+        if not isinstance(blocks, list) or not isinstance(contents, list):
+            raise ValueError('blocks and contents must be lists.')
+        errors, undo, ops = [], [], []
+        with self._lock:
+            # 直接在当前大纲上逐项应用并记录撤销操作，有任何错误时按相反顺序撤销，保证与逐个调用工具的结果一致
+            seen = set()
+            for idx, item in enumerate(blocks):
+                try:
+                    if not isinstance(item, dict) or not {'topic', 'begin', 'end'} <= item.keys():
+                        raise ValueError('must be an object with topic, begin and end')
+                    topic = str(item['topic'])
+                    if not topic.strip() or '\n' in topic or '*****' in topic:
+                        raise ValueError('topic must be a non-empty single line')
+                    if topic in seen:
+                        raise ValueError(f"duplicate topic '{topic}'")
+                    begin, end = VideoTime(item['begin']), VideoTime(item['end'])
+                    if end < begin:
+                        raise ValueError('end is earlier than begin')
+                except (ValueError, TypeError) as e:
+                    errors.append(f'blocks[{idx}]: {e}')
+                    continue
+                seen.add(topic)
+                old = self.outline.get(topic)
+                undo.append(('block', topic, None if old is None else (old.begin, old.end)))
+                self._set_block(topic, begin, end)
+                ops.append({'op': 'block', 'topic': topic, 'begin': str(begin), 'end': str(end)})
+            for idx, item in enumerate(contents):
+                try:
+                    if not isinstance(item, dict) or not {'time', 'content'} <= item.keys():
+                        raise ValueError('must be an object with time and content')
+                    time = VideoTime(item['time'])
+                    block = self._block_at(time)
+                    cues = block.block
+                    old = cues[time] if time in cues else None
+                    block.write(time, item['content'])
+                except (ValueError, TypeError) as e:
+                    errors.append(f'contents[{idx}]: {e}')
+                    continue
+                undo.append(('cue', block, time, old))
+                ops.append({'op': 'put', 'topic': block.topic, 'time': str(time), 'content': cues[time]})
+            if errors:
+                for entry in reversed(undo):
+                    if entry[0] == 'block':
+                        _, topic, old = entry
+                        if old is None:
+                            self._unindex(self.outline.pop(topic))
+                        else:
+                            self._set_block(topic, *old)
+                    else:
+                        _, block, time, old = entry
+                        if old is None:
+                            del block.block[time]
+                        else:
+                            block.block[time] = old
+                raise ValueError(f'No changes were applied; {len(errors)} invalid item(s):\n' + '\n'.join(errors))
+            for op in ops:
+                self._record(op)
+        return f'已应用{len(blocks)}个大纲块和{len(contents)}个时间点。'
+
+    def _blocks_between(self, begin:VideoTime, end:VideoTime)->list:
+        # 开始时间不晚于end、结束时间不早于begin的块：按开始时间二分得到上界，按_reach二分跳过之前全部已经结束的块
+        hi = bisect.bisect_right(self._begins, end.cs)
+        lo = bisect.bisect_left(self._reach, begin.cs, 0, hi)
+        return [block for block in itertools.islice(self._blocks, lo, hi) if block.end >= begin]
+
+    def _window(self, begin:Optional[str], end:Optional[str])->Tuple[VideoTime, VideoTime]:
+        if begin is None:
+            begin = self._blocks[0].begin if self._blocks else VideoTime(0)
+        if end is None:
+            end = VideoTime._from_cs(self._reach[-1]) if self._reach else VideoTime(0)
+        begin, end = VideoTime(begin), VideoTime(end)
+        if end < begin:
+            raise ValueError('end must not be earlier than begin.')
+        return begin, end
+
+    def query_range(self, begin:str, end:str, limit:int=50)->str:
+        begin, end = self._window(begin, end)
+        with self._lock:
+            spans = []
+            for block in self._blocks_between(begin, end):
+                lo, hi = block.block.span(begin, end)
+                if lo < hi:
+                    spans.append((block, lo, hi))
+            total = sum(hi - lo for _, lo, hi in spans)
+            # 各块内的时间点已经有序，多路归并后只取前limit个
+            streams = [zip(block.block.islice(lo, hi), itertools.repeat(block.topic)) for block, lo, hi in spans]
+            rows = [f'{time}|{content}|{topic}' for (time, content), topic in itertools.islice(heapq.merge(*streams, key=lambda x: x[0][0].cs), max(limit, 0))]
+        if not rows:
+            return f'{begin}~{end}之间没有时间点。'
+        res = f'{begin}~{end}之间共有{total}个时间点：\n时间点|内容|大纲块\n' + '\n'.join(rows)
+        if total > len(rows):
+            res += f'\n…（另有{total - len(rows)}个时间点未显示，请缩小时间范围）'
+        return res
+
+    def query_nearest(self, time:str, k:int=1)->str:
+        time = VideoTime(time)
+        if k < 1:
+            raise ValueError('k must be at least 1.')
+        cs, order = time.cs, itertools.count()
+        best = []   # 目前最近的k个时间点，按(距离, 时间点)取反后组成堆，堆顶是其中最远的一个
+
+        def visit(block):
+            for distance, cue, content in block.block.nearest(time, k):
+                item = (-distance, -cue.cs, next(order), cue, content, block.topic)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item[:2] > best[0][:2]:
+                    heapq.heapreplace(best, item)
+            return
+
+        def bound():
+            return -best[0][0] if len(best) >= k else _INF
+
+        with self._lock:
+            begins, blocks, reach = self._begins, self._blocks, self._reach
+            # 从time所在的位置向两侧查找：右侧的块开始得越来越晚，左侧前index+1个块都不晚于reach[index]结束，
+            # 它们与time的距离超过当前第k近的距离时，更远的块都不可能包含更近的时间点
+            right = bisect.bisect_right(begins, cs)
+            for index in range(right - 1, -1, -1):
+                if cs - reach[index] > bound():
+                    break
+                if cs - blocks[index].end.cs <= bound():
+                    visit(blocks[index])
+            for index in range(right, len(blocks)):
+                if begins[index] - cs > bound():
+                    break
+                visit(blocks[index])
+        best = sorted((-item[0], item[3], item[4], item[5]) for item in best)
+        if not best:
+            return '大纲中没有任何时间点。'
+        rows = [f'{cue}|{content}|{topic}|{"-" if cue < time else "+"}{distance / 100}s' for distance, cue, content, topic in best]
+        return f'距离{time}最近的{len(rows)}个时间点：\n时间点|内容|大纲块|距离\n' + '\n'.join(rows)
+
+    def find_gaps(self, min_gap:float=5, begin:Optional[str]=None, end:Optional[str]=None, limit:int=20)->str:
+        begin, end = self._window(begin, end)
+        min_cs = _seconds_cs(float(min_gap))
+        gaps, more = [], False
+        with self._lock:
+            spans = []
+            for block in self._blocks_between(begin, end):
+                lo, hi = block.block.span(begin, end)
+                spans.append((block.block, lo, hi))
+            times = heapq.merge(*(map(lambda cue: cue[0].cs, cues.islice(lo, hi)) for cues, lo, hi in spans))
+            prev = begin.cs
+            for cs in itertools.chain(times, (end.cs,)):
+                if cs - prev >= min_cs and cs > prev:
+                    if len(gaps) >= limit:
+                        more = True
+                        break
+                    gaps.append((prev, cs))
+                prev = max(prev, cs)
+        if not gaps:
+            return f'{begin}~{end}之间没有长于{min_gap}秒的空白区间。'
+        rows = [f'{VideoTime._from_cs(a)}~{VideoTime._from_cs(b)}（{(b - a) / 100}s）' for a, b in gaps]
+        res = f'{begin}~{end}之间长于{min_gap}秒的空白区间：\n' + '\n'.join(rows)
+        if more:
+            res += f'\n…（已达到数量上限{limit}，请缩小时间范围或增大min_gap）'
+        return res
+
+    def find_overlaps(self, begin:Optional[str]=None, end:Optional[str]=None, limit:int=20)->str:
+        begin, end = self._window(begin, end)
+        pairs, more = [], False
+        with self._lock:
+            # 扫描线：按开始时间遍历块，active中保存结束时间还没有早于当前块开始时间的块
+            active = []
+            for block in self._blocks_between(begin, end):
+                active = [other for other in active if other.end > block.begin]
+                for other in active:
+                    if len(pairs) >= limit:
+                        more = True
+                        break
+                    pairs.append((other, block))
+                if more:
+                    break
+                active.append(block)
+        if not pairs:
+            return f'{begin}~{end}之间没有互相重叠的大纲块。'
+        rows = [f'{a.topic}({a.begin}~{a.end}) 与 {b.topic}({b.begin}~{b.end}) 重叠于 {b.begin}~{min(a.end, b.end)}' for a, b in pairs]
+        res = '\n'.join(rows)
+        if more:
+            res += f'\n…（已达到数量上限{limit}，请缩小时间范围）'
+        return res
+
+    def _timeline(self, begin:VideoTime, end:VideoTime):
+        # 按时间顺序逐个返回(时间点, 内容)，多路归并各块中落在范围内的时间点
+        spans = []
+        for block in self._blocks_between(begin, end):
+            lo, hi = block.block.span(begin, end)
+            if lo < hi:
+                spans.append(block.block.islice(lo, hi))
+        return heapq.merge(*spans, key=lambda cue: cue[0].cs)
+
+    def import_subtitles(self, path:str, topic:Optional[str]=None)->str:
+        from .subtitle_io import read_cues, subtitle_format
+        subtitle_format(path)
+        fallback = '字幕' if topic is None else str(topic)
+        n = extra = 0
+        with self._lock:
+            for start, _, text in read_cues(path):
+                text = ' '.join(line.strip() for line in text.splitlines() if line.strip()).replace('|', '｜')
+                if not text:
+                    continue
+                block = None if topic is not None else self._covering_block(start)
+                if block is None:
+                    # 放入指定的块或“字幕”块，必要时扩展它的时间范围
+                    block = self.outline.get(fallback)
+                    if block is None or start < block.begin or start > block.end:
+                        begin = start if block is None else min(block.begin, start)
+                        end = start if block is None else max(block.end, start)
+                        self._set_block(fallback, begin, end)
+                        block = self.outline[fallback]
+                    extra += 1
+                block.block[start] = text
+                n += 1
+            # 批量导入直接写一次完整的大纲文件，而不是记录成千上万条操作
+            if self.autosave:
+                self.save()
+        res = f'已从{path}导入{n}条字幕。'
+        if extra and topic is None:
+            res += f'其中{extra}条不在任何大纲块的范围内，已放入大纲块“{fallback}”。'
+        return res
+
+    def export_subtitles(self, path:str, format:Optional[str]=None, begin:Optional[str]=None, end:Optional[str]=None, max_duration:float=7)->str:
+        from .subtitle_io import write_cues, subtitle_format
+        format = subtitle_format(path, format)
+        begin, end = self._window(begin, end)
+        max_cs = _seconds_cs(float(max_duration))
+        if max_cs <= 0:
+            raise ValueError('max_duration must be positive.')
+
+        def cues(timeline):
+            # 每条字幕持续到下一个更晚的时间点，最长max_duration秒；开始时间相同的字幕（来自不同的块）一起结束
+            group = []
+            for time, content in timeline:
+                if group and time.cs > group[0][0].cs:
+                    stop = VideoTime._from_cs(min(time.cs, group[0][0].cs + max_cs))
+                    for start, text in group:
+                        yield start, stop, text
+                    group = []
+                group.append((time, content))
+            if group:
+                stop = VideoTime._from_cs(group[0][0].cs + max_cs)
+                for start, text in group:
+                    yield start, stop, text
+
+        with self._lock:
+            with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                n = write_cues(f, cues(self._timeline(begin, end)), format)
+        return f'已将{n}条字幕导出到{path}。'
+
     def __call__(self, *args, **kwargs):
         return self.functions(*args, **kwargs)
 
+OutlineManager.__doc__ = '''OutlineManager类用于管理视频大纲，大纲由若干个带时间范围的大纲块组成，每个块中包含按时间排序的时间点及其内容。
+大纲会自动保存：每次修改都会被记录为一条操作，延迟flush_delay秒后批量追加到操作日志（大纲文件路径加.log），日志超过compact_bytes时原子地压缩回大纲文件。
+打开大纲时先读取大纲文件，再重放操作日志，因此程序崩溃最多丢失最后flush_delay秒内的修改。大纲文件中每个块记录了时间范围，块中的时间点在第一次访问时才解析。它包含以下方法：
+- __init__(self, path:str, autosave:bool=True): 打开（或创建）大纲文件，autosave为False时不记录操作日志，需要手动调用save。
+- flush(self): 立即将尚未写入的修改追加到操作日志。
+- save(self): 将完整大纲原子地写回大纲文件，并删除操作日志。
+- close(self): 写入尚未保存的修改，程序退出时也会自动调用。
+- query_range(self, begin:str, end:str, limit:int=50): 按时间顺序列出时间范围内的时间点，只返回前limit个并注明总数。
+- query_nearest(self, time:str, k:int=1): 列出距离time最近的k个时间点。
+- find_gaps(self, min_gap:float=5, begin=None, end=None, limit:int=20): 列出时间范围内长于min_gap秒、没有任何时间点的空白区间。
+- find_overlaps(self, begin=None, end=None, limit:int=20): 列出时间范围互相重叠的大纲块。
+这些查询都在排序后的时间轴上二分定位，只访问与查询范围有关的块和时间点，返回结果的长度受limit限制。
+- apply_outline(self, blocks:Optional[list]=None, contents:Optional[list]=None): 原子地批量创建或修改大纲块并添加内容，任何一项不合法时不应用任何修改，并一次性列出所有错误。
+- import_subtitles(self, path:str, topic:Optional[str]=None): 流式导入SRT/WebVTT字幕，按时间范围放入对应的块，导入后保存一次大纲文件。
+- export_subtitles(self, path:str, format=None, begin=None, end=None, max_duration:float=7): 将时间范围内的时间点流式导出为SRT/WebVTT字幕。
+大纲中只记录时间点，导入时字幕的结束时间不会被保存，导出时每条字幕持续到下一个更晚的时间点，最长max_duration秒（开始时间相同的字幕一起结束，不会与下一条重叠）。'''
+
 if __name__ == '__main__':
+    # 字符串和数字形式的同一时间点换算结果一致（都是四舍五入）
+    for text, seconds in (('0:0:0.125', 0.125), ('0:0:1.005', 1.005), ('0:0:2.675', 2.675), ('0:1:30.5', 90.5)):
+        assert VideoTime(text) == VideoTime(seconds) == VideoTime(0, 0, seconds) == VideoTime(0.0, 0.0, seconds), text
+    assert VideoTime('0:0:0.125').cs == VideoTime(0.125).cs == 13
     om = OutlineManager('outline.txt')
     om.edit_outline_block('第一部分', '0:0:0', '0:10:0')
     om.edit_outline_block('第二部分', '0:10:0', '0:20:0')
@@ -0,0 +1,358 @@
+from .tool_manager import AIFunction, cancel_event
+from .outline_manager import OutlineManager, VideoTime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import os
+import json
+import heapq
+import shutil
+import hashlib
+import itertools
+import tempfile
+import threading
+import subprocess
+
+_SPEC_VERSION = 1
+# 按优先级排列的编码器及其参数，使用本机ffmpeg中第一个可用的编码器
+_ENCODERS = [
+    ('libx264', ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p']),
+    ('libopenh264', ['-c:v', 'libopenh264', '-b:v', '4M', '-pix_fmt', 'yuv420p']),
+    ('h264_videotoolbox', ['-c:v', 'h264_videotoolbox', '-b:v', '4M', '-pix_fmt', 'yuv420p']),
+    ('mpeg4', ['-c:v', 'mpeg4', '-q:v', '3', '-pix_fmt', 'yuv420p'])
+]
+_IMAGE_PREFIX = 'image:'
+
+def _filter_escape(value:str) -> str:
+    # ffmpeg滤镜参数需要两层转义：先转义选项值中的 \ ' :，再转义滤镜图中的 \ ' [ ] , ;
+    for ch in '\\\':':
+        value = value.replace(ch, '\\' + ch)
+    for ch in '\\\'[],;':
+        value = value.replace(ch, '\\' + ch)
+    return value
+
+def _wrap(text:str, width:float) -> str:
+    # drawtext不会自动换行：按字符宽度估算换行，中日韩文字按一个字宽，其他字符按半个字宽
+    lines, line, used = [], '', 0.0
+    for ch in text:
+        w = 1.0 if ord(ch) > 0x2e80 else 0.55
+        if used + w > width and line:
+            lines.append(line)
+            line, used = '', 0.0
+        line += ch
+        used += w
+    if line:
+        lines.append(line)
+    return '\n'.join(lines)
+
+def _run(cmd:List[str], cancel:Optional[threading.Event]=None) -> subprocess.CompletedProcess:
+    # 与subprocess.run相同，但在cancel被设置时终止ffmpeg进程
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as proc:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    proc.kill()
+                    proc.communicate()
+                    raise RuntimeError('Rendering was cancelled.')
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+def _render_segment(ffmpeg:str, encoder_args:List[str], spec:dict, out_path:str, cancel:Optional[threading.Event]=None) -> str:
+    if cancel is not None and cancel.is_set():
+        raise RuntimeError('Rendering was cancelled.')
+    w, h = spec['size']
+    fps, duration = spec['fps'], spec['duration']
+    work = tempfile.mkdtemp(prefix='.segment.', dir=os.path.dirname(out_path))
+    try:
+        inputs = ['-f', 'lavfi', '-i', f"color=c={spec['background']}:s={w}x{h}:r={fps}:d={duration}"]
+        chains, cur, n_inputs = [], '0:v', 1
+        font = f":fontfile={_filter_escape(spec['font'])}" if spec['font'] else ''
+
+        def drawtext(text:str, size:int, y:str, begin:float, end:float):
+            nonlocal cur
+            # 文字写入文件后用textfile引用，避免在滤镜参数中转义任意文本
+            path = os.path.join(work, f'text{len(chains)}.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(_wrap(text, w * 0.9 / size))
+            label = f'v{len(chains)}'
+            chains.append(
+                f"[{cur}]drawtext=textfile={_filter_escape(path)}{font}:fontsize={size}:fontcolor=white"
+                f":box=1:boxcolor=black@0.5:boxborderw=12:line_spacing=8:x=(w-text_w)/2:y={y}"
+                f":enable='between(t,{begin},{end})'[{label}]"
+            )
+            cur = label
+
+        for item in spec['items']:
+            if item['type'] != 'image':
+                continue
+            inputs += ['-loop', '1', '-framerate', str(fps), '-t', str(duration), '-i', item['path']]
+            image, label = f'img{n_inputs}', f'v{len(chains)}'
+            chains.append(
+                f"[{n_inputs}:v]scale={w}:{h}:force_original_aspect_ratio=decrease[{image}];"
+                f"[{cur}][{image}]overlay=(W-w)/2:(H-h)/2:enable='between(t,{item['start']},{item['end']})'[{label}]"
+            )
+            cur, n_inputs = label, n_inputs + 1
+        if spec['text']:
+            if spec['title']:
+                drawtext(spec['title'], max(24, h // 12), '(h-text_h)/2', 0, min(3.0, duration))
+            for item in spec['items']:
+                if item['type'] == 'text':
+                    drawtext(item['text'], max(16, h // 20), 'h-text_h-h/12', item['start'], item['end'])
+        cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y'] + inputs
+        if chains:
+            cmd += ['-filter_complex', ';'.join(chains), '-map', f'[{cur}]']
+        else:
+            cmd += ['-map', '0:v']
+        tmp = os.path.join(work, 'segment.mp4')
+        cmd += ['-t', str(duration), '-r', str(fps)] + encoder_args + ['-an', '-movflags', '+faststart', tmp]
+        proc = _run(cmd, cancel)
+        if proc.returncode != 0:
+            raise RuntimeError(f'ffmpeg failed for segment {spec["label"]}: {proc.stderr.strip()[-2000:]}')
+        # 渲染完成后再原子地放入缓存，中断的渲染不会留下不完整的缓存文件
+        os.replace(tmp, out_path)
+        return out_path
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+class RenderManager:
+    def __init__(self, outline:OutlineManager, cache_dir:str='.render_cache', width:int=1280, height:int=720, fps:int=30, background:str='black', fontfile:Optional[str]=None, ffmpeg:str='ffmpeg', workers:Optional[int]=None) -> None:
+        self.outline = outline
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.size = (width, height)
+        self.fps = fps
+        self.background = background
+        self.fontfile = os.path.abspath(fontfile) if fontfile else None
+        self.ffmpeg = ffmpeg
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self._caps = None
+        self.build_function()
+        return
+
+    def build_function(self) -> None:
+        self.function = AIFunction([], [])
+        self.function.add_function(
+            name='render_video',
+            description='将大纲渲染为视频：每个大纲块渲染为一个片段（主题作为标题，时间点的内容作为字幕，内容为"image:图片路径"时显示图片），再按时间顺序拼接。只会重新渲染修改过的块。',
+            parameters={
+                'output': {'type': 'string', 'description': '输出视频文件路径，默认为output.mp4'}
+            },
+            required=[],
+            function=self.render,
+            executor='thread',
+            timeout=3600
+        )
+        return
+
+    def _capabilities(self) -> Tuple[str, List[str], bool]:
+        # 检测本机ffmpeg可用的编码器以及是否支持drawtext滤镜（需要ffmpeg编译时启用freetype）
+        if self._caps is None:
+            exe = shutil.which(self.ffmpeg) or (self.ffmpeg if os.path.isfile(self.ffmpeg) else None)
+            if exe is None:
+                raise RuntimeError(f"ffmpeg not found: '{self.ffmpeg}'. Install ffmpeg or pass its path to RenderManager.")
+            encoders = subprocess.run([exe, '-hide_banner', '-encoders'], capture_output=True, text=True).stdout
+            filters = subprocess.run([exe, '-hide_banner', '-filters'], capture_output=True, text=True).stdout
+            available = {line.split()[1] for line in encoders.splitlines() if len(line.split()) > 1}
+            for name, args in _ENCODERS:
+                if name in available:
+                    break
+            else:
+                raise RuntimeError('No supported video encoder found in ffmpeg.')
+            has_drawtext = any(line.split()[1:2] == ['drawtext'] for line in filters.splitlines())
+            self._caps = (exe, list(args), has_drawtext)
+        return self._caps
+
+    def _spec(self, label:str, begin:VideoTime, end:VideoTime, title:Optional[str], cues:list, encoder:List[str], has_drawtext:bool) -> dict:
+        duration = (end.cs - begin.cs) / 100
+        items, idx = [], 0
+        # 每个时间点的内容显示到下一个更晚的时间点或片段结束；同一时刻的多条文字合并为一条字幕
+        while idx < len(cues):
+            time = cues[idx][0]
+            group = idx
+            while group < len(cues) and cues[group][0] == time:
+                group += 1
+            start = (time.cs - begin.cs) / 100
+            stop = (cues[group][0].cs - begin.cs) / 100 if group < len(cues) else duration
+            texts = []
+            for _, content in cues[idx:group]:
+                if content.startswith(_IMAGE_PREFIX):
+                    path = os.path.abspath(content[len(_IMAGE_PREFIX):].strip())
+                    try:
+                        st = os.stat(path)
+                    except OSError as e:
+                        raise ValueError(f"Outline block '{label}' at {time} refers to image '{path}', which cannot be read: {e.strerror}.")
+                    items.append({'type': 'image', 'start': start, 'end': stop, 'path': path, 'stamp': [st.st_size, st.st_mtime_ns]})
+                else:
+                    texts.append(content)
+            if texts:
+                items.append({'type': 'text', 'start': start, 'end': stop, 'text': '\n'.join(texts)})
+            idx = group
+        return {
+            'version': _SPEC_VERSION,
+            'label': label,
+            'duration': duration,
+            'size': list(self.size),
+            'fps': self.fps,
+            'background': self.background,
+            'font': self.fontfile,
+            'encoder': encoder,
+            'text': has_drawtext,
+            'title': title,
+            'items': items
+        }
+
+    def compile(self) -> List[dict]:
+        _, encoder, has_drawtext = self._capabilities()
+        return self._compile(encoder, has_drawtext)
+
+    def _compile(self, encoder:List[str], has_drawtext:bool) -> List[dict]:
+        # 成片从0:0:0开始，按所有块的开始和结束时间切分时间轴：每一段属于覆盖它的块中开始得最晚的一个（嵌套的块优先），
+        # 没有块覆盖的部分用纯色片段填充；所有块的时间点按原来的时间放入所在的片段，因此成片中的时间与大纲完全一致
+        with self.outline._lock:
+            blocks = list(self.outline._blocks)
+            timeline = heapq.merge(*(zip(block.block.items(), itertools.repeat(block.topic)) for block in blocks), key=lambda x: x[0][0].cs)
+            bounds = sorted({0}.union(*((block.begin.cs, block.end.cs) for block in blocks)))
+            segments, active, nxt = [], [], 0
+            for a, b in zip(bounds, bounds[1:]):
+                while nxt < len(blocks) and blocks[nxt].begin.cs <= a:
+                    active.append(blocks[nxt])
+                    nxt += 1
+                active = [block for block in active if block.end.cs > a]
+                owner = active[-1] if active else None
+                if segments and segments[-1][0] is owner:
+                    segments[-1][2] = b
+                else:
+                    segments.append([owner, a, b])
+            specs, pending = [], next(timeline, None)
+            for owner, a, b in segments:
+                cues = []
+                while pending is not None and pending[0][0].cs < b:
+                    cues.append(pending[0])
+                    pending = next(timeline, None)
+                begin, end = VideoTime._from_cs(a), VideoTime._from_cs(b)
+                if owner is None:
+                    label, title = f'gap@{begin}', None
+                elif owner.begin.cs == a:
+                    label, title = owner.topic, owner.topic
+                else:
+                    label, title = f'{owner.topic}@{begin}', None   # 嵌套的块结束后，外层块剩余的部分不再显示标题
+                specs.append(self._spec(label, begin, end, title, cues, encoder, has_drawtext))
+            if pending is not None:
+                (time, content), topic = pending
+                end = VideoTime._from_cs(bounds[-1])
+                raise ValueError(f"Outline block '{topic}' has a time point at {time}, which is not before the end of the outline ({end}), so it would not be rendered. Extend the block's end time.")
+        return specs
+
+    @staticmethod
+    def spec_key(spec:dict) -> str:
+        data = {k: v for k, v in spec.items() if k != 'label'}
+        return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def render(self, output:str='output.mp4') -> str:
+        cancel = cancel_event()
+        exe, encoder, has_drawtext = self._capabilities()
+        specs = self.compile()
+        if not specs:
+            raise ValueError('The outline has no blocks to render.')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        paths, todo = [], {}
+        for spec in specs:
+            path = os.path.join(self.cache_dir, self.spec_key(spec) + '.mp4')
+            paths.append(path)
+            if not os.path.exists(path):
+                todo[path] = spec
+        # 每个片段由一个独立的ffmpeg进程渲染，线程池只负责限制同时运行的进程数量
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(_render_segment, exe, encoder, spec, path, cancel) for path, spec in todo.items()]
+                errors = []
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(str(e))
+            if cancel.is_set():
+                raise RuntimeError('Rendering was cancelled; finished segments are kept in the cache.')
+            if errors:
+                raise RuntimeError('\n'.join(errors))
+        output = os.path.abspath(output)
+        out_dir = os.path.dirname(output)
+        os.makedirs(out_dir, exist_ok=True)
+        fd, list_path = tempfile.mkstemp(prefix='.concat.', suffix='.txt', dir=self.cache_dir)
+        fd2, tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(output)}.', suffix=os.path.splitext(output)[1] or '.mp4', dir=out_dir)
+        os.close(fd2)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for path in paths:
+                    f.write("file '" + path.replace("'", "'\\''") + "'\n")
+            # 所有片段的编码参数相同，直接复制码流拼接，不重新编码
+            proc = _run(
+                [exe, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', '-movflags', '+faststart', tmp],
+                cancel
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(f'ffmpeg concat failed: {proc.stderr.strip()[-2000:]}')
+            os.replace(tmp, output)
+        finally:
+            os.remove(list_path)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        res = f'渲染完成：共{len(specs)}个片段，其中{len(specs) - len(todo)}个使用缓存，{len(todo)}个重新渲染，输出到{output}。'
+        if not has_drawtext and any(spec['title'] or spec['items'] for spec in specs):
+            res += '注意：当前ffmpeg不支持drawtext滤镜，标题和字幕没有被渲染。'
+        return res
+
+    def prune_cache(self) -> int:
+        # 删除当前大纲不再使用的缓存片段，返回删除的文件数量
+        keep = {self.spec_key(spec) + '.mp4' for spec in self.compile()}
+        removed = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.mp4') and entry.name not in keep:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+RenderManager.__doc__ = '''RenderManager类用于将OutlineManager中的大纲渲染为视频。每个大纲块被编译为一个片段描述（时长、分辨率、标题、字幕、图片等），
+片段以描述内容的SHA-256为文件名缓存在cache_dir中，修改大纲后只有描述发生变化的块会被重新渲染，最后用ffmpeg的concat直接复制码流拼接成片。
+块的主题作为片段开头3秒的标题；时间点的内容作为字幕显示到下一个时间点，内容为"image:图片路径"时居中显示该图片；成片从0:0:0开始，与大纲的时间完全一致：块之间以及第一个块之前的空白用纯色片段填充；块互相重叠或嵌套时按块的边界切分，每一段使用开始得最晚的块，
+所有时间点都在原来的时间显示，位于大纲结束时间及之后、无法显示的时间点会报错。
+渲染使用本机的ffmpeg，自动选择可用的编码器（libx264、libopenh264、h264_videotoolbox、mpeg4），多个片段由多个ffmpeg进程并行渲染。它包含以下方法：
+- __init__(self, outline, cache_dir='.render_cache', width=1280, height=720, fps=30, background='black', fontfile=None, ffmpeg='ffmpeg', workers=None): 初始化渲染器，
+  fontfile为字幕使用的字体文件（渲染中文时需要指定支持中文的字体），workers为同时运行的ffmpeg进程数量，默认为CPU核数的一半。
+- compile(self): 将大纲编译为按时间排序、首尾相接的片段描述列表。
+- spec_key(spec): 计算片段描述的缓存键。
+- render(self, output:str='output.mp4'): 渲染缺失的片段并拼接成片，返回渲染结果的说明。作为工具调用超时后会终止正在运行的ffmpeg进程，已完成的片段保留在缓存中。
+- prune_cache(self): 删除当前大纲不再使用的缓存片段。'''
+
+if __name__ == '__main__':
+    # 编译重叠、嵌套的大纲（不需要ffmpeg）：每个时间点都应出现在片段中，且片段起点加上偏移等于大纲中的时间
+    work = tempfile.mkdtemp()
+    om = OutlineManager(os.path.join(work, 'outline.txt'), autosave=False)
+    om.edit_outline_block('intro', '0:0:5', '0:0:20')
+    om.edit_outline_block('inner', '0:0:8', '0:0:12')
+    om.edit_outline_block('next', '0:0:15', '0:0:30')
+    om.add_content('0:0:6', 'hello')
+    om.add_content('0:0:9', 'inner cue')
+    om.add_content('0:0:16', 'next cue A')
+    om.add_content('0:0:25', 'next cue B')
+    specs = RenderManager(om)._compile(['-c:v', 'libx264'], True)
+    offset, shown = 0.0, {}
+    for spec in specs:
+        print(f"{offset:6.2f}s +{spec['duration']:5.2f}s {spec['label']}: {[(item['start'], item['text']) for item in spec['items']]}")
+        for item in spec['items']:
+            shown[item['text']] = round(offset + item['start'], 2)
+        offset += spec['duration']
+    assert [spec['label'] for spec in specs] == ['gap@0:0:0.0', 'intro', 'inner', 'intro@0:0:12.0', 'next']
+    assert offset == 30.0
+    assert shown == {'hello': 6.0, 'inner cue': 9.0, 'next cue A': 16.0, 'next cue B': 25.0}, shown
+    om.add_content('0:0:30', 'too late')
+    try:
+        RenderManager(om)._compile(['-c:v', 'libx264'], True)
+    except ValueError as e:
+        print(e)
+    else:
+        raise AssertionError('a time point at the end of the outline must not be dropped silently')
+    shutil.rmtree(work)
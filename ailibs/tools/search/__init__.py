@@ -1,7 +1,9 @@
 __all__ = [
-    'search', 'download', # modules
-    'SearchTool', 'DownloadTool' # classes & functions
+    'search', 'download', 'download_cache', 'search_cache', # modules
+    'SearchTool', 'DownloadTool', 'DownloadCache', 'SearchCache' # classes & functions
 ]
 
 from .search import SearchTool
-from .download import DownloadTool
\ No newline at end of file
+from .download import DownloadTool
+from .download_cache import DownloadCache
+from .search_cache import SearchCache
\ No newline at end of file
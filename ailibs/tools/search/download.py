@@ -1,11 +1,104 @@
 import requests
 import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+import urllib.parse
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait
 from tqdm import tqdm
-from ..tool_manager import AIFunction
+from typing import Iterator, List, Optional
+from ..tool_manager import AIFunction, cancel_event
+from ..file_manager import _atomic_write, _fsync_dir
+from ..knowledge_store import KnowledgeStore, html_to_text
+from .download_cache import DownloadCache, file_sha256
+
+_TEXT_EXTENSIONS = {'.txt', '.md', '.markdown', '.html', '.htm', '.csv', '.json', '.xml', '.srt', '.vtt'}
+_MAX_KNOWLEDGE_BYTES = 8 * 1024 * 1024
+_CHUNK_SIZE = 1024 * 1024
+_MIN_SEGMENT_BYTES = 4 * 1024 * 1024    # 每个分段至少这么大，小文件不拆分
+_STATE_INTERVAL = 8 * 1024 * 1024       # 每个分段每写入这么多字节保存一次分段进度
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)', re.IGNORECASE)
+
+class _JobProgress:
+    # 后台下载任务的进度计数，提供_advance用到的那部分tqdm接口，不在终端显示
+    def __init__(self) -> None:
+        self.total = self.n = 0
+
+    def refresh(self) -> None:
+        return
+
+    def update(self, n:int) -> None:
+        self.n += n
+        return
+
+def _check_cancel(cancel:Optional[threading.Event]) -> None:
+    # 工具调用超时后停止下载；分段下载的进度已经保存，之后可以续传
+    if cancel is not None and cancel.is_set():
+        raise RuntimeError('download cancelled because the tool call timed out')
+
+def _content_range_start(response:requests.Response) -> Optional[int]:
+    match = _CONTENT_RANGE.match(response.headers.get('content-range', ''))
+    return int(match.group(1)) if match else None
+
+def _content_range_total(response:requests.Response) -> Optional[int]:
+    match = _CONTENT_RANGE.match(response.headers.get('content-range', ''))
+    if match is None or match.group(3) == '*' or int(match.group(3)) == 0:
+        return None
+    return int(match.group(3))
+
+def _split_segments(total_size:int, segments:int) -> List[list]:
+    # 每个分段为[起始位置, 结束位置（不含）, 已下载字节数]
+    n = max(1, min(segments, -(-total_size // _MIN_SEGMENT_BYTES)))
+    bounds = [total_size * i // n for i in range(n + 1)]
+    return [[bounds[i], bounds[i + 1], 0] for i in range(n)]
+
+def _load_state(state_path:str) -> Optional[dict]:
+    # 读取分段进度文件，文件不存在或内容损坏时返回None（重新下载）
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        for start, end, done in state['segments']:
+            if not 0 <= done <= end - start:
+                return None
+        return state
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _preallocate(path:str, size:int) -> None:
+    # 预先分配磁盘空间，避免多个分段并发写入时产生碎片；文件系统不支持时退化为稀疏文件
+    with open(path, 'wb') as f:
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):
+            f.truncate(size)
+    return
 
 class DownloadTool:
-    def __init__(self, output_dir:str):
+    def __init__(self, output_dir:str, knowledge:Optional[KnowledgeStore]=None, max_concurrency:int=8, per_host:int=4, cache_dir:Optional[str]='.download_cache'):
+        if max_concurrency < 1 or per_host < 1:
+            raise ValueError('max_concurrency and per_host must be at least 1.')
         self.output_dir = output_dir
+        self.knowledge = knowledge
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.cache = DownloadCache(cache_dir) if cache_dir else None
+        # 所有下载共用一个Session，同一主机的连接保持长连接并复用；连接池大小与每个主机的并发上限一致
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._pool = None       # 后台下载任务使用的线程池，第一次调用start_downloads时创建
+        self._jobs = {}         # 句柄 : 后台下载任务
+        self._job_ids = itertools.count(1)
+        self._busy = set()      # 正在下载（包括排队中）的目标路径，同一路径同时只能有一个下载
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         self.build_function()
@@ -14,55 +107,419 @@ class DownloadTool:
         self.function = AIFunction([], [])
         self.function.add_function(
             name='download_file',
-            description='根据提供的URL下载文件，并显示下载进度。确保下载完成后文件保存到指定目录，并且验证文件完整性。',
+            description='根据提供的URL下载文件，并显示下载进度。服务器支持时分段并行下载，中断后使用相同的参数再次调用会从断点继续。下载完成并验证文件完整性后才会保存到指定路径，返回下载结果。',
             parameters={
                 'url': {'type': 'string', 'description': '要下载的文件的URL地址，必须是字符串。'},
                 'save_path': {'type': 'string', 'description': '文件保存的相对路径（相对于输出目录），必须是字符串。'},
-                'timeout': {'type': 'integer', 'description': '下载超时时间，单位为秒，默认为30秒，必须是整数。'}
+                'timeout': {'type': 'integer', 'description': '下载超时时间，单位为秒，默认为30秒，必须是整数。'},
+                'segments': {'type': 'integer', 'description': '并行下载的分段数，默认为4。服务器不支持分段下载时自动使用单连接下载。'},
+                'sha256': {'type': 'string', 'description': '可选，文件的SHA-256校验和（十六进制）。提供时会校验下载的文件，不一致则下载失败；缓存中已有该文件时直接使用，不会联网下载。'}
             },
             required=['url', 'save_path'],
-            function=self.download_file_with_progress
+            function=self.download_file_with_progress,
+            executor='thread',
+            timeout=1800
+        )
+        self.function.add_function(
+            name='download_many',
+            description='一次下载多个文件。所有文件并发下载（总连接数和每个主机的连接数都有上限），返回JSON格式的结果列表，每个文件一项，包含状态、大小、耗时和错误信息。需要下载两个以上的文件时应使用此工具，而不是多次调用download_file。',
+            parameters={
+                'downloads': {
+                    'type': 'array',
+                    'description': '要下载的文件列表',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'url': {'type': 'string', 'description': '要下载的文件的URL地址'},
+                            'save_path': {'type': 'string', 'description': '文件保存的相对路径（相对于输出目录）'},
+                            'sha256': {'type': 'string', 'description': '可选，文件的SHA-256校验和（十六进制）'}
+                        },
+                        'required': ['url', 'save_path']
+                    }
+                },
+                'timeout': {'type': 'integer', 'description': '每个请求的超时时间，单位为秒，默认为30秒。'},
+                'segments': {'type': 'integer', 'description': '每个文件并行下载的分段数，默认为4。'}
+            },
+            required=['downloads'],
+            function=self.download_many,
+            executor='thread',
+            timeout=3600
+        )
+        self.function.add_function(
+            name='start_downloads',
+            description='在后台开始下载一个或多个文件，立即返回每个文件的下载句柄，不等待下载完成。下载大文件时应使用此工具，然后继续编写脚本或大纲等其他工作，需要用到文件时再用wait_downloads等待，或用download_status查看进度。',
+            parameters={
+                'downloads': {
+                    'type': 'array',
+                    'description': '要下载的文件列表',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'url': {'type': 'string', 'description': '要下载的文件的URL地址'},
+                            'save_path': {'type': 'string', 'description': '文件保存的相对路径（相对于输出目录）'},
+                            'sha256': {'type': 'string', 'description': '可选，文件的SHA-256校验和（十六进制）'}
+                        },
+                        'required': ['url', 'save_path']
+                    }
+                },
+                'timeout': {'type': 'integer', 'description': '每个请求的超时时间，单位为秒，默认为30秒。'},
+                'segments': {'type': 'integer', 'description': '每个文件并行下载的分段数，默认为4。'}
+            },
+            required=['downloads'],
+            function=self.start_downloads
+        )
+        self.function.add_function(
+            name='download_status',
+            description='查看后台下载的状态，立即返回。未完成的下载返回已下载字节数、总字节数、百分比和速度，已完成的下载返回结果（包括失败原因）。',
+            parameters={
+                'handles': {'type': 'array', 'items': {'type': 'string'}, 'description': 'start_downloads返回的下载句柄列表，不提供时返回所有后台下载'}
+            },
+            required=[],
+            function=self.download_status
+        )
+        self.function.add_function(
+            name='wait_downloads',
+            description='等待后台下载完成，最多等待timeout秒，返回每个下载的状态；超时后仍未完成的下载继续在后台进行。',
+            parameters={
+                'handles': {'type': 'array', 'items': {'type': 'string'}, 'description': 'start_downloads返回的下载句柄列表，不提供时等待所有后台下载'},
+                'timeout': {'type': 'number', 'description': '最长等待时间，单位为秒，默认为300秒'}
+            },
+            required=[],
+            function=self.wait_downloads,
+            executor='thread',
+            timeout=3600
         )
     
-    def download_file_with_progress(self, url:str, save_path:str, timeout:int=30) -> None:
+    def download_file_with_progress(self, url:str, save_path:str, timeout:int=30, segments:int=4, sha256:Optional[str]=None) -> str:
         """
         带进度条的文件下载
         """
+        targets = self._claim_downloads([{'url': url, 'save_path': save_path}])
+        progress_bar = tqdm(total=0, unit='B', unit_scale=True, desc=os.path.basename(save_path))
+        try:
+            result = self._download(url, save_path, timeout, segments, progress_bar, sha256, cancel_event())
+        finally:
+            progress_bar.close()
+            self._release_downloads(targets)
+        if result['status'] != 'done':
+            message = f'下载失败：{result["error"]}'
+            if result.get('partial'):
+                message += f'。已下载的部分已保存（{result["partial"]}/{result["size"]}字节），使用相同的url和save_path再次调用会从断点继续下载。'
+            return message
+        message = f'文件下载完成，保存至：{result["path"]}（{result["size"]}字节，SHA-256 {result["sha256"]}，'
+        if result['cached']:
+            return message + '来自下载缓存，没有重新下载）'
+        if not result['segments']:
+            return message + '服务器不支持分段下载，使用单连接下载）'
+        message += f'{result["segments"]}个分段并行下载'
+        if result['resumed']:
+            message += f'，从断点继续，续传前已有{result["resumed"]}字节'
+        return message + '）'
+
+    def download_many(self, downloads:List[dict], timeout:int=30, segments:int=4) -> str:
+        targets = self._claim_downloads(downloads)
+        if not downloads:
+            return '[]'
+        # 所有文件共用一个进度条，文件大小在开始下载后逐个计入总量
+        progress_bar = tqdm(total=0, unit='B', unit_scale=True, desc=f'{len(downloads)}个文件')
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(downloads)), thread_name_prefix='download') as pool:
+                cancel = cancel_event()
+                results = list(pool.map(lambda item: self._download(item['url'], item['save_path'], timeout, segments, progress_bar, item.get('sha256'), cancel), downloads))
+        finally:
+            progress_bar.close()
+            self._release_downloads(targets)
+        return json.dumps(results, ensure_ascii=False, indent=1)
+
+    def start_downloads(self, downloads:List[dict], timeout:int=30, segments:int=4) -> str:
+        targets = self._claim_downloads(downloads)
+        handles = []
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='download-job')
+            for item, target in zip(downloads, targets):
+                job = {
+                    'handle': f'dl{next(self._job_ids)}', 'url': item['url'], 'save_path': item['save_path'], 'target': target, 'status': 'queued',
+                    'progress': _JobProgress(), 'started': None, 'result': None
+                }
+                self._jobs[job['handle']] = job
+                job['future'] = self._pool.submit(self._run_job, job, timeout, segments, item.get('sha256'))
+                handles.append({'handle': job['handle'], 'url': job['url'], 'save_path': job['save_path']})
+        return json.dumps(handles, ensure_ascii=False, indent=1)
+
+    def download_status(self, handles:Optional[List[str]]=None) -> str:
+        return json.dumps([self._job_status(job) for job in self._select_jobs(handles)], ensure_ascii=False, indent=1)
+
+    def wait_downloads(self, handles:Optional[List[str]]=None, timeout:float=300) -> str:
+        jobs = self._select_jobs(handles)
+        wait([job['future'] for job in jobs], timeout=max(0, timeout))
+        return json.dumps([self._job_status(job) for job in jobs], ensure_ascii=False, indent=1)
+
+    def _run_job(self, job:dict, timeout:int, segments:int, sha256:Optional[str]) -> None:
+        job.update(status='running', started=time.perf_counter())
+        try:
+            result = self._download(job['url'], job['save_path'], timeout, segments, job['progress'], sha256)
+        except BaseException as e:
+            result = {'url': job['url'], 'save_path': job['save_path'], 'status': 'failed', 'error': str(e)}
+        finally:
+            self._release_downloads([job['target']])
+        job.update(status=result['status'], result=result)
+        return
+
+    def _select_jobs(self, handles:Optional[List[str]]) -> List[dict]:
+        with self._lock:
+            if not handles:
+                return list(self._jobs.values())
+            unknown = [handle for handle in handles if handle not in self._jobs]
+            if unknown:
+                raise ValueError(f"Unknown download handle(s): {', '.join(map(str, unknown))}.")
+            return [self._jobs[handle] for handle in handles]
+
+    def _job_status(self, job:dict) -> dict:
+        if job['result'] is not None:
+            return {'handle': job['handle'], **job['result']}
+        progress = job['progress']
+        with self._lock:
+            downloaded, total = progress.n, progress.total
+        status = {'handle': job['handle'], 'url': job['url'], 'save_path': job['save_path'], 'status': job['status'], 'downloaded': downloaded, 'total': total or None}
+        if job['started'] is not None:
+            elapsed = time.perf_counter() - job['started']
+            status.update(percent=round(100 * downloaded / total, 1) if total else None, seconds=round(elapsed, 3), speed=int(downloaded / elapsed) if elapsed > 0 else 0)
+        return status
+
+    def _claim_downloads(self, downloads:List[dict]) -> List[str]:
+        # 检查下载列表的格式并登记目标路径，返回登记的路径，下载结束后必须调用_release_downloads；
+        # 同一批中的两项、或者一项与仍在进行的下载（包括后台下载和超时后仍未停止的前台下载）保存到同一路径时，抛出ValueError
+        targets = []
+        for idx, item in enumerate(downloads, start=1):
+            if not isinstance(item, dict) or not isinstance(item.get('url'), str) or not isinstance(item.get('save_path'), str) \
+                    or not isinstance(item.get('sha256') or '', str):
+                raise ValueError(f'Download {idx} must be an object with url and save_path.')
+            targets.append(self._target(item['save_path']))
+        with self._lock:
+            for idx, (item, target) in enumerate(zip(downloads, targets), start=1):
+                if target in self._busy or target in targets[:idx - 1]:
+                    raise ValueError(f"Download {idx} saves to '{item['save_path']}', which is still being written by another download. Wait for it to finish and try again.")
+            self._busy.update(targets)
+        return targets
+
+    def _release_downloads(self, targets:List[str]) -> None:
+        with self._lock:
+            self._busy.difference_update(targets)
+        return
+
+    def _target(self, save_path:str) -> str:
+        return os.path.normpath(os.path.join(self.output_dir, save_path))
+
+    def _advance(self, progress_bar:tqdm, total:int=0, n:int=0) -> None:
+        with self._lock:
+            if total:
+                progress_bar.total += total
+                progress_bar.refresh()
+            if n:
+                progress_bar.update(n)
+        return
+
+    @contextlib.contextmanager
+    def _request(self, url:str, timeout:int, headers:Optional[dict]=None) -> Iterator[requests.Response]:
+        # 每个请求在整个响应读取期间占用一个主机连接名额和一个全局连接名额；先取主机名额，等待繁忙主机的请求不会占用全局名额
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self._lock:
+            host_slot = self._host_slots.get(host)
+            if host_slot is None:
+                host_slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+        with host_slot, self._slots:
+            response = self.session.get(url, stream=True, timeout=timeout, headers=headers)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def _download(self, url:str, save_path:str, timeout:int, segments:int, progress_bar:tqdm, sha256:Optional[str]=None, cancel:Optional[threading.Event]=None) -> dict:
+        # 下载一个文件并返回结构化的结果；异常不会抛出，而是记录在结果中
+        full_save_path = os.path.join(self.output_dir, save_path)
+        expected = sha256.strip().lower() if sha256 else ''
+        result = {'url': url, 'save_path': save_path, 'path': full_save_path, 'status': 'done', 'size': 0, 'sha256': '', 'cached': '', 'segments': 0, 'resumed': 0, 'seconds': 0.0}
+        start = time.perf_counter()
         try:
-            full_save_path = os.path.join(self.output_dir, save_path)
+            _check_cancel(cancel)
             save_dir = os.path.dirname(full_save_path)
             if save_dir and not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-            
-            response = requests.get(url, stream=True, timeout=timeout)
-            response.raise_for_status()
-            
-            # 获取文件总大小（单位：字节）
-            total_size = int(response.headers.get('content-length', 0))
-            chunk_size = 1024 * 1024
-            
-            # 创建进度条
-            progress_bar = tqdm(total=total_size, unit='B', unit_scale=True, desc=os.path.basename(full_save_path))
-            
-            with open(full_save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        progress_bar.update(len(chunk))  # 更新进度条
-            
-            progress_bar.close()
-            # 验证文件大小是否匹配
-            if total_size != 0 and progress_bar.n != total_size:
-                print("警告：文件下载不完整！")
+                os.makedirs(save_dir, exist_ok=True)
+            # 已知校验和并且缓存中有对应的内容块时，完全不需要访问网络
+            if expected and self._from_cache(expected, full_save_path, result):
+                self._feed_knowledge(full_save_path, url, '')
+                result['seconds'] = round(time.perf_counter() - start, 3)
+                return result
+            # 用只请求第一个字节的Range请求探测服务器是否支持分段下载；不支持时服务器返回200和完整内容，直接用它单连接下载
+            with self._request(url, timeout, {'Range': 'bytes=0-0'}) as response:
+                response.raise_for_status()
+                headers = response.headers
+                etag, last_modified = headers.get('etag', ''), headers.get('last-modified', '')
+                ranged = response.status_code == 206
+                total_size = _content_range_total(response) if ranged else None
+                if ranged:
+                    response.content    # 读完响应，连接才能放回连接池复用
+                digest = self.cache.lookup(url, etag, last_modified) if self.cache is not None else None
+                if digest is not None and (not expected or digest == expected) and self._from_cache(digest, full_save_path, result):
+                    pass
+                elif not ranged:
+                    self._download_single(full_save_path, response, progress_bar, result, expected, cancel)
+            if result['cached'] or not ranged:
+                pass
+            elif total_size is None:
+                # 服务器支持Range但没有给出文件大小，无法分段，重新用单连接下载
+                with self._request(url, timeout) as response:
+                    response.raise_for_status()
+                    self._download_single(full_save_path, response, progress_bar, result, expected, cancel)
             else:
-                print(f"\n文件下载完成，保存至：{full_save_path}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"下载失败：{e}")
+                self._download_ranges(url, full_save_path, headers, total_size, timeout, max(1, int(segments)), progress_bar, result, expected, cancel)
+            if self.cache is not None and not result['cached']:
+                try:
+                    self.cache.store(full_save_path, result['sha256'], url, etag, last_modified)
+                except (OSError, sqlite3.Error):
+                    pass    # 缓存只用于加速，写入失败不影响本次下载的结果
+            self._feed_knowledge(full_save_path, url, headers.get('content-type', ''))
         except Exception as e:
-            print(f"下载失败：{e}")
+            result.update(status='failed', error=str(e))
+            state = _load_state(full_save_path + '.part.json')
+            if state is not None:
+                result.update(size=state['size'], partial=sum(seg[2] for seg in state['segments']))
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _from_cache(self, digest:str, full_save_path:str, result:dict) -> bool:
+        method = self.cache.link(digest, full_save_path) if self.cache is not None else None
+        if method is None:
+            return False
+        result.update(size=os.path.getsize(full_save_path), sha256=digest, cached=method)
+        return True
+
+    def _download_single(self, full_save_path:str, response:requests.Response, progress_bar:tqdm, result:dict, expected:str='', cancel:Optional[threading.Event]=None) -> None:
+        # 服务器不支持Range时无法续传：写入.part文件，完成后再原子地替换目标文件
+        part_path = full_save_path + '.part'
+        total_size = int(response.headers.get('content-length', 0))
+        self._advance(progress_bar, total=total_size)
+        received = 0
+        hasher = hashlib.sha256()   # 边下载边计算校验和
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    _check_cancel(cancel)
+                    if chunk:
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        received += len(chunk)
+                        self._advance(progress_bar, n=len(chunk))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            # 单连接下载无法续传，中断时不保留不完整的数据
+            os.unlink(part_path)
+            raise
+        # 验证文件大小是否匹配
+        if total_size != 0 and received != total_size:
+            os.unlink(part_path)
+            raise RuntimeError(f'incomplete download ({received}/{total_size} bytes) and the server does not support resuming')
+        self._finish(part_path, full_save_path, hasher.hexdigest(), expected)
+        result.update(size=received, sha256=hasher.hexdigest())
         return
-    
+
+    def _download_ranges(self, url:str, full_save_path:str, headers, total_size:int, timeout:int, segments:int, progress_bar:tqdm, result:dict, expected:str='', cancel:Optional[threading.Event]=None) -> None:
+        part_path, state_path = full_save_path + '.part', full_save_path + '.part.json'
+        etag = headers.get('etag', '')
+        last_modified = headers.get('last-modified', '')
+        state = _load_state(state_path)
+        # 只有URL、文件大小和服务器的版本标识（ETag/Last-Modified）都没有变化时才续传，否则重新开始
+        if state is None or (state['url'], state['size'], state['etag'], state['last_modified']) != (url, total_size, etag, last_modified) \
+                or not os.path.exists(part_path) or os.path.getsize(part_path) != total_size:
+            state = {'url': url, 'size': total_size, 'etag': etag, 'last_modified': last_modified, 'segments': _split_segments(total_size, segments)}
+            _preallocate(part_path, total_size)
+            _atomic_write(state_path, json.dumps(state))
+        resumed = sum(seg[2] for seg in state['segments'])
+        pending = [seg for seg in state['segments'] if seg[0] + seg[2] < seg[1]]
+        # If-Range：文件在两次请求之间被修改时服务器返回200而不是206，避免把新旧版本的数据拼在一起（弱ETag不能用于If-Range）
+        validator = etag if etag and not etag.startswith('W/') else last_modified
+        lock = threading.Lock()
+        self._advance(progress_bar, total=total_size, n=resumed)
+
+        def save_state() -> None:
+            with lock:
+                data = json.dumps(state)
+            _atomic_write(state_path, data)
+
+        def fetch(seg:list) -> None:
+            _check_cancel(cancel)
+            headers = {'Range': f'bytes={seg[0] + seg[2]}-{seg[1] - 1}'}
+            if validator:
+                headers['If-Range'] = validator
+            with self._request(url, timeout, headers) as response:
+                response.raise_for_status()
+                if response.status_code != 206 or _content_range_start(response) != seg[0] + seg[2]:
+                    raise RuntimeError('the server returned a different byte range, the remote file may have changed')
+                unsaved = 0
+                with open(part_path, 'r+b', buffering=0) as f:
+                    f.seek(seg[0] + seg[2])
+                    # 读完整个响应而不是在分段结束时提前退出，连接才能复用
+                    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                        _check_cancel(cancel)
+                        chunk = chunk[:seg[1] - seg[0] - seg[2]]
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        with lock:
+                            seg[2] += len(chunk)
+                        self._advance(progress_bar, n=len(chunk))
+                        unsaved += len(chunk)
+                        if unsaved >= _STATE_INTERVAL:
+                            save_state()
+                            unsaved = 0
+            if seg[0] + seg[2] < seg[1]:
+                raise RuntimeError(f'connection closed at byte {seg[0] + seg[2]} of segment {seg[0]}-{seg[1] - 1}')
+            save_state()
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='download') as pool:
+                errors = [future.exception() for future in [pool.submit(fetch, seg) for seg in pending]]
+            save_state()
+            errors = [e for e in errors if e is not None]
+            if errors:
+                raise errors[0]
+        with open(part_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        # 各分段乱序写入，无法在下载时计算SHA-256；刚写入的数据还在页缓存中，顺序读一遍的开销很小
+        digest = file_sha256(part_path)
+        os.unlink(state_path)
+        self._finish(part_path, full_save_path, digest, expected)
+        result.update(size=total_size, sha256=digest, segments=len(state['segments']), resumed=resumed)
+        return
+
+    def _finish(self, part_path:str, full_save_path:str, digest:str, expected:str='') -> None:
+        # 校验和不一致时删除下载的数据，目标路径保持不变
+        if expected and digest != expected:
+            os.unlink(part_path)
+            raise RuntimeError(f'SHA-256 mismatch: expected {expected}, got {digest}')
+        os.replace(part_path, full_save_path)
+        _fsync_dir(os.path.dirname(full_save_path))
+        return
+
+    def _feed_knowledge(self, path:str, url:str, content_type:str) -> None:
+        # 下载的文本文件（按扩展名或Content-Type判断）存入资料库，HTML先提取正文
+        if self.knowledge is None:
+            return
+        ext = os.path.splitext(path)[1].lower()
+        content_type = content_type.split(';')[0].strip().lower()
+        if ext not in _TEXT_EXTENSIONS and not content_type.startswith('text/'):
+            return
+        if os.path.getsize(path) > _MAX_KNOWLEDGE_BYTES:
+            return
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        if ext in ('.html', '.htm') or content_type == 'text/html':
+            text = html_to_text(text)
+        self.knowledge.add(text, url)
+        return
+
     def __call__(self, *args, **kwargs):
         return self.function(*args, **kwargs)
 
@@ -70,13 +527,158 @@ DownloadTool.download_file_with_progress.__doc__ = '''download_file_with_progres
 - url: 要下载的文件的URL地址，必须是字符串。
 - save_path: 文件保存的相对路径（相对于输出目录），必须是字符串。
 - timeout: 下载超时时间，单位为秒，默认为30秒，必须是整数。
-该方法会尝试从指定的URL下载文件，并将其保存到输出目录下的指定路径。下载过程中会显示一个进度条，指示下载的进度和速度。下载完成后，方法会验证下载的文件大小是否与服务器提供的内容长度匹配，以确保文件完整性。
-如果下载成功，方法会打印文件保存的路径；如果下载失败，则会捕获异常并打印错误信息。'''
+- segments: 并行下载的分段数，默认为4，每个分段至少4MiB。
+- sha256: 可选的SHA-256校验和（十六进制）。提供时下载的数据必须与之一致，否则删除下载的数据并返回失败；下载缓存中已有该内容时直接从缓存取出，不访问网络。
+该方法先发送一个只请求第一个字节的Range请求：服务器返回206时，在目标路径旁边预先分配<save_path>.part文件，把文件分成若干段用多个线程并行下载，各自写入.part文件中对应的位置，
+并把每一段的下载进度保存在<save_path>.part.json中。下载中断后使用相同的参数再次调用，只要服务器上的文件没有变化（大小、ETag和Last-Modified相同），就只下载剩余的部分。
+服务器返回200（不支持Range）时使用单连接下载到.part文件，中断后需要重新下载。只有全部数据下载完成后，.part文件才会被原子地重命名为目标文件，因此目标路径上不会出现不完整的文件。
+启用下载缓存时，如果同一URL的同一版本（ETag/Last-Modified相同）已经下载过，则直接从缓存中取出，不再下载；新下载的文件在计算SHA-256之后加入缓存。
+单连接下载时边下载边计算SHA-256，分段下载时在全部分段完成后顺序读取一遍.part文件计算。
+该方法返回描述下载结果的字符串；下载失败时返回错误信息，以及已保存的进度。'''
 DownloadTool.__call__.__doc__ = '''__call__方法用于调用当前对象的函数定义列表中的函数。它接受以下参数：
 - *args: 可选的位置参数，将被传递给函数实现。
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
 该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
+DownloadTool.download_many.__doc__ = '''download_many方法用于一次下载多个文件。它接受以下参数：
+- downloads: 要下载的文件列表，每一项是包含url和save_path的字典，可以包含可选的sha256校验和。
+- timeout: 每个请求的超时时间，单位为秒，默认为30秒。
+- segments: 每个文件并行下载的分段数，默认为4。
+最多max_concurrency个文件同时下载，每个文件的下载方式与download_file_with_progress相同。所有请求共用一个连接池，同时进行的请求总数不超过max_concurrency，对同一个主机不超过per_host，连接保持长连接并复用。
+下载过程中显示一个汇总所有文件的进度条。任何一项缺少url或save_path，或者与仍在进行的下载（包括后台下载，以及超时后仍未停止的download_file）保存到同一路径时，抛出ValueError，不会开始下载。
+该方法返回JSON格式的结果列表，顺序与downloads相同，每一项包含url、save_path、path、status（done或failed）、size、sha256、cached（从缓存取出时为hardlink、reflink或copy，否则为空）、segments（0表示单连接下载）、resumed（续传前已有的字节数）、seconds，失败时还有error以及已保存的字节数partial。'''
+DownloadTool.start_downloads.__doc__ = '''start_downloads方法用于在后台下载一个或多个文件，立即返回。它接受的参数与download_many相同。
+每个文件创建一个后台任务，在DownloadTool自己的线程池中执行（最多max_concurrency个同时下载），下载方式与download_file_with_progress相同，但不在终端显示进度条。
+该方法返回JSON格式的列表，每一项包含下载句柄handle、url和save_path；之后可以用download_status查看进度，或用wait_downloads等待完成。'''
+DownloadTool.download_status.__doc__ = '''download_status方法用于查看后台下载的状态，立即返回。它接受以下参数：
+- handles: 下载句柄列表，为空时返回所有后台下载。包含未知的句柄时抛出ValueError。
+该方法返回JSON格式的列表：未完成的下载包含status（queued或running）、downloaded、total（未知时为null）、percent、seconds和speed（字节/秒）；
+已完成的下载包含handle以及与download_many相同的结果字段。'''
+DownloadTool.wait_downloads.__doc__ = '''wait_downloads方法用于等待后台下载完成。它接受以下参数：
+- handles: 下载句柄列表，为空时等待所有后台下载。包含未知的句柄时抛出ValueError。
+- timeout: 最长等待时间，单位为秒，默认为300秒。超时不会取消下载。
+该方法返回格式与download_status相同的状态列表。'''
 DownloadTool.build_function.__doc__ = '''build_function方法用于构建当前对象的函数定义列表。该方法不需要参数。
-该方法会创建一个新的AIFunction对象，并使用add_function方法添加一个名为'download_file'的函数定义。这个函数定义包含了函数的名称、描述、参数信息、必需参数列表以及对应的函数实现。函数实现是当前对象的download_file_with_progress方法。该方法不返回任何值，但会将构建好的函数定义列表保存在当前对象的function属性中，以供后续调用使用。'''
-DownloadTool.__doc__ = DownloadTool.__init__.__doc__ = '''DownloadTool类用于提供一个基于Python requests库的文件下载工具。它可以根据提供的URL下载文件，并显示下载进度。使用时需要指定一个输出目录，下载完成后文件将保存到该目录下。构造函数接受一个参数：
-- output_dir: 文件下载后保存的目录路径，必须是字符串。如果目录不存在，则会自动创建。'''
\ No newline at end of file
+该方法会创建一个新的AIFunction对象，并使用add_function方法添加名为'download_file'、'download_many'、'start_downloads'、'download_status'和'wait_downloads'的函数定义。这些函数定义包含了函数的名称、描述、参数信息、必需参数列表以及对应的函数实现。
+其中download_file、download_many和wait_downloads会在共享线程池中执行，分别超过1800秒、3600秒和3600秒未完成则向模型返回超时结果；start_downloads和download_status立即返回，直接执行。该方法不返回任何值，但会将构建好的函数定义列表保存在当前对象的function属性中，以供后续调用使用。'''
+DownloadTool.__doc__ = DownloadTool.__init__.__doc__ = '''DownloadTool类用于提供一个基于Python requests库的文件下载工具。它可以根据提供的URL下载文件，并显示下载进度。使用时需要指定一个输出目录，下载完成后文件将保存到该目录下。
+所有下载共用一个requests.Session连接池，同一主机的连接会被复用。构造函数接受以下参数：
+- output_dir: 文件下载后保存的目录路径，必须是字符串。如果目录不存在，则会自动创建。
+- knowledge: 可选的KnowledgeStore资料库，下载完成的文本文件（txt、md、html等）会被提取正文并存入其中。
+- max_concurrency: 同时进行的请求总数上限（包括分段下载的请求），也是download_many和后台下载同时下载的文件数上限，默认为8。
+- per_host: 对同一个主机同时进行的请求数上限，默认为4。
+- cache_dir: 下载缓存（DownloadCache）的目录，默认为'.download_cache'，多个任务使用同一个目录即可共享缓存；为None时不使用缓存。
+从缓存中取出的文件优先以硬链接的方式放入输出目录，修改这类文件时应写入新文件再替换，而不是原地修改。'''
+
+if __name__ == '__main__':
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        # 本地测试服务器：ranges为False时忽略Range请求头；fail_after为非None时，每个分段响应只发送这么多字节就断开连接
+        protocol_version = 'HTTP/1.1'   # 支持长连接
+        data = os.urandom(10 * 1024 * 1024 + 123)
+        ranges, fail_after, served, delay = True, None, 0, 0
+        requests, connections = 0, set()
+
+        def do_GET(self):
+            type(self).requests += 1
+            self.connections.add(self.client_address)
+            start, end = 0, len(self.data) - 1
+            match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+            if self.ranges and match:
+                start, end = int(match.group(1)), int(match.group(2) or end)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(self.data)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            body = self.data[start:end + 1]
+            time.sleep(self.delay)
+            if self.fail_after is not None and len(body) > 1:
+                body = body[:self.fail_after]
+                self.close_connection = True
+            type(self).served += len(body)
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/data.bin'
+    with tempfile.TemporaryDirectory() as tmp:
+        tool = DownloadTool(tmp, cache_dir=None)
+        print(tool.download_file_with_progress(url, 'a.bin', segments=3))
+        with open(os.path.join(tmp, 'a.bin'), 'rb') as f:
+            assert f.read() == _Handler.data
+        assert not os.path.exists(os.path.join(tmp, 'a.bin.part.json'))
+
+        _Handler.fail_after = 1024 * 1024   # 每个分段只下载1MiB就断开，下载失败但保留进度
+        print(tool.download_file_with_progress(url, 'b.bin', segments=3))
+        assert not os.path.exists(os.path.join(tmp, 'b.bin')) and os.path.exists(os.path.join(tmp, 'b.bin.part.json'))
+        _Handler.fail_after, _Handler.served = None, 0
+        print(tool.download_file_with_progress(url, 'b.bin', segments=3))
+        with open(os.path.join(tmp, 'b.bin'), 'rb') as f:
+            assert f.read() == _Handler.data
+        assert _Handler.served <= len(_Handler.data) - 3 * 1024 * 1024 + 1   # 只下载了剩余部分
+
+        _Handler.ranges = False
+        print(tool.download_file_with_progress(url, 'c.bin'))
+        with open(os.path.join(tmp, 'c.bin'), 'rb') as f:
+            assert f.read() == _Handler.data
+        _Handler.fail_after = 1024 * 1024   # 单连接下载中断时不保留.part文件
+        print(tool.download_file_with_progress(url, 'd.bin'))
+        assert not os.path.exists(os.path.join(tmp, 'd.bin.part'))
+        _Handler.fail_after = None
+
+        _Handler.ranges, _Handler.requests, _Handler.connections = True, 0, set()
+        cache_dir = os.path.join(tmp, 'cache')
+        tool = DownloadTool(tmp, max_concurrency=4, per_host=2, cache_dir=cache_dir)
+        items = [{'url': f'{url}?n={i}', 'save_path': f'many/{i}.bin'} for i in range(6)]
+        results = json.loads(tool.download_many(items + [{'url': 'http://127.0.0.1:1/missing', 'save_path': 'many/missing.bin'}]))
+        assert [r['status'] for r in results] == ['done'] * 6 + ['failed'] and results[0]['segments'] == 3
+        assert len(_Handler.connections) <= 2 < _Handler.requests    # 每个主机最多2个连接，并且连接被复用
+        print(results[-1])
+        assert tool.cache.stats()['blobs'] == 1 and os.stat(os.path.join(tmp, 'many/0.bin')).st_nlink == 7    # 内容相同，只保存一份
+
+        _Handler.requests = 0
+        results = json.loads(DownloadTool(os.path.join(tmp, 'job2'), cache_dir=cache_dir).download_many([{'url': item['url'], 'save_path': f'{i}.bin'} for i, item in enumerate(items)]))
+        assert all(r['cached'] == 'hardlink' for r in results) and _Handler.requests == 6   # 每个文件只发送一个探测请求
+        digest = results[0]['sha256']
+        print(tool.download_file_with_progress('http://127.0.0.1:1/offline', 'offline.bin', sha256=digest.upper()))  # 只凭校验和命中缓存，不访问网络
+        with open(os.path.join(tmp, 'offline.bin'), 'rb') as f:
+            assert f.read() == _Handler.data
+        print(tool.download_file_with_progress(f'{url}?n=new', 'bad.bin', sha256='0' * 64))
+        assert not os.path.exists(os.path.join(tmp, 'bad.bin')) and not os.path.exists(os.path.join(tmp, 'bad.bin.part'))
+
+        _Handler.delay = 0.3
+        begin = time.perf_counter()
+        handles = [h['handle'] for h in json.loads(tool.start_downloads([{'url': f'{url}?bg={i}', 'save_path': f'bg/{i}.bin'} for i in range(3)]))]
+        assert time.perf_counter() - begin < 0.1     # 立即返回句柄
+        try:
+            tool.start_downloads([{'url': url, 'save_path': 'bg/0.bin'}])
+            raise AssertionError('expected ValueError')
+        except ValueError:
+            pass
+        try:
+            tool.download_file_with_progress(url, 'bg/1.bin')
+            raise AssertionError('expected ValueError')
+        except ValueError:
+            pass
+        print(tool.download_status(handles[:1]))
+        statuses = json.loads(tool.wait_downloads(handles, timeout=60))
+        assert [s['status'] for s in statuses] == ['done'] * 3 and all(s['cached'] == '' for s in statuses)
+        print(statuses[0])
+        foreground = threading.Thread(target=tool.download_file_with_progress, args=(f'{url}?fg=1', 'fg.bin'))
+        foreground.start()
+        time.sleep(0.1)
+        try:
+            tool.download_file_with_progress(f'{url}?fg=1', 'fg.bin')     # 前台下载仍在进行时，重复调用不会写同一个.part文件
+            raise AssertionError('expected ValueError')
+        except ValueError as e:
+            print(e)
+        foreground.join()
+        assert os.path.exists(os.path.join(tmp, 'fg.bin'))
+    server.shutdown()
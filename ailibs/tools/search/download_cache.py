@@ -0,0 +1,176 @@
+from ..file_manager import _fsync_dir
+from typing import Optional, Tuple
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+_FICLONE = 0x40049409   # Linux ioctl：在支持的文件系统（Btrfs、XFS等）上创建共享数据块的副本
+_HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    created REAL NOT NULL
+);
+'''
+
+def file_sha256(path:str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def place_file(src:str, dst:str) -> str:
+    # 在目标目录中先创建临时文件再原子地替换dst；依次尝试硬链接、reflink和复制，返回实际使用的方式
+    fd, tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(dst)}.', suffix='.tmp', dir=os.path.dirname(dst) or os.curdir)
+    os.close(fd)
+    try:
+        try:
+            os.unlink(tmp)
+            os.link(src, tmp)
+            method = 'hardlink'
+        except OSError:
+            try:
+                import fcntl
+                with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+                    fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                method = 'reflink'
+            except (ImportError, OSError):
+                shutil.copyfile(src, tmp)
+                method = 'copy'
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(os.path.dirname(dst))
+    return method
+
+class DownloadCache:
+    def __init__(self, path:str='.download_cache') -> None:
+        self.path = path
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, 'index.sqlite3'), timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._digest_locks = {}     # 内容摘要 : 该内容的store锁
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        return
+
+    @staticmethod
+    def key(url:str, etag:str='', last_modified:str='') -> Optional[str]:
+        # 没有ETag和Last-Modified时无法判断服务器上的文件是否变化，不按URL缓存
+        if not etag and not last_modified:
+            return None
+        return hashlib.sha256(f'{url}\0{etag}\0{last_modified}'.encode('utf-8')).hexdigest()
+
+    def blob_path(self, digest:str) -> str:
+        return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+    def _blob_stat(self, digest:str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.blob_path(digest))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def has(self, digest:str) -> bool:
+        # 内容块以硬链接放入输出目录，如果有人原地修改了输出文件，内容块也会改变；大小或修改时间与记录不一致时视为不存在
+        digest = digest.lower()
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime_ns FROM blobs WHERE digest=?', (digest,)).fetchone()
+        return row is not None and self._blob_stat(digest) == tuple(row)
+
+    def lookup(self, url:str, etag:str='', last_modified:str='') -> Optional[str]:
+        key = self.key(url, etag, last_modified)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT digest FROM urls WHERE key=?', (key,)).fetchone()
+        if row is None or not self.has(row[0]):
+            return None
+        return row[0]
+
+    def link(self, digest:str, target:str) -> Optional[str]:
+        # 把内容块放到target，返回使用的方式（hardlink、reflink或copy）；内容块不存在时返回None
+        digest = digest.lower()
+        if not self.has(digest):
+            return None
+        try:
+            return place_file(self.blob_path(digest), target)
+        except FileNotFoundError:
+            return None     # 内容块在检查之后被其他进程替换
+
+    def store(self, path:str, digest:str, url:str='', etag:str='', last_modified:str='') -> None:
+        # 把已下载并校验过的文件加入缓存；相同内容的内容块已经存在时，用指向内容块的链接替换path，不再占用额外的磁盘空间
+        digest = digest.lower()
+        blob = self.blob_path(digest)
+        with self._lock:
+            digest_lock = self._digest_locks.setdefault(digest, threading.Lock())
+        # 同一进程中对同一内容的store串行执行；不同进程之间由os.link保证只有一个文件成为内容块
+        with digest_lock:
+            if not self.has(digest):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    os.link(path, blob)
+                except FileExistsError:
+                    # 内容块已被其他进程创建但还没有记录，或者已被原地修改：内容正确就沿用，否则替换
+                    if file_sha256(blob) != digest:
+                        place_file(path, blob)
+                except OSError:
+                    place_file(path, blob)  # 缓存目录与path不在同一个文件系统上，或者文件系统不支持硬链接
+                size, mtime_ns = self._blob_stat(digest)
+                with self._lock:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO blobs (digest, size, mtime_ns, created) VALUES (?, ?, ?, ?)',
+                        (digest, size, mtime_ns, time.time())
+                    )
+            if not os.path.samefile(path, blob):
+                place_file(blob, path)
+        key = self.key(url, etag, last_modified)
+        if key is not None:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO urls (key, url, digest, created) VALUES (?, ?, ?, ?)',
+                    (key, url, digest, time.time())
+                )
+        return
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+            urls = self._conn.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+        return {'blobs': blobs, 'bytes': size, 'urls': urls}
+
+DownloadCache.__doc__ = '''DownloadCache类是一个按内容寻址的下载缓存，可以被多个进程和多个任务的输出目录共同使用。下载的文件按SHA-256摘要保存为内容块（blobs/<前两位>/<摘要>），
+索引保存在SQLite文件中：URL加上服务器返回的ETag/Last-Modified映射到内容摘要，没有这两个响应头的URL只按内容摘要缓存。
+取出文件时依次尝试硬链接、reflink（FICLONE）和复制，因此缓存目录与输出目录在同一个文件系统上时，重复的文件不占用额外的磁盘空间。它包含以下方法：
+- __init__(self, path:str='.download_cache'): 打开（或创建）缓存目录。
+- has(self, digest:str): 判断内容块是否存在且没有被修改。
+- lookup(self, url:str, etag:str='', last_modified:str=''): 返回URL对应版本的内容摘要，未缓存时返回None。
+- link(self, digest:str, target:str): 把内容块原子地放到target，返回使用的方式，内容块不存在时返回None。
+- store(self, path:str, digest:str, url:str='', etag:str='', last_modified:str=''): 把下载好的文件加入缓存；内容相同的内容块已经存在时，path会被替换为指向它的链接。
+- stats(self): 返回内容块数量、总字节数和URL记录数。
+注意：硬链接的输出文件与内容块共享数据，修改输出文件时应写入新文件再替换（FileManager就是这样做的），原地修改会使对应的内容块失效。'''
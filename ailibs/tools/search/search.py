@@ -1,16 +1,28 @@
 from ..tool_manager import AIFunction
+from .search_cache import SearchCache
+from ..knowledge_store import KnowledgeStore
 from volcenginesdkarkruntime import Ark
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+import threading
 
 # 使用前请配置火山引擎API KEY，配置方法见：https://www.volcengine.com/docs/82379/1399008
 
 class SearchTool:
-    def __init__(self, ark_api_key:str, ark_ep_id:str):
+    def __init__(self, ark_api_key:str, ark_ep_id:str, cache_path:Optional[str]='.search_cache.sqlite3', cache_ttl:float=7 * 24 * 3600, cache_size:int=1000, client=None, max_concurrency:int=4, knowledge:Optional[KnowledgeStore]=None):
         self.ark_api_key = ark_api_key
         self.ark_ep_id = ark_ep_id
-        self.client = Ark(
+        self.client = client if client is not None else Ark(
             base_url='https://ark.cn-beijing.volces.com/api/v3',
             api_key=self.ark_api_key,
         )
+        self.cache = SearchCache(cache_path, cache_ttl, cache_size) if cache_path is not None else None
+        self.max_concurrency = max_concurrency
+        self.knowledge = knowledge
+        self._pool = None
+        self._inflight = {}     # 缓存键 : 正在执行的搜索（Future），相同的查询同时只执行一次
+        self._inflight_lock = threading.Lock()
+        self.build_function()
     
     def build_function(self)->None:
         self.function = AIFunction([], [])
@@ -21,10 +33,79 @@ class SearchTool:
                 'query': '要搜索的查询内容，必须是字符串。'
             },
             required=['query'],
-            function=self.search
+            function=self.search,
+            executor='thread',
+            timeout=180
+        )
+        self.function.add_function(
+            name='search_many',
+            description='同时对多个查询内容进行网络搜索，并按查询分节返回整理后的结果。需要搜索多个相关主题时应优先使用此工具，一次调用完成所有搜索。',
+            parameters={
+                'queries': {'type': 'array', 'items': {'type': 'string'}, 'description': '要搜索的查询内容列表，重复的查询只会搜索一次。'}
+            },
+            required=['queries'],
+            function=self.search_many,
+            executor='thread',
+            timeout=300
         )
 
     def search(self, query:str) -> str:
+        # 如果相同的查询正在被其他线程搜索，直接等待它的结果
+        key = SearchCache.key(query, self.ark_ep_id)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = self._search_cached(query)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def search_many(self, queries:List[str]) -> str:
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            raise ValueError('queries must be a non-empty list of non-empty strings.')
+        # 去掉规范化后重复的查询，每个查询保留第一次出现的位置
+        unique = {}
+        for q in queries:
+            unique.setdefault(SearchCache.key(q, self.ark_ep_id), q)
+        unique = list(unique.values())
+        with self._inflight_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='search')
+        futures = [self._pool.submit(self.search, q) for q in unique]
+        sections = []
+        for idx, (query, future) in enumerate(zip(unique, futures), start=1):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = f'搜索失败：{type(e).__name__}: {e}'
+            sections.append(f'## 查询{idx}：{query}\n{result}')
+        return '\n\n'.join(sections)
+
+    def _search_cached(self, query:str) -> str:
+        if self.cache is not None:
+            cached = self.cache.get(query, self.ark_ep_id)
+            if cached is not None:
+                return cached
+        result = self._search_remote(query)
+        if self.cache is not None and result:
+            self.cache.put(query, result, self.ark_ep_id)
+        if self.knowledge is not None and result:
+            # 新的搜索结果存入资料库，之后的步骤可以通过recall取回
+            self.knowledge.add(result, f'搜索：{query}')
+        return result
+
+    def _search_remote(self, query:str) -> str:
         tools = [{
             "type": "web_search",
             "max_keyword": 5
@@ -51,15 +132,70 @@ class SearchTool:
     
 SearchTool.search.__doc__ = '''search方法用于根据用户的查询内容进行网络搜索，并整理搜索结果，输出详细的说明性文本回答。它接受一个参数：
 - query: 要搜索的查询内容，必须是字符串。
+启用缓存时会先按规范化后的查询内容和模型ID查找缓存，命中则直接返回缓存的结果；未命中时执行搜索，并将非空结果写入缓存。
 该方法会使用火山引擎的Ark模型来执行网络搜索，并根据用户的查询内容生成一个系统提示和一个用户提示。系统提示告诉模型它是一个AI联网搜索工具，用户提示则包含了具体的搜索需求和要求。方法会调用Ark模型的responses.create接口来获取搜索结果，并从响应中提取生成的文本回答返回。该回答应当尽可能详细地描述搜索主题的内容，确保总结客观准确，保留关键数据和时间，并且不得包含无关内容和提问。'''
+SearchTool.search_many.__doc__ = '''search_many方法用于同时对多个查询内容进行网络搜索，并返回按查询分节合并的结果。它接受一个参数：
+- queries: 要搜索的查询内容列表，必须是非空字符串组成的列表。
+规范化后相同的查询只搜索一次；其余查询在共享线程池中并发执行，同时进行的搜索数量不超过max_concurrency。
+与其他线程中正在执行的相同查询也会合并，只等待同一个结果。某个查询失败时，对应小节会给出错误信息，不影响其他查询的结果。'''
 SearchTool.__call__.__doc__ = '''__call__方法用于调用当前对象的函数定义列表中的函数。它接受以下参数：
 - *args: 可选的位置参数，将被传递给函数实现。
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
 该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
 SearchTool.build_function.__doc__ = '''build_function方法用于构建当前对象的函数定义列表。该方法不需要参数。
-该方法会创建一个新的AIFunction对象，并使用add_function方法添加一个名为'search'的函数定义。这个函数定义包含了函数的名称、描述、参数信息、必需参数列表以及对应的函数实现。函数实现是当前对象的search方法。该方法不返回任何值，但会将构建好的函数定义列表保存在当前对象的function属性中，以供后续调用使用。'''
+该方法会创建一个新的AIFunction对象，并使用add_function方法添加一个名为'search'的函数定义。这个函数定义包含了函数的名称、描述、参数信息、必需参数列表以及对应的函数实现。函数实现是当前对象的search方法，它会在共享线程池中执行，超过180秒未返回则向模型返回超时结果。该方法不返回任何值，但会将构建好的函数定义列表保存在当前对象的function属性中，以供后续调用使用。'''
 SearchTool.__doc__ = SearchTool.__init__.__doc__ = '''SearchTool类用于提供一个基于火山引擎Ark模型的网络搜索工具。它可以根据用户的查询内容进行网络搜索，并整理搜索结果，输出详细的说明性文本回答。使用前需要配置火山引擎API KEY，配置方法见：https://www.volcengine.com/docs/82379/1399008。
-构造函数接受两个参数：
+构造函数接受以下参数：
 - ark_api_key: 火山引擎API KEY，必须是字符串。
 - ark_ep_id: 火山引擎模型ID，必须是字符串。
-构造函数会使用提供的API KEY创建一个Ark客户端实例，并将其保存在当前对象的client属性中。该类还包含了一个build_function方法用于构建函数定义列表，一个search方法用于执行网络搜索，以及一个__call__方法用于调用函数定义列表中的函数。'''
\ No newline at end of file
+- cache_path: 搜索结果缓存（SQLite）文件路径，默认为当前目录下的.search_cache.sqlite3，为None时不使用缓存。
+- cache_ttl: 缓存有效期（秒），默认为7天。
+- cache_size: 最多缓存的结果数量，超过时淘汰最久未使用的结果，默认为1000。
+- client: 可选的客户端实例，需要提供与Ark相同的responses.create接口，例如测试时使用的本地替身。
+- max_concurrency: search_many中同时进行的搜索数量上限，默认为4。
+- knowledge: 可选的KnowledgeStore资料库，新的搜索结果会被切分去重后存入其中。
+构造函数会使用提供的API KEY创建一个Ark客户端实例（或使用传入的client），并将其保存在当前对象的client属性中；缓存保存在cache属性中，调用cache.stats()可以查看命中情况。该类还包含了一个build_function方法用于构建函数定义列表，一个search方法用于执行网络搜索，以及一个__call__方法用于调用函数定义列表中的函数。'''
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    from types import SimpleNamespace
+
+    class _StubClient:
+        # 本地替身：模拟responses.create的返回结构，并记录实际请求的次数
+        def __init__(self):
+            self.calls = 0
+            self.responses = SimpleNamespace(create=self.create)
+
+        def create(self, model, input, tools):
+            self.calls += 1
+            query = input[-1]['content'].rsplit('：', 1)[-1]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f'关于{query}的搜索结果'))])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite3')
+        stub = _StubClient()
+        tool = SearchTool('test-key', 'test-ep', cache_path=path, cache_size=2, client=stub)
+        assert tool.search('蓝晒 历史') == '关于蓝晒 历史的搜索结果'
+        assert tool.search('  蓝晒　历史 ') == '关于蓝晒 历史的搜索结果'    # 规范化后命中同一个缓存项
+        assert stub.calls == 1
+        tool.search('Cyanotype')
+        tool.search('普鲁士蓝')     # 超过cache_size，淘汰最久未使用的项
+        assert tool.cache.stats()['entries'] == 2 and tool.cache.stats()['evictions'] == 1
+        other = SearchTool('test-key', 'test-ep', cache_path=path, client=_StubClient())   # 另一个实例（或进程）共享同一个缓存文件
+        assert other.search('普鲁士蓝') == '关于普鲁士蓝的搜索结果' and other.client.calls == 0
+        expired = SearchTool('test-key', 'test-ep', cache_path=path, cache_ttl=0, client=_StubClient())
+        expired.search('普鲁士蓝')
+        assert expired.client.calls == 1
+
+        import time
+        class _SlowStub(_StubClient):
+            def create(self, model, input, tools):
+                time.sleep(0.2)
+                return super().create(model, input, tools)
+        slow = SearchTool('test-key', 'test-ep', cache_path=None, client=_SlowStub(), max_concurrency=4)
+        start = time.perf_counter()
+        merged = slow.search_many(['光敏材料', '光敏材料 ', '蓝图', '柠檬酸铁铵', '铁氰化钾'])
+        assert slow.client.calls == 4 and time.perf_counter() - start < 0.4     # 4个不同查询并发执行，耗时约为一次搜索
+        assert merged.count('## 查询') == 4
+        print(tool.cache.stats())
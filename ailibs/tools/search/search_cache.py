@@ -0,0 +1,136 @@
+from typing import Optional
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+def normalize_query(query:str) -> str:
+    # 全角转半角、统一大小写、合并空白，使只有格式差异的查询命中同一个缓存项
+    return ' '.join(unicodedata.normalize('NFKC', query).casefold().split())
+
+class SearchCache:
+    def __init__(self, path:str, ttl:float=7 * 24 * 3600, max_entries:int=1000) -> None:
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1.')
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0       # 当前进程中的命中与未命中次数，所有进程的累计次数见stats()
+        self.misses = 0
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        return
+
+    @staticmethod
+    def key(query:str, namespace:str='') -> str:
+        return hashlib.sha256(f'{namespace}\0{normalize_query(query)}'.encode('utf-8')).hexdigest()
+
+    def _count(self, name:str) -> None:
+        self._conn.execute('INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value=value+1', (name,))
+        return
+
+    def get(self, query:str, namespace:str='') -> Optional[str]:
+        key, now = self.key(query, namespace), time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT value, created FROM entries WHERE key=?', (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    conn.execute('DELETE FROM entries WHERE key=?', (key,))
+                    row = None
+                if row is None:
+                    self._count('misses')
+                else:
+                    # 更新访问时间，淘汰时按最近最少使用的顺序删除
+                    conn.execute('UPDATE entries SET accessed=? WHERE key=?', (now, key))
+                    self._count('hits')
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, query:str, value:str, namespace:str='') -> None:
+        key, now = self.key(query, namespace), time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, query, value, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                    (key, query, value, now, now)
+                )
+                excess = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)', (excess,))
+                    conn.execute('INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value=value+?', ('evictions', excess, excess))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return
+
+    def purge(self) -> int:
+        # 删除所有过期的缓存项，返回删除的数量
+        with self._lock:
+            cur = self._conn.execute('DELETE FROM entries WHERE created<?', (time.time() - self.ttl,))
+        return cur.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM entries')
+        return
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            counters = dict(self._conn.execute('SELECT name, value FROM counters').fetchall())
+        total = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': counters.get('hits', 0) / total if total else 0.0,
+            'process_hits': self.hits,
+            'process_misses': self.misses
+        }
+
+SearchCache.__doc__ = '''SearchCache类是一个基于SQLite的搜索结果缓存，可以被多个进程同时使用。缓存键由命名空间（例如模型ID）和规范化后的查询内容计算得到，
+规范化会做全角转半角、大小写统一和空白合并。缓存项超过ttl秒后失效；缓存项数量超过max_entries时，按最近访问时间淘汰最久未使用的项（LRU）。它包含以下方法：
+- __init__(self, path:str, ttl:float=7*24*3600, max_entries:int=1000): 打开（或创建）缓存数据库。
+- get(self, query:str, namespace:str=''): 返回缓存的结果，未命中或已过期时返回None。
+- put(self, query:str, value:str, namespace:str=''): 写入缓存，必要时淘汰最久未使用的项。
+- purge(self): 删除所有过期的缓存项。
+- clear(self): 清空缓存。
+- stats(self): 返回缓存项数量、所有进程累计的命中/未命中/淘汰次数、命中率，以及当前进程的命中/未命中次数。'''
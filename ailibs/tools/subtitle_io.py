@@ -0,0 +1,87 @@
+from .outline_manager import VideoTime
+from typing import Iterable, Iterator, Literal, Optional, TextIO, Tuple
+import os
+
+Cue = Tuple[VideoTime, VideoTime, str]
+
+def parse_timestamp(text:str) -> VideoTime:
+    # 支持 HH:MM:SS,mmm（SRT）、HH:MM:SS.mmm 与 MM:SS.mmm（WebVTT），毫秒四舍五入到0.01秒
+    parts = text.strip().split(':')
+    if len(parts) == 2:
+        parts.insert(0, '0')
+    if len(parts) != 3:
+        raise ValueError(f"Invalid timestamp: '{text}'")
+    h, m, s = parts
+    whole, _, frac = s.replace(',', '.').partition('.')
+    if not (h.isdigit() and m.isdigit() and whole.isdigit() and (frac.isdigit() or not frac)):
+        raise ValueError(f"Invalid timestamp: '{text}'")
+    frac = (frac + '000')[:3]
+    return VideoTime._from_cs((int(h) * 3600 + int(m) * 60 + int(whole)) * 100 + (int(frac) + 5) // 10)
+
+def format_timestamp(time:VideoTime, sep:str=',') -> str:
+    cs = time.cs
+    return f'{cs // 360000:02d}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}{sep}{cs % 100 * 10:03d}'
+
+def iter_cues(lines:Iterable[str]) -> Iterator[Cue]:
+    # SRT与WebVTT共用一个状态机：含有 --> 的行是时间行，之后直到空行为字幕文本；
+    # 序号、cue标识、WEBVTT头、NOTE/STYLE/REGION块都不含 -->，会被跳过
+    start = end = None
+    text = []
+    for line in lines:
+        line = line.rstrip('\r\n').lstrip('\ufeff')
+        if '-->' in line:
+            if start is not None:
+                yield start, end, '\n'.join(text)
+            left, _, right = line.partition('-->')
+            right = right.split(None, 1)
+            if not right:
+                raise ValueError(f"Invalid cue timing line: '{line}'")
+            start, end, text = parse_timestamp(left), parse_timestamp(right[0]), []
+        elif not line.strip():
+            if start is not None:
+                yield start, end, '\n'.join(text)
+                start = None
+        elif start is not None:
+            text.append(line)
+    if start is not None:
+        yield start, end, '\n'.join(text)
+
+def read_cues(path:str) -> Iterator[Cue]:
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        yield from iter_cues(f)
+
+def write_cues(f:TextIO, cues:Iterable[Cue], format:Literal['srt', 'vtt']='srt') -> int:
+    if format not in ('srt', 'vtt'):
+        raise ValueError(f"Unsupported subtitle format '{format}', expected 'srt' or 'vtt'.")
+    sep = ',' if format == 'srt' else '.'
+    if format == 'vtt':
+        f.write('WEBVTT\n\n')
+    n = 0
+    for start, end, text in cues:
+        # 空行在两种格式中都表示字幕结束，文本中的空行需要去掉
+        text = '\n'.join(line for line in text.splitlines() if line.strip())
+        if not text:
+            continue
+        n += 1
+        if format == 'srt':
+            f.write(f'{n}\n')
+        f.write(f'{format_timestamp(start, sep)} --> {format_timestamp(end, sep)}\n{text}\n\n')
+    return n
+
+def subtitle_format(path:str, format:Optional[str]=None) -> str:
+    format = (format or os.path.splitext(path)[1].lstrip('.')).lower()
+    if format == 'webvtt':
+        format = 'vtt'
+    if format not in ('srt', 'vtt'):
+        raise ValueError(f"Unsupported subtitle format '{format}', expected 'srt' or 'vtt'.")
+    return format
+
+iter_cues.__doc__ = '''iter_cues函数用于流式解析SRT或WebVTT字幕，逐条返回(开始时间, 结束时间, 文本)，内存占用与文件大小无关。它接受以下参数：
+- lines: 逐行产生字符串的可迭代对象，例如打开的文件对象。
+两种格式使用同一个解析器：含有-->的行为时间行，时间行之后直到空行为字幕文本（多行文本以换行符连接）；序号行、cue标识、WEBVTT头以及NOTE/STYLE/REGION块都会被跳过。
+时间行中结束时间之后的WebVTT设置（例如align:start）会被忽略，时间精确到0.01s。'''
+write_cues.__doc__ = '''write_cues函数用于流式写出SRT或WebVTT字幕，返回写出的字幕条数。它接受以下参数：
+- f: 以文本模式打开的文件对象。
+- cues: 逐条产生(开始时间, 结束时间, 文本)的可迭代对象。
+- format: 'srt'或'vtt'，默认为'srt'。
+文本为空的字幕会被跳过，文本中的空行会被去掉，SRT的序号从1开始重新编号。'''
@@ -0,0 +1,101 @@
+from typing import List, Tuple
+import re
+import math
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN = re.compile(f'([{_CJK}]+)|([^\\W{_CJK}]+)')
+
+def tokenize(text:str) -> List[str]:
+    # 中日韩文字没有空格分词，按相邻两个字切分（bigram）；其他文字按单词切分并转为小写
+    tokens = []
+    for cjk, word in _TOKEN.findall(text):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i+2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+class TextIndex:
+    k1, b = 1.2, 0.75   # BM25参数
+
+    def __init__(self) -> None:
+        self._postings = {}     # token(str) : {doc(str) : [行号]}
+        self._doc_tokens = {}   # doc(str) : 文档包含的token集合，用于删除
+        self._doc_len = {}      # doc(str) : 文档的token数量
+        self._total_len = 0
+        return
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc:str) -> bool:
+        return doc in self._doc_len
+
+    def add(self, doc:str, text:str) -> None:
+        self.remove(doc)
+        postings = self._postings
+        seen, length = set(), 0
+        # 只按\n分行，与读取文件时的行号一致；splitlines还会在\f、\v、\x85、\u2028等字符处分行
+        for line_no, line in enumerate(text.split('\n'), start=1):
+            tokens = tokenize(line)
+            length += len(tokens)
+            for token in set(tokens):
+                postings.setdefault(token, {}).setdefault(doc, []).append(line_no)
+                seen.add(token)
+        self._doc_tokens[doc] = seen
+        self._doc_len[doc] = length
+        self._total_len += length
+        return
+
+    def remove(self, doc:str) -> None:
+        tokens = self._doc_tokens.pop(doc, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            docs = self._postings[token]
+            del docs[doc]
+            if not docs:
+                del self._postings[token]
+        self._total_len -= self._doc_len.pop(doc)
+        return
+
+    def search(self, query:str, k:int=10, max_lines:int=3) -> List[Tuple[str, float, List[int]]]:
+        terms = set(tokenize(query))
+        if not terms or not self._doc_len:
+            return []
+        n = len(self._doc_len)
+        avg_len = self._total_len / n or 1
+        scores, line_hits = {}, {}
+        for term in terms:
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc, lines in docs.items():
+                tf = len(lines)
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc] / avg_len)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                hits = line_hits.setdefault(doc, {})
+                for line_no in lines:
+                    hits[line_no] = hits.get(line_no, 0) + 1
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        results = []
+        for doc, score in ranked:
+            # 命中查询词最多的行作为摘要，命中数相同时按行号排序
+            best = sorted(line_hits[doc].items(), key=lambda x: (-x[1], x[0]))[:max_lines]
+            results.append((doc, score, sorted(line_no for line_no, _ in best)))
+        return results
+
+TextIndex.__doc__ = '''TextIndex类是一个增量维护的倒排索引，用BM25算法对文档排序，并记录每个词出现的行号以便返回摘要。
+分词会识别中日韩文字：连续的中日韩文字按相邻两个字切分（bigram），其他文字按单词切分并转为小写，因此查询时至少需要两个连续的汉字才能命中。它包含以下方法：
+- add(self, doc:str, text:str): 添加或更新一个文档，doc为文档标识（例如相对路径）。
+- remove(self, doc:str): 删除一个文档，文档不存在时不做任何操作。
+- search(self, query:str, k:int=10, max_lines:int=3): 返回得分最高的k个文档，每一项为(文档标识, 得分, 行号列表)。'''
+TextIndex.search.__doc__ = '''search方法用于检索与查询最相关的文档。它接受以下参数：
+- query: 查询文本，会使用与建立索引相同的方式分词。
+- k: 最多返回的文档数量，默认为10。
+- max_lines: 每个文档最多返回的行号数量，默认为3，优先返回命中查询词最多的行。
+返回一个列表，每一项为(文档标识, BM25得分, 行号列表)，按得分从高到低排列，行号从1开始。'''
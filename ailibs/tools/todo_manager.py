@@ -1,14 +1,45 @@
 from .tool_manager import AIFunction
+from typing import List
 
 class TODOListManager:
     def __init__(self, todo_list:list=[])->None:
-        self.todo = todo_list
+        self.todo = list(todo_list)
         self.nsteps = len(self.todo)
         self.progress = [False for i in range(self.nsteps)]
         self.cur_step = 1
         self.pause = False
         self.build_function()
 
+    @property
+    def progress(self)->list:
+        return self._progress
+
+    @progress.setter
+    def progress(self, value:list)->None:
+        # 已完成步骤数与progress同步维护，all_completed无需遍历列表
+        self._progress = list(value)
+        self._ncompleted = sum(1 for done in self._progress if done)
+
+    def _mark(self, idx:int, done:bool)->None:
+        if self._progress[idx] != done:
+            self._ncompleted += 1 if done else -1
+        self._progress[idx] = done
+
+    def _commit(self, todo:list, progress:list)->None:
+        # 批量操作先在副本上完成并校验，最后一次性替换，当前步骤指向第一个未完成的步骤
+        self.todo = todo
+        self.nsteps = len(todo)
+        self.progress = progress
+        self.cur_step = next((idx for idx, done in enumerate(progress, start=1) if not done), self.nsteps + 1)
+
+    @staticmethod
+    def _check_steps(steps:List[str])->List[str]:
+        if not isinstance(steps, list) or not steps:
+            raise ValueError('steps must be a non-empty list of strings.')
+        if not all(isinstance(step, str) and step.strip() for step in steps):
+            raise ValueError('Every step must be a non-empty string.')
+        return list(steps)
+
     def __str__(self)->str:
         res = '\n```TODO\n'
         for idx, step in enumerate(self.todo, start=1):
@@ -36,13 +67,13 @@ class TODOListManager:
         self.todo = []
 
     def complete_step(self)->None:
-        self.progress[self.cur_step-1] = True
+        self._mark(self.cur_step-1, True)
         self.cur_step += 1
         return
     
     def redo(self)->None:
         self.cur_step -= 1
-        self.progress[self.cur_step-1] = False
+        self._mark(self.cur_step-1, False)
         return
 
     def complete_all(self)->None:
@@ -52,9 +83,38 @@ class TODOListManager:
 
     def append(self, step:str)->None:
         self.nsteps += 1
-        self.progress += [False]
+        self._progress.append(False)
         self.todo.append(step)
 
+    def extend(self, steps:List[str])->None:
+        steps = self._check_steps(steps)
+        self._commit(self.todo + steps, self.progress + [False] * len(steps))
+
+    def set_todo(self, steps:List[str])->None:
+        steps = self._check_steps(steps)
+        self._commit(steps, [False] * len(steps))
+
+    def insert(self, position:int, steps:List[str])->None:
+        steps = self._check_steps(steps)
+        if not 1 <= position <= self.nsteps + 1:
+            raise ValueError(f'position must be between 1 and {self.nsteps + 1}.')
+        idx = position - 1
+        self._commit(self.todo[:idx] + steps + self.todo[idx:], self.progress[:idx] + [False] * len(steps) + self.progress[idx:])
+
+    def remove(self, steps:List[int])->None:
+        if not isinstance(steps, list) or not steps:
+            raise ValueError('steps must be a non-empty list of step numbers.')
+        drop = set(steps)
+        if len(drop) != len(steps) or not all(isinstance(i, int) and 1 <= i <= self.nsteps for i in drop):
+            raise ValueError(f'Step numbers must be distinct integers between 1 and {self.nsteps}.')
+        keep = [i for i in range(self.nsteps) if i + 1 not in drop]
+        self._commit([self.todo[i] for i in keep], [self.progress[i] for i in keep])
+
+    def reorder(self, order:List[int])->None:
+        if not isinstance(order, list) or sorted(order) != list(range(1, self.nsteps + 1)):
+            raise ValueError(f'order must be a permutation of the step numbers 1..{self.nsteps}.')
+        self._commit([self.todo[i-1] for i in order], [self.progress[i-1] for i in order])
+
     def print(self, color:bool=True)->None:
         if not color:
             print(self)
@@ -87,6 +147,52 @@ class TODOListManager:
             required=['step'],
             function=self.append
         )
+        self.function.add_function(
+            name='add_todos',
+            description='一次性向待办事项列表末尾按顺序添加多个步骤。制定TODO列表时应优先使用此工具，一次调用完成全部规划。',
+            parameters={
+                'steps': {'type': 'array', 'items': {'type': 'string'}, 'description': '按顺序排列的步骤内容列表'}
+            },
+            required=['steps'],
+            function=self.extend
+        )
+        self.function.add_function(
+            name='set_todos',
+            description='用新的步骤列表整体替换当前的待办事项列表（所有步骤重置为未完成），用于重新制定计划，相当于clear_todo加add_todos。',
+            parameters={
+                'steps': {'type': 'array', 'items': {'type': 'string'}, 'description': '按顺序排列的新步骤内容列表'}
+            },
+            required=['steps'],
+            function=self.set_todo
+        )
+        self.function.add_function(
+            name='insert_todos',
+            description='在指定位置之前插入一个或多个步骤，插入的步骤为未完成状态。',
+            parameters={
+                'position': {'type': 'integer', 'description': '插入位置（从1开始），新步骤将成为第position步；等于步骤总数加1时添加到末尾'},
+                'steps': {'type': 'array', 'items': {'type': 'string'}, 'description': '要插入的步骤内容列表'}
+            },
+            required=['position', 'steps'],
+            function=self.insert
+        )
+        self.function.add_function(
+            name='remove_todos',
+            description='一次性删除一个或多个步骤。',
+            parameters={
+                'steps': {'type': 'array', 'items': {'type': 'integer'}, 'description': '要删除的步骤序号列表（从1开始，按删除前的序号）'}
+            },
+            required=['steps'],
+            function=self.remove
+        )
+        self.function.add_function(
+            name='reorder_todos',
+            description='按照给定的顺序重新排列所有步骤，步骤的完成状态随步骤一起移动。',
+            parameters={
+                'order': {'type': 'array', 'items': {'type': 'integer'}, 'description': '原步骤序号的新排列，必须包含1到步骤总数的每个序号各一次，例如[2, 1, 3]'}
+            },
+            required=['order'],
+            function=self.reorder
+        )
         
         self.function.add_function(
             name='clear_todo',
@@ -113,8 +219,8 @@ class TODOListManager:
     
     @property
     def all_completed(self)->bool:
-        # Check if all steps are completed
-        return all(self.progress)
+        # Check if all steps are completed (counter kept in sync with progress)
+        return self._ncompleted >= self.nsteps
 
     def __call__(self, __func_name:str, *args, **kwargs):
         return self.function(__func_name, *args, **kwargs)
@@ -128,6 +234,11 @@ TODOListManager.__doc__ = '''TODOListManager类用于管理待办事项列表。
 - complete_step(self): 标记当前步骤为已完成，并将当前步骤指针移动
 - complete_all(self): 标记所有步骤为已完成，并将当前步骤指针移动到最后。
 - append(self, step:str): 向待办事项列表中添加一个新的步骤。
+- extend(self, steps:List[str]): 一次性向待办事项列表末尾添加多个步骤。
+- set_todo(self, steps:List[str]): 用新的步骤列表整体替换当前的待办事项列表。
+- insert(self, position:int, steps:List[str]): 在指定位置之前插入多个步骤。
+- remove(self, steps:List[int]): 一次性删除多个步骤。
+- reorder(self, order:List[int]): 按照给定的顺序重新排列所有步骤。
 - print(self, color:bool=True): 打印待办事项列表，支持彩色输出以区分已完成、当前步骤和未完成的步骤。'''
 TODOListManager.__str__.__doc__ = '''__str__方法返回待办事项列表的Markdown表示形式。它会根据当前步骤的状态为每个步骤添加不同的标记：
 - 已完成的步骤前会添加[+]标记。
@@ -138,9 +249,17 @@ TODOListManager.clear.__doc__ = '''clear方法用于清空待办事项列表和
 TODOListManager.complete_step.__doc__ = '''complete_step方法用于标记当前步骤为已完成，并将当前步骤指针移动到下一个步骤。它会将当前步骤的进度标记为True，并将当前步骤指针加1。'''
 TODOListManager.complete_all.__doc__ = '''complete_all方法用于标记所有步骤为已完成，并将当前步骤指针移动到最后。它会将所有步骤的进度标记为True，并将当前步骤指针设置为步骤数量加1。'''
 TODOListManager.append.__doc__ = '''append方法用于向待办事项列表中添加一个新的步骤。它接受一个字符串参数step，表示要添加的步骤内容。方法会将步骤添加到待办事项列表中，并更新步骤数量和进度列表。'''
+TODOListManager.extend.__doc__ = '''extend方法用于一次性向待办事项列表末尾按顺序添加多个步骤。它接受一个字符串列表参数steps。所有步骤都会先校验（不能为空），校验通过后才一次性更新待办事项列表、步骤数量和进度列表。'''
+TODOListManager.set_todo.__doc__ = '''set_todo方法用于用新的步骤列表整体替换当前的待办事项列表。它接受一个字符串列表参数steps。所有步骤都被重置为未完成，当前步骤指针回到第1步，相当于clear后再extend，但只产生一次更新。'''
+TODOListManager.insert.__doc__ = '''insert方法用于在指定位置之前插入一个或多个步骤。它接受以下参数：
+- position: 插入位置（从1开始），插入后第一个新步骤成为第position步；等于步骤数量加1时添加到末尾。
+- steps: 要插入的步骤内容列表。
+插入的步骤为未完成状态。插入后当前步骤指针指向第一个未完成的步骤，因此在已完成的步骤之间插入新步骤时，会先处理新插入的步骤。'''
+TODOListManager.remove.__doc__ = '''remove方法用于一次性删除一个或多个步骤。它接受一个整数列表参数steps，表示要删除的步骤序号（从1开始，按删除前的序号），序号不能重复或越界。删除后当前步骤指针指向第一个未完成的步骤。'''
+TODOListManager.reorder.__doc__ = '''reorder方法用于按照给定的顺序重新排列所有步骤。它接受一个整数列表参数order，必须是1到步骤数量的一个排列，例如[2, 1, 3]表示把原来的第2步移到最前面。步骤的完成状态随步骤一起移动，重新排列后当前步骤指针指向第一个未完成的步骤。'''
 TODOListManager.print.__doc__ = '''print方法用于打印待办事项列表。它接受一个布尔参数color，表示是否使用彩色输出。方法会根据当前步骤的状态为每个步骤添加不同的标记，并使用不同的颜色区分已完成、当前步骤和未完成的步骤。如果color参数为False，则使用普通文本输出。'''
 TODOListManager.build_function.__doc__ = '''build_function方法用于构建并注册待办事项管理器的AI调用接口（使用AIFunction）。
-它会将常用操作（添加步骤、标记完成、全部完成、清空、检查）以函数接口的形式注册，方便外部通过函数名调用对应的方法。'''
+它会将常用操作（添加步骤、批量添加/替换/插入/删除/重新排列步骤、清空、检查、暂停）以函数接口的形式注册，方便外部通过函数名调用对应的方法。批量操作都是一次性的原子更新，规划阶段一次调用即可完成。'''
 TODOListManager.__call__.__doc__ = '''__call__方法根据函数名称（由build_function注册的名称）调用对应的函数实现。
 参数为函数名及其位置/关键字参数，会委托给内部的AIFunction实例进行调用并返回结果。'''
 TODOListManager.pause_todo.__doc__ = '''pause_todo方法用于暂停处理当前待办事项，以便进一步确认用户要求。调用前请先输出一段提示信息，说明当前正在处理的步骤，并询问用户是否继续执行和执行的细节。该方法会将内部的pause状态设置为True，以表示待办事项处理已暂停。'''
@@ -1,5 +1,81 @@
-from typing import List
+from typing import List, Literal, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+import json
+import threading
 import warnings
+from .trace_manager import tracer
+
+_pools = {}
+_pools_lock = threading.Lock()
+_inflight = {}      # 进程池 : 尚未完成的任务
+_timed_out = {}     # 进程池 : 已超时、仍在运行的任务
+_local = threading.local()
+
+class _CancelEvent(threading.Event):
+    # observed表示工具是否取用了取消事件，即是否支持中途取消
+    observed = False
+
+def cancel_event()->threading.Event:
+    event = getattr(_local, 'cancel', None)
+    if event is None:
+        return _CancelEvent()   # 不是通过线程池调用的，永远不会被取消
+    event.observed = True
+    return event
+
+def _call_cancellable(event:_CancelEvent, function, args:tuple, kwargs:dict):
+    _local.cancel = event
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _local.cancel = None
+
+def _submit(executor:str, function, args:tuple, kwargs:dict, event:_CancelEvent):
+    # 线程池/进程池在所有AIFunction实例间共享，首次使用时创建；在锁内提交，保证不会提交到正在回收的进程池
+    with _pools_lock:
+        pool = _pools.get(executor)
+        if pool is None:
+            pool = ThreadPoolExecutor(thread_name_prefix='ai-tool') if executor == 'thread' else ProcessPoolExecutor()
+            _pools[executor] = pool
+        if executor == 'thread':
+            return pool, pool.submit(_call_cancellable, event, function, args, kwargs)
+        future = pool.submit(function, *args, **kwargs)
+        _inflight.setdefault(pool, set()).add(future)
+    future.add_done_callback(lambda f: _forget(pool, f))
+    return pool, future
+
+def _forget(pool, future)->None:
+    with _pools_lock:
+        _inflight.get(pool, set()).discard(future)
+        _timed_out.get(pool, set()).discard(future)
+
+def _retire_process_pool(pool, future)->None:
+    # 进程池中正在运行的任务无法单独取消：不再向该进程池提交新任务（下次调用时创建新的进程池），
+    # 等池中其他未超时的任务完成后再终止所有工作进程，避免无关的任务因进程池被终止而失败
+    with _pools_lock:
+        if _pools.get('process') is pool:
+            del _pools['process']
+        timed_out = _timed_out.setdefault(pool, set())
+        first = not timed_out
+        timed_out.add(future)
+    if first:
+        threading.Thread(target=_recycle_process_pool, args=(pool,), name='ai-tool-recycle', daemon=True).start()
+
+def _recycle_process_pool(pool)->None:
+    while True:
+        with _pools_lock:
+            pending = _inflight.get(pool, set()) - _timed_out.get(pool, set())
+        if not pending:
+            break
+        wait(pending, timeout=1.0)
+    with _pools_lock:
+        _inflight.pop(pool, None)
+        _timed_out.pop(pool, None)
+    for proc in list((getattr(pool, '_processes', None) or {}).values()):
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
 
 class AIFunction:
     def __init__(self, functions_dict:List[dict], functions:list)->None:
@@ -7,6 +83,7 @@ class AIFunction:
         self.__f = functions
         if len(self.functions) != len(self.__f):
             raise ValueError
+        self.__opts = [('inline', None) for _ in self.__f]
         return
     
     def add_function(
@@ -15,8 +92,12 @@ class AIFunction:
         description:str,
         parameters:dict,
         required:List[str],
-        function
+        function,
+        executor:Literal['inline', 'thread', 'process']='inline',
+        timeout:Optional[float]=None
     )->None:
+        if executor not in ('inline', 'thread', 'process'):
+            raise ValueError(f'Invalid executor {executor}.')
         self.functions.append(
             {
                 'type':'function',
@@ -33,6 +114,7 @@ class AIFunction:
             }
         )
         self.__f.append(function)
+        self.__opts.append((executor, timeout))
         return
     
     def include(self, tool_manager:'AIFunction')->None:
@@ -43,10 +125,44 @@ class AIFunction:
             else:
                 self.functions.append(func)
                 self.__f.append(tool_manager.__f[i])
+                self.__opts.append(tool_manager.__opts[i])
         return
     
+    def __run(self, __func_name:str, idx:int, args:tuple, kwargs:dict):
+        executor, timeout = self.__opts[idx]
+        if executor == 'inline':
+            return self.__f[idx](*args, **kwargs)
+        event = _CancelEvent()
+        pool, future = _submit(executor, self.__f[idx], args, kwargs, event)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            event.set()
+            if future.cancel():
+                state = '任务尚未开始执行，已取消'
+            elif executor == 'process':
+                _retire_process_pool(pool, future)
+                state = '执行任务的工作进程会在同一进程池中的其他任务完成后被终止'
+            elif event.observed:
+                state = '已通知工具停止，正在进行的工作会在下一个检查点中止'
+            else:
+                state = '该工具不支持中途取消，仍会在后台继续运行直至结束，期间可能仍占用文件或网络连接'
+            return json.dumps({
+                'status': 'timeout',
+                'tool': __func_name,
+                'timeout': timeout,
+                'message': f'工具{__func_name}执行超过{timeout}秒，已停止等待：{state}。请调整参数后重试，或改用其他方法。'
+            }, ensure_ascii=False)
+    
     def __call__(self, __func_name:str, *args, **kwargs)->str:
         __func_name = __func_name.strip()
+        with tracer.span('tool_call', cat='tool', tool=__func_name) as span:
+            res = self.__invoke(__func_name, args, kwargs)
+            if tracer.enabled:
+                span.set(bytes=len(res.encode('utf-8')))
+            return res
+    
+    def __invoke(self, __func_name:str, args:tuple, kwargs:dict)->str:
         try:
             idx = -1
             for i, func in enumerate(self.functions):
@@ -55,7 +171,7 @@ class AIFunction:
                     break
             if idx == -1:
                 raise ValueError(f'Function {__func_name} not found.')
-            res = self.__f[idx](*args, **kwargs)
+            res = self.__run(__func_name, idx, args, kwargs)
             if isinstance(res, str):
                 return res
             elif res is None:
@@ -81,7 +197,13 @@ AIFunction.add_function.__doc__ = '''add_function方法用于向函数管理器
     'param2': {'type': 'integer', 'description': '参数2的描述'}
 }
 - required: 一个列表，列出函数调用时必须提供的参数名称。
-- function: 函数的实现，即一个可调用对象（如函数或lambda表达式），它将被调用时执行。'''
+- function: 函数的实现，即一个可调用对象（如函数或lambda表达式），它将被调用时执行。
+- executor: 函数的执行方式，默认为'inline'，即在调用线程中直接执行；'thread'表示在共享线程池中执行，适合网络请求等I/O密集型工具；'process'表示在共享进程池中执行，适合CPU密集型工具，避免与流式输出处理争夺GIL（此时函数及其参数必须可以被pickle）。
+- timeout: 函数执行的超时时间，单位为秒，仅在executor为'thread'或'process'时生效，默认为None，即不限时。超时后会返回一个JSON格式的超时结果（status为timeout）。
+线程中的任务无法被强制终止：超时后会设置该次调用的取消事件，工具可以在函数开头调用cancel_event()取得它，并在循环中检查is_set()以便尽快停止（事件可以传给工具自己创建的线程）；不检查取消事件的工具会在后台继续运行直至结束，超时结果中会说明这一点。
+进程池中正在运行的任务超时后，该进程池不再接收新任务，待池中其他任务完成后终止它的所有工作进程，之后的调用使用新的进程池。'''
+cancel_event.__doc__ = '''cancel_event函数返回当前工具调用的取消事件（threading.Event）。通过executor='thread'执行的工具超时后，该事件会被设置，工具应当尽快停止并清理。
+在其他情况下调用（inline执行、直接调用或在工具自己创建的线程中调用）返回一个不会被设置的事件，因此工具应当在函数开头取得事件，再传给自己创建的线程。'''
 AIFunction.include.__doc__ = '''include方法用于将另一个AIFunction实例中的函数定义和实现合并到当前实例中。它接受一个参数：
 - tool_manager: 另一个AIFunction实例，包含要合并的函数定义和实现。
 该方法会遍历另一个实例中的函数定义，如果当前实例中已经存在同名的函数，则会发出警告并跳过该函数的合并；如果不存在同名函数，则会将该函数定义和实现添加到当前实例中。'''
@@ -89,7 +211,7 @@ AIFunction.__call__.__doc__ = '''__call__方法用于根据函数名称调用对
 - __func_name: 要调用的函数的名称，必须是之前通过add_function方法添加的函数名称。
 - *args: 可选的位置参数，将被传递给函数实现。
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
-该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
+该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则按照注册时指定的executor和timeout调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+from typing import Optional
+import os
+import json
+import time
+import atexit
+import threading
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer:'Tracer', name:str, cat:str, args:dict)->None:
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = f'{exc_type.__name__}: {exc}'
+        self.tracer._record(self, end)
+        return False
+
+    def set(self, **attrs):
+        self.args.update(attrs)
+        return self
+
+def _pid_path(path:str, pid:int)->str:
+    root, ext = os.path.splitext(path)
+    return f'{root}.{pid}{ext}'
+
+class Tracer:
+    def __init__(self, path:Optional[str]=None)->None:
+        self.path = path
+        self.enabled = path is not None
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        atexit.register(self.flush)
+        return
+
+    def enable(self, path:str)->None:
+        self.path = path
+        self.enabled = True
+        return
+
+    def disable(self)->None:
+        self.enabled = False
+        return
+
+    def span(self, name:str, cat:str='agent', **attrs):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, attrs)
+
+    def _record(self, span:_Span, end:int)->None:
+        event = {
+            'name': span.name,
+            'cat': span.cat,
+            'ph': 'X',
+            'ts': (span.start - self._origin) / 1000,
+            'dur': (end - span.start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': span.args
+        }
+        with self._lock:
+            self._events.append(event)
+        return
+
+    def flush(self, path:Optional[str]=None)->Optional[str]:
+        # 继承了SCI2VID_TRACE的子进程（工作进程、进程池）使用同一个路径，默认路径加上进程号，避免互相覆盖
+        pid = os.getpid()
+        p = path or (self.path and _pid_path(self.path, pid))
+        if p is None:
+            return None
+        with self._lock:
+            # fork出的子进程会继承父进程已记录的span，只写出本进程的
+            events = [event for event in self._events if event['pid'] == pid]
+            if not events:
+                return None
+        with open(p, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False, default=str)
+        return p
+
+tracer = Tracer(os.environ.get('SCI2VID_TRACE'))
+
+Tracer.__doc__ = '''Tracer类用于记录运行过程中嵌套的耗时区间（span），例如 run → step → attempt → LLM请求/工具调用/复盘/保存状态，
+并以Chrome Trace Event格式（JSON）导出到本地文件，可以直接在chrome://tracing或Perfetto（https://ui.perfetto.dev）中打开查看。
+模块中提供了一个全局实例tracer，设置环境变量SCI2VID_TRACE为导出文件路径即可启用，也可以调用tracer.enable(path)手动启用。
+每个进程写出各自的文件，文件名中加入进程号，例如SCI2VID_TRACE=trace.json时写出trace.<pid>.json；多进程运行（例如workflow.py worker -n N）时会得到多个文件，可以在Perfetto中同时打开。
+未启用时span方法返回一个共享的空对象，几乎没有额外开销。它包含以下方法：
+- __init__(self, path:Optional[str]=None): 初始化追踪器，path为导出文件路径，为None时不启用。
+- enable(self, path:str): 启用追踪，并设置导出文件路径。
+- disable(self): 停用追踪，已记录的span不会被清除。
+- span(self, name:str, cat:str='agent', **attrs): 返回一个上下文管理器，在with语句中记录一个span。
+- flush(self, path:Optional[str]=None): 将已记录的span写入导出文件。'''
+Tracer.span.__doc__ = '''span方法用于创建一个耗时区间，应当在with语句中使用。它接受以下参数：
+- name: span的名称，例如'run'、'step'、'llm_request'、'tool_call'。
+- cat: span的类别，用于在查看器中筛选，默认为'agent'。
+- **attrs: span的属性，例如工具名、返回字节数、token数等，必须可以被JSON序列化（否则会被转换为字符串）。
+with语句中可以调用返回对象的set(**attrs)方法补充属性。同一线程中嵌套的span会在查看器中显示为嵌套结构；如果with语句中抛出异常，异常信息会被记录到error属性中。'''
+Tracer.flush.__doc__ = '''flush方法用于将当前进程已记录的所有span写入导出文件（覆盖写入），并返回文件路径。它接受以下参数：
+- path: 可选的导出文件路径，按原样使用；默认为启用时设置的路径加上进程号（trace.json → trace.<pid>.json）。
+如果没有设置路径或者没有任何记录，则不写入文件并返回None。程序退出时会自动调用该方法。'''
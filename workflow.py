@@ -0,0 +1,73 @@
+import os
+import sys
+import argparse
+import multiprocessing
+from ailibs.agents.job_queue import JobQueue, run_worker
+
+def _worker(db:str, workspace:str, visibility:float, poll:float, drain:bool)->None:
+    run_worker(db, workspace, visibility=visibility, poll_interval=poll, drain=drain)
+
+def main(argv=None)->int:
+    parser = argparse.ArgumentParser(description='Sci2Vid 批量任务队列')
+    parser.add_argument('--db', default='jobs.sqlite3', help='任务队列数据库文件路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('enqueue', help='添加任务，每个参数是一个任务的提示词；不提供参数时从标准输入逐行读取')
+    p.add_argument('prompts', nargs='*')
+    p.add_argument('--max-attempts', type=int, default=3)
+
+    p = sub.add_parser('worker', help='启动多个工作进程执行任务')
+    p.add_argument('-n', '--processes', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--workspace', default='workspaces', help='工作区根目录')
+    p.add_argument('--visibility', type=float, default=600.0, help='租约时长（秒）')
+    p.add_argument('--poll', type=float, default=2.0, help='队列为空时的轮询间隔（秒）')
+    p.add_argument('--drain', action='store_true', help='队列为空时退出，而不是继续等待')
+
+    p = sub.add_parser('status', help='查看任务状态')
+    p.add_argument('--status', choices=['queued', 'running', 'done', 'failed'])
+    p.add_argument('--limit', type=int, default=50)
+
+    p = sub.add_parser('retry', help='将已完成或失败的任务重新排队')
+    p.add_argument('ids', nargs='+', type=int)
+
+    args = parser.parse_args(argv)
+    db = os.path.abspath(args.db)
+
+    if args.command == 'enqueue':
+        queue = JobQueue(db)
+        prompts = args.prompts or [line.strip() for line in sys.stdin if line.strip()]
+        for prompt in prompts:
+            print(queue.enqueue(prompt, args.max_attempts))
+        queue.close()
+    elif args.command == 'worker':
+        JobQueue(db).close()    # 在启动工作进程之前创建好数据库
+        procs = [
+            multiprocessing.Process(target=_worker, args=(db, args.workspace, args.visibility, args.poll, args.drain), name=f'worker-{i}')
+            for i in range(max(1, args.processes))
+        ]
+        for proc in procs:
+            proc.start()
+        try:
+            for proc in procs:
+                proc.join()
+        except KeyboardInterrupt:
+            # 被中断的任务租约过期后会被重新领取
+            for proc in procs:
+                proc.terminate()
+            for proc in procs:
+                proc.join()
+    elif args.command == 'status':
+        queue = JobQueue(db)
+        print(queue.stats())
+        for job in queue.jobs(args.status, args.limit):
+            print(f'{job["id"]:>6} {job["status"]:<8} {job["attempts"]}/{job["max_attempts"]} {job["prompt"]!r}' + (f' ({job["worker"]})' if job['worker'] else ''))
+        queue.close()
+    elif args.command == 'retry':
+        queue = JobQueue(db)
+        for job_id in args.ids:
+            print(job_id, 'requeued' if queue.retry(job_id) else 'not found or still active')
+        queue.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())